@@ -0,0 +1,84 @@
+"""
+Batched portfolio valuation.
+
+Positions and the latest close prices are loaded into NumPy arrays and every user is valued
+in one vectorized pass, instead of looping over model instances with Decimal math.
+"""
+from django.conf import settings
+from .models import (Position, StockData)
+from .utils import store_in_cache
+import numpy as np
+
+
+def compute_valuations(usernames:list=None)->dict:
+    """
+    Mark-to-market value, cost basis, unrealized P&L and per ticker exposure of every user
+    (or of `usernames`), plus the total exposure per ticker.
+    
+    A position whose ticker has no StockData is valued at 0.
+    """
+    positions = Position.objects.filter(quantity__gt=0)
+    
+    if usernames is not None:
+        positions = positions.filter(user__username__in=usernames)
+    
+    
+    rows:list = list(positions.values_list('user__username', 'ticker', 'quantity', 'cost_basis'))
+    
+    if not rows:
+        return {'users': {}, 'tickers': {}}
+    
+    
+    users, tickers, quantity, cost_basis = zip(*rows)
+    usernames, user_codes = np.unique(np.array(users), return_inverse=True)
+    ticker_names, ticker_codes = np.unique(np.array(tickers), return_inverse=True)
+    quantity = np.array(quantity, dtype=np.float64)
+    cost_basis = np.array(cost_basis, dtype=np.float64)
+    
+    close_prices:dict = dict(StockData.objects.filter(ticker__in=ticker_names.tolist()).values_list('ticker', 'close_price'))
+    prices = np.array([close_prices.get(ticker, 0) for ticker in ticker_names.tolist()], dtype=np.float64)
+    
+    
+    market_value = quantity * prices[ticker_codes]
+    unrealized_pnl = market_value - cost_basis
+    
+    user_market_value = np.bincount(user_codes, weights=market_value, minlength=len(usernames)).round(2)
+    user_cost_basis = np.bincount(user_codes, weights=cost_basis, minlength=len(usernames)).round(2)
+    user_pnl = np.bincount(user_codes, weights=unrealized_pnl, minlength=len(usernames)).round(2)
+    ticker_exposure = np.bincount(ticker_codes, weights=market_value, minlength=len(ticker_names)).round(2)
+    
+    
+    # group the positions by user to split the per ticker exposure of every user
+    order = np.argsort(user_codes, kind='stable')
+    boundaries = np.flatnonzero(np.diff(user_codes[order])) + 1
+    exposures:list = [
+        dict(zip(ticker_names[ticker_codes[group]].tolist(), market_value[group].round(2).tolist()))
+        for group in np.split(order, boundaries)
+    ]
+    
+    
+    return {
+        'users': {
+            username: {
+                'market_value': value,
+                'cost_basis': cost,
+                'unrealized_pnl': pnl,
+                'exposure': exposure,
+            }
+            for username, value, cost, pnl, exposure in zip(
+                usernames.tolist(), user_market_value.tolist(), user_cost_basis.tolist(), user_pnl.tolist(), exposures
+            )
+        },
+        'tickers': dict(zip(ticker_names.tolist(), ticker_exposure.tolist())),
+    }
+
+
+
+def refresh_valuations()->dict:
+    """
+    Value every user and store the result in redis for the risk dashboard.
+    """
+    valuations:dict = compute_valuations()
+    store_in_cache(key='portfolio_valuations', value=valuations, timeout=settings.CACHE_TIMEOUT_FOR_VALUATIONS, family='valuations')
+    
+    return valuations
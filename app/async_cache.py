@@ -0,0 +1,290 @@
+"""
+Async counterparts of the app.utils cache helpers, used by the views of app.async_views.
+
+With django-redis the commands go through a redis.asyncio client of the running event loop and keys and values
+are encoded the way django-redis does, so the sync and async request paths share every entry. Other backends
+have no async client and fall back to the async methods of the Django cache, which run the sync calls in a thread.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from .cache_codecs import get_codec
+from .cache_tiers import (get_l1, versioned_keys)
+from .metrics import CACHE_BYTES
+from .profiling import traced
+from .utils import (count_read, should_refresh, get_from_l1, fill_l1, user_tag, stock_tag)
+from weakref import WeakKeyDictionary
+from uuid import uuid4
+import asyncio
+import json
+import time
+
+
+class RedisBackend:
+    """
+    redis.asyncio commands on the keys and values of the django-redis default cache.
+    """
+    
+    def __init__(self, client):
+    
+        from redis.asyncio import Redis
+        
+        options:dict = settings.CACHES['default']
+        location = options['LOCATION']
+        self.client = client
+        # OPTIONS['ASYNC_CONNECTION_POOL_KWARGS'] is the async counterpart of CONNECTION_POOL_KWARGS
+        self.redis = Redis.from_url(
+            location if isinstance(location, str) else location[0],
+            **options.get('OPTIONS', {}).get('ASYNC_CONNECTION_POOL_KWARGS', {}),
+        )
+    
+    
+    async def get_many(self, keys:list, version:int=None)->dict:
+    
+        values:list = await self.redis.mget([self.client.make_key(key, version=version) for key in keys])
+        
+        
+        return {key: self.client.decode(value) for key, value in zip(keys, values) if value is not None}
+    
+    
+    async def set_many(self, data:dict, timeout:int, version:int=None):
+    
+        pipeline = self.redis.pipeline(transaction=False)
+        
+        for key, value in data.items():
+            pipeline.set(self.client.make_key(key, version=version), self.client.encode(value), ex=timeout)
+        
+        await pipeline.execute()
+    
+    
+    async def add(self, key:str, value:object, timeout:int, version:int=None)->bool:
+        return bool(await self.redis.set(self.client.make_key(key, version=version), self.client.encode(value), nx=True, ex=timeout))
+    
+    
+    async def delete(self, key:str, version:int=None):
+        await self.redis.delete(self.client.make_key(key, version=version))
+    
+    
+    async def publish(self, channel:str, message:str):
+        await self.redis.publish(channel, message)
+
+
+
+class CacheBackend:
+    """
+    Fallback on the async methods of the Django cache.
+    """
+    
+    async def get_many(self, keys:list, version:int=None)->dict:
+        return await cache.aget_many(keys, version=version)
+    
+    
+    async def set_many(self, data:dict, timeout:int, version:int=None):
+        await cache.aset_many(data, timeout=timeout, version=version)
+    
+    
+    async def add(self, key:str, value:object, timeout:int, version:int=None)->bool:
+        return await cache.aadd(key, value, timeout=timeout, version=version)
+    
+    
+    async def delete(self, key:str, version:int=None):
+        await cache.adelete(key, version=version)
+    
+    
+    async def publish(self, channel:str, message:str):
+        # without Redis there is no other process to tell, as in app.cache_tiers.invalidate
+        pass
+
+
+
+# redis.asyncio connections belong to the event loop that opened them
+_backends:WeakKeyDictionary = WeakKeyDictionary()
+
+
+def get_backend():
+
+    client = getattr(cache, 'client', None)
+    
+    if not hasattr(client, 'get_client'):
+        return CacheBackend()
+    
+    
+    loop = asyncio.get_running_loop()
+    
+    if loop not in _backends:
+        _backends[loop] = RedisBackend(client)
+    
+    
+    return _backends[loop]
+
+
+
+async def aget_from_tiers(key:str, version:int=1, family:str='other'):
+    """
+    Encoded value of `key` from the L1 when it is enabled, else from Redis, like app.utils.get_from_tiers.
+    """
+    cache_data = get_from_l1(key=key, version=version, family=family)
+    
+    if cache_data is not None:
+        return cache_data
+    
+    
+    cache_data = (await get_backend().get_many([key], version=version)).get(key)
+    count_read('l2', family, cache_data)
+    fill_l1(key=key, version=version, cache_data=cache_data)
+    
+    
+    return cache_data
+
+
+
+async def aget_from_cache(key:str, version:int=1, family:str='other'):
+
+    cache_data = await aget_from_tiers(key=key, version=version, family=family)
+    
+    
+    return get_codec().decode(cache_data) if cache_data else None
+
+
+
+@traced('set')
+async def astore_in_cache(key:str, value:object, version:int=1, timeout:int=settings.DEFAULT_TIME_OUT, family:str='other'):
+
+    cache_data:bytes = get_codec().encode(value)
+    await get_backend().set_many({key: cache_data}, timeout=timeout, version=version)
+    CACHE_BYTES.labels(family=family, operation='write').inc(len(cache_data))
+    await ainvalidate([key], version=version)
+
+
+
+async def ainvalidate(keys:list, version:int=1):
+    """
+    Drop keys from the L1 of this process and publish them to the other processes.
+    """
+    l1 = get_l1()
+    
+    if l1 is None:
+        return
+    
+    
+    keys = versioned_keys(keys, version)
+    l1.delete_many(keys)
+    await get_backend().publish(settings.CACHE_L1['CHANNEL'], json.dumps(keys))
+
+
+
+@traced('generation')
+async def ageneration_key(key:str, *tags:str)->str:
+    """
+    `key` suffixed with the current generation of every tag, the same name app.utils.generation_key gives it.
+    """
+    backend = get_backend()
+    keys:list = [f"gen:{tag}" for tag in tags]
+    generations:dict = await backend.get_many(keys)
+    
+    
+    for gen_key in keys:
+        if gen_key not in generations:
+            await backend.add(gen_key, time.time_ns() // 1000, timeout=None)
+            generations.update(await backend.get_many([gen_key]))
+    
+    
+    return f"{key}:g{'.'.join(str(generations[gen_key]) for gen_key in keys)}"
+
+
+
+async def auser_key(username:str)->str:
+    
+    return await ageneration_key(f"user:{username}", user_tag(username))
+
+
+
+async def astock_key(ticker:str)->str:
+    
+    return await ageneration_key(f"stock:{ticker}", stock_tag(ticker))
+
+
+
+async def aget_or_compute(key:str, compute, timeout:int=settings.DEFAULT_TIME_OUT, version:int=1, family:str='other'):
+    """
+    Cached value of `key`, computed by a single caller with the coroutine function `compute` when it is missing or about to expire.
+    """
+    cache_data, value = await asingle_flight(key, compute, timeout, version, family)
+    
+    
+    return get_codec().decode(cache_data) if value is None else value
+
+
+
+@traced('get_or_compute')
+async def asingle_flight(key:str, compute, timeout:int, version:int=1, family:str='other')->tuple:
+    """
+    Stampede protected read of `key` sharing the entries, metadata and lock of app.utils.single_flight,
+    returns (cache_data, value) where value is None on a cache hit.
+    """
+    cache_data = get_from_l1(key=key, version=version, family=family)
+    
+    if cache_data is not None:
+        return cache_data, None
+    
+    
+    backend = get_backend()
+    meta_key, lock_key = f"{key}__meta", f"{key}__lock"
+    cached:dict = await backend.get_many([key, meta_key], version=version)
+    cache_data, meta = cached.get(key), cached.get(meta_key)
+    count_read('l2', family, cache_data)
+    
+    if cache_data and not should_refresh(meta):
+        fill_l1(key=key, version=version, cache_data=cache_data)
+        return cache_data, None
+    
+    
+    token:str = str(uuid4())
+    
+    if not await backend.add(lock_key, token, timeout=settings.CACHE_LOCK_TIMEOUT, version=version):
+        if cache_data:
+            # someone else is refreshing, the stale value is still good enough
+            return cache_data, None
+        
+        cache_data = await await_for(key, version)
+        if cache_data:
+            return cache_data, None
+    
+    
+    try:
+        start:float = time.monotonic()
+        value = await compute()
+        delta:float = time.monotonic() - start
+        cache_data = get_codec().encode(value)
+        CACHE_BYTES.labels(family=family, operation='write').inc(len(cache_data))
+        
+        await backend.set_many(
+            {key: cache_data, meta_key: (time.time() + timeout, delta)},
+            timeout=timeout + settings.CACHE_STALE_TIMEOUT,
+            version=version,
+        )
+        await ainvalidate([key], version=version)
+    finally:
+        if (await backend.get_many([lock_key], version=version)).get(lock_key) == token:
+            await backend.delete(lock_key, version=version)
+    
+    
+    return cache_data, value
+
+
+
+async def await_for(key:str, version:int=1):
+    """
+    Poll for a value another caller is computing without blocking the event loop, None after CACHE_LOCK_WAIT.
+    """
+    deadline:float = time.monotonic() + settings.CACHE_LOCK_WAIT
+    
+    
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        cache_data = (await get_backend().get_many([key], version=version)).get(key)
+        
+        if cache_data:
+            return cache_data
+    
+    
+    return None
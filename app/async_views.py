@@ -0,0 +1,246 @@
+"""
+Async variants of the user, stock and transaction endpoints, mounted under /async/ and meant to be served
+by an ASGI server (`uvicorn config.asgi:application`).
+
+They use the async ORM and the redis.asyncio cache helpers of app.async_cache and publish the Celery tasks
+from a thread, so an in-flight request doesn't hold a worker thread while it waits on Postgres or Redis.
+Serializer validation still runs sync ORM queries and goes through sync_to_async. Responses and cache
+entries are the ones of the DRF views in app.views.
+"""
+from django.conf import settings
+from django.http import (Http404, HttpResponse, JsonResponse, StreamingHttpResponse)
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import (require_GET, require_POST)
+from asgiref.sync import sync_to_async
+from functools import wraps
+from rest_framework import status
+from .async_cache import (aget_from_tiers, aget_from_cache, astore_in_cache, aget_or_compute, asingle_flight, ageneration_key, auser_key, astock_key)
+from .cache_codecs import get_codec
+from .loaders import get_loader
+from .order_status import (PENDING, AsyncStatusSubscription, aset_order_status, status_key, is_final, wait_timeout, astatus_events)
+from .models import (User, StockData)
+from .serializers import (UserSerialzier, StockSerializer, TransactionSerializer)
+from .tasks import (process_transaction_async, enqueue_transaction)
+from uuid import uuid4
+import json
+
+
+def json_errors(view):
+    """
+    Turn Http404 into the JSON body the DRF views return.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+    
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return JsonResponse({'detail': str(exc)}, status=status.HTTP_404_NOT_FOUND)
+    
+    
+    return wrapper
+
+
+
+def parse_json(request):
+    """
+    The JSON body of a request, None when it is not valid JSON.
+    """
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+
+def bytes_response(cache_data:bytes):
+    """
+    Response for encoded cache bytes, sent as they are when the codec stores JSON.
+    """
+    codec = get_codec()
+    
+    if codec.content_type == 'application/json':
+        return HttpResponse(cache_data, content_type=codec.content_type, status=status.HTTP_200_OK)
+    
+    
+    return JsonResponse(codec.decode(cache_data), safe=False, status=status.HTTP_200_OK)
+
+
+
+@csrf_exempt
+@require_POST
+async def create_user(request):
+    """
+    Create a new user and store the user data in the cache.
+    """
+    serializer:UserSerialzier = UserSerialzier(data=parse_json(request))
+    
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    user:User = await User.objects.acreate(**serializer.validated_data)
+    await astore_in_cache(key=await auser_key(user.username), value=UserSerialzier(user).data, family='user')
+    
+    
+    return JsonResponse({"message": "User created", "user_id": user.user_id}, status=status.HTTP_201_CREATED)
+
+
+
+@require_GET
+@json_errors
+async def retrieve_user(request, username:str):
+    """
+    Retrieve user data by username, only one request reloads a popular user when its entry expires.
+    """
+    async def load_user()->dict:
+        user:User = await aget_object_or_404(User, username=username)
+        return UserSerialzier(user).data
+    
+    
+    return JsonResponse(await aget_or_compute(key=await auser_key(username), compute=load_user, family='user'), status=status.HTTP_200_OK)
+
+
+
+@require_GET
+async def list_stocks(request):
+    """
+    List all stock records from the cache entry of the stock listing, recomputed by one request when it expires.
+    """
+    async def load_stocks()->list:
+        return StockSerializer([stock async for stock in StockData.objects.all()], many=True).data
+    
+    
+    key:str = await ageneration_key('stock_data', 'stocks')
+    cache_data, value = await asingle_flight(key, load_stocks, timeout=settings.CACHE_TIMEOUT_FOR_STOCK, family='stock_data')
+    
+    
+    return bytes_response(cache_data) if value is None else JsonResponse(value, safe=False, status=status.HTTP_200_OK)
+
+
+
+@require_GET
+@json_errors
+async def retrieve_stock(request, ticker:str):
+    """
+    Retrieve a specific stock record by ticker. First check the cache, then the database.
+    """
+    cache_key:str = await astock_key(ticker)
+    stock_data:dict = await aget_from_cache(key=cache_key, family='stock')
+    
+    if stock_data:
+        return JsonResponse(stock_data, status=status.HTTP_200_OK)
+    
+    
+    stock:StockData = await aget_object_or_404(StockData, ticker=ticker)
+    stock_data = StockSerializer(stock).data
+    await astore_in_cache(key=cache_key, value=stock_data, family='stock')
+    
+    
+    return JsonResponse(stock_data, status=status.HTTP_200_OK)
+
+
+
+@csrf_exempt
+@require_POST
+@json_errors
+async def create_transaction(request):
+    """
+    Validate a transaction and pass the processing to a Celery task, the publish runs in a thread.
+    """
+    data = parse_json(request)
+    
+    if isinstance(data, dict) and isinstance(data.get('transaction_type'), str):
+        data['transaction_type'] = data['transaction_type'].lower()
+    
+    
+    serializer:TransactionSerializer = TransactionSerializer(data=data)
+    
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    validated_data:dict = serializer.validated_data
+    # the snapshot validation read, from the loader of the request
+    stock:StockData = await sync_to_async(get_loader().stock)(validated_data['ticker'])
+    
+    if validated_data['transaction_type'] == 'buy' and validated_data['user'].balance < stock.close_price * validated_data['transaction_volume']:
+        return JsonResponse({'message': 'Insufficient balance for this transaction.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    order_id:str = str(uuid4())
+    await aset_order_status(order_id, PENDING, 'Transaction is in progress.')
+    
+    dispatch = enqueue_transaction if settings.TRANSACTION_BATCHING else process_transaction_async.delay
+    await sync_to_async(dispatch, thread_sensitive=False)({**serializer.data, 'order_id': order_id})
+    
+    
+    return JsonResponse({'message': 'Transaction is in progress.', 'order_id': order_id}, status=status.HTTP_200_OK)
+
+
+
+@require_GET
+@json_errors
+async def user_transactions(request, user_id:str):
+    """
+    Retrieve all transactions for a specific user, from the cache entry shared with the sync view.
+    """
+    user:User = await aget_object_or_404(User, user_id=user_id)
+    cache_key:str = await ageneration_key(f"{user.username}_transactions", f"user:{user.user_id}")
+    cache_data:bytes = await aget_from_tiers(key=cache_key, family='transactions')
+    
+    if cache_data:
+        return bytes_response(cache_data)
+    
+    
+    transactions:list = [transaction async for transaction in user.transactions.all()]
+    data:list = TransactionSerializer(transactions, many=True).data
+    
+    if transactions:
+        await astore_in_cache(key=cache_key, value=data, family='transactions')
+    
+    
+    return JsonResponse(data, safe=False, status=status.HTTP_200_OK)
+
+
+
+@require_GET
+async def order_status(request, order_id:str):
+    """
+    Status of a transaction order, `?wait=<seconds>` holds a pending order until its status changes (long-poll).
+    """
+    current:dict = await aget_from_cache(key=status_key(order_id), family='order_status')
+    
+    if current is None:
+        return JsonResponse({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    
+    timeout:float = wait_timeout(request.GET)
+    
+    if timeout and not is_final(current):
+        async with AsyncStatusSubscription(order_id) as subscription:
+            current = await subscription.wait(current['status'], timeout) or current
+    
+    
+    return JsonResponse(current, status=status.HTTP_200_OK)
+
+
+
+@require_GET
+async def order_events(request, order_id:str):
+    """
+    Server-sent events stream of the status of a transaction order, a waiting stream holds no thread.
+    """
+    current:dict = await aget_from_cache(key=status_key(order_id), family='order_status')
+    
+    if current is None:
+        return JsonResponse({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+    
+    
+    response = StreamingHttpResponse(astatus_events(order_id, current), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    
+    
+    return response
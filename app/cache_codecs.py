@@ -0,0 +1,124 @@
+"""
+Codecs used by app.utils to turn cached values into bytes and back.
+
+The codec is chosen with the CACHE_CODEC setting. JSON based codecs store bytes that are already
+a valid response body, so a cache hit can be sent as is without decoding and rendering it again.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from datetime import (date, datetime, time)
+from decimal import Decimal
+from uuid import UUID
+import json
+
+
+def encode_default(value:object)->object:
+    """
+    Fallback for the types the encoders don't know, rendered the way DRF renders them.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    
+    
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+
+class JSONCodec:
+    """
+    Standard library JSON, compact like the DRF JSONRenderer.
+    """
+    name:str = 'json'
+    content_type:str = 'application/json'
+    
+    
+    def encode(self, value:object)->bytes:
+        return json.dumps(value, default=encode_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    
+    
+    def decode(self, data:bytes)->object:
+        return json.loads(data)
+
+
+
+class OrjsonCodec:
+    """
+    orjson, several times faster than the standard library on both sides.
+    """
+    name:str = 'orjson'
+    content_type:str = 'application/json'
+    
+    
+    def __init__(self):
+    
+        try:
+            import orjson
+        except ImportError as exc:
+            raise ImproperlyConfigured("CACHE_CODEC 'orjson' requires the orjson package.") from exc
+        
+        self.orjson = orjson
+    
+    
+    def encode(self, value:object)->bytes:
+        return self.orjson.dumps(value, default=encode_default, option=self.orjson.OPT_NON_STR_KEYS)
+    
+    
+    def decode(self, data:bytes)->object:
+        return self.orjson.loads(data)
+
+
+
+class MsgpackCodec:
+    """
+    MessagePack, the smallest payloads but the bytes are not a JSON response body.
+    """
+    name:str = 'msgpack'
+    content_type:str = 'application/msgpack'
+    
+    
+    def __init__(self):
+    
+        try:
+            import msgpack
+        except ImportError as exc:
+            raise ImproperlyConfigured("CACHE_CODEC 'msgpack' requires the msgpack package.") from exc
+        
+        self.msgpack = msgpack
+    
+    
+    def encode(self, value:object)->bytes:
+        return self.msgpack.packb(value, default=encode_default, use_bin_type=True)
+    
+    
+    def decode(self, data:bytes)->object:
+        return self.msgpack.unpackb(data, raw=False)
+
+
+
+CACHE_CODECS:dict = {
+    'json': 'app.cache_codecs.JSONCodec',
+    'orjson': 'app.cache_codecs.OrjsonCodec',
+    'msgpack': 'app.cache_codecs.MsgpackCodec',
+}
+
+_codecs:dict = {}
+
+
+def get_codec(name:str=None):
+    """
+    The codec named by CACHE_CODEC (or `name`), either a key of CACHE_CODECS or a dotted path to a codec class.
+    """
+    name = name or getattr(settings, 'CACHE_CODEC', 'json')
+    
+    if name not in _codecs:
+        try:
+            _codecs[name] = import_string(CACHE_CODECS.get(name, name))()
+        except ImportError as exc:
+            raise ImproperlyConfigured(f"Unknown CACHE_CODEC {name!r}.") from exc
+    
+    
+    return _codecs[name]
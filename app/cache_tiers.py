@@ -0,0 +1,223 @@
+"""
+Optional in-process L1 cache in front of the Redis (L2) cache used by app.utils.
+
+Entries are the encoded bytes stored in Redis, so they can't be mutated by callers. Every write
+or delete through app.utils publishes the key on CACHE_L1['CHANNEL'] and a subscriber thread in every
+process drops it from its own L1. The short TIMEOUT bounds staleness if a message is missed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from collections import OrderedDict
+from threading import (Event, Lock, Thread)
+import json
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    Thread safe LRU cache with a size bound and a per entry TTL.
+    """
+    
+    def __init__(self, max_entries:int, timeout:float):
+    
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries:OrderedDict = OrderedDict()
+        self._lock = Lock()
+    
+    
+    def get(self, key:str):
+    
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is None:
+                return None
+            
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    
+    def set(self, key:str, value:object):
+    
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    
+    def delete_many(self, keys:list):
+    
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    
+    def clear(self):
+    
+        with self._lock:
+            self._entries.clear()
+    
+    
+    def __len__(self)->int:
+        return len(self._entries)
+
+
+
+_l1:LocalCache = None
+_subscriber_pid:int = None
+_subscriber_lock = Lock()
+# thread of this process and the event that stops it
+_subscriber:Thread = None
+_subscriber_stop:Event = None
+
+
+def get_l1()->LocalCache:
+    """
+    The L1 cache of this process, None when CACHE_L1 is disabled.
+    
+    The invalidation subscriber is started on first use in every process, forked workers start their own.
+    """
+    global _l1
+    options:dict = settings.CACHE_L1
+    
+    if not options['ENABLED']:
+        return None
+    
+    
+    if _l1 is None:
+        # a subscriber started for a previous L1 would never invalidate this one
+        stop_subscriber()
+        _l1 = LocalCache(options['MAX_ENTRIES'], options['TIMEOUT'])
+    
+    if _subscriber_pid != os.getpid():
+        start_subscriber()
+    
+    
+    return _l1
+
+
+
+def versioned_keys(keys:list, version:int=1)->list:
+    return [cache.make_key(key, version=version) for key in keys]
+
+
+
+def invalidate(keys:list, version:int=1):
+    """
+    Drop keys from the L1 of this process and publish them to the other processes.
+    """
+    l1:LocalCache = get_l1()
+    
+    if l1 is None:
+        return
+    
+    
+    keys = versioned_keys(keys, version)
+    l1.delete_many(keys)
+    
+    connection = redis_connection()
+    if connection is not None:
+        connection.publish(settings.CACHE_L1['CHANNEL'], json.dumps(keys))
+
+
+
+def redis_connection():
+    """
+    Raw Redis client of the default cache, None when the cache is not django-redis.
+    """
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+
+def start_subscriber():
+    """
+    Start the daemon thread that applies invalidations published by the other processes to the current L1.
+    """
+    global _subscriber_pid, _subscriber, _subscriber_stop
+    
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid():
+            return
+        
+        _subscriber_pid = os.getpid()
+        # entries copied from the parent process could have missed invalidations
+        _l1.clear()
+        
+        connection = redis_connection()
+        if connection is None:
+            return
+        
+        _subscriber_stop = Event()
+        _subscriber = Thread(target=listen, args=(connection, _l1, _subscriber_stop), name='cache-l1-invalidation', daemon=True)
+        _subscriber.start()
+
+
+
+def stop_subscriber(timeout:float=5):
+    """
+    Stop the subscriber thread of this process, the next get_l1() starts a new one.
+    """
+    global _subscriber_pid, _subscriber, _subscriber_stop
+    
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid() and _subscriber is not None:
+            _subscriber_stop.set()
+            _subscriber.join(timeout)
+        
+        _subscriber_pid, _subscriber, _subscriber_stop = None, None, None
+
+
+
+def reset_l1():
+    """
+    Stop the subscriber and drop the L1 of this process.
+    """
+    global _l1
+    
+    stop_subscriber()
+    _l1 = None
+
+
+
+def listen(connection, l1:LocalCache, stop:Event=None):
+    """
+    Drop the published keys from `l1`, the instance the thread was started for, until `stop` is set.
+    """
+    stop = stop or Event()
+    
+    while not stop.is_set():
+        try:
+            pubsub = connection.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.CACHE_L1['CHANNEL'])
+            # anything published while we were not subscribed is lost
+            l1.clear()
+            
+            try:
+                while not stop.is_set():
+                    # wakes up every second to notice `stop`
+                    message = pubsub.get_message(timeout=1)
+                    
+                    if message is not None:
+                        # our own messages come back too, dropping the keys again is harmless
+                        l1.delete_many(json.loads(message['data']))
+            finally:
+                pubsub.close()
+        except Exception:
+            logger.exception("cache L1 invalidation subscriber failed, reconnecting")
+            stop.wait(1)
@@ -0,0 +1,220 @@
+from datetime import (datetime, timedelta)
+import re
+from django.db.models import Q
+from .models import (StockBar, StockCandle)
+
+
+# rollups kept up to date on ingest, every level is aggregated from the one before it
+ROLLUP_INTERVALS:dict = {
+    '1m': timedelta(minutes=1),
+    '5m': timedelta(minutes=5),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+INTERVAL_UNITS:dict = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+CANDLE_UPDATE_FIELDS = ['open_price', 'close_price', 'high', 'low', 'volume', 'first_timestamp', 'last_timestamp']
+
+EPOCH = datetime(1970, 1, 1)
+
+# bounds the number of tickers read by one rollup query
+CANDLE_TICKER_CHUNK = 500
+
+
+def parse_interval(interval:str)->timedelta:
+    """
+    Parse an interval such as `5m`, `4h` or `1d`, returns None when it is not valid.
+    """
+    match = re.fullmatch(r'(\d+)([mhd])', interval or '')
+    
+    if match is None or int(match.group(1)) == 0:
+        return None
+    
+    
+    return timedelta(**{INTERVAL_UNITS[match.group(2)]: int(match.group(1))})
+
+
+
+def bucket_start(timestamp:datetime, delta:timedelta)->datetime:
+    """
+    Floor a timestamp to the start of its bucket, buckets are aligned on the unix epoch.
+    """
+    return timestamp - (timestamp - EPOCH) % delta
+
+
+
+def source_interval(delta:timedelta)->str:
+    """
+    The coarsest rollup the requested interval can be resampled from.
+    """
+    divisors = [name for name, rollup in ROLLUP_INTERVALS.items() if delta % rollup == timedelta(0)]
+    
+    
+    return divisors[-1] if divisors else None
+
+
+
+def aggregate(rows, delta:timedelta, interval:str=None)->dict:
+    """
+    Resample rows into OHLCV buckets of `delta`, keyed by (ticker, bucket_start).
+    
+    Rows are either StockBar or StockCandle objects, they don't need to be sorted.
+    The volume of a bucket is the sum of the volumes of its rows: the bars store the volume of each ingested
+    StockData snapshot as it was reported, not a traded volume, so a candle volume is a sum of snapshot volumes.
+    """
+    buckets:dict = {}
+    
+    
+    for row in rows:
+        first = getattr(row, 'first_timestamp', None) or row.timestamp
+        last = getattr(row, 'last_timestamp', None) or row.timestamp
+        key = (row.ticker, bucket_start(first, delta))
+        candle = buckets.get(key)
+        
+        if candle is None:
+            buckets[key] = StockCandle(
+                ticker=row.ticker,
+                interval=interval,
+                bucket_start=key[1],
+                open_price=row.open_price,
+                close_price=row.close_price,
+                high=row.high,
+                low=row.low,
+                volume=row.volume,
+                first_timestamp=first,
+                last_timestamp=last,
+            )
+            continue
+        
+        if first < candle.first_timestamp:
+            candle.open_price, candle.first_timestamp = row.open_price, first
+        if last >= candle.last_timestamp:
+            candle.close_price, candle.last_timestamp = row.close_price, last
+        
+        candle.high = max(candle.high, row.high)
+        candle.low = min(candle.low, row.low)
+        candle.volume += row.volume
+    
+    
+    return buckets
+
+
+
+def refresh_candles(bars:list)->int:
+    """
+    Recompute the rollup buckets touched by newly appended bars, level by level.
+    
+    Only the touched buckets are aggregated: 1m from the bars, 5m from the 1m candles and so on,
+    so a bucket never reads more than one level of rows and re-ingesting a bar is idempotent.
+    """
+    touched:set = {(bar.ticker, bar.timestamp) for bar in bars}
+    updated:int = 0
+    previous:str = None
+    
+    
+    for interval, delta in ROLLUP_INTERVALS.items():
+        touched = {(ticker, bucket_start(timestamp, delta)) for ticker, timestamp in touched}
+        candles:list = []
+        
+        for chunk in _chunk_by_ticker(touched):
+            rows = _source_rows(previous, chunk, delta)
+            buckets = aggregate(rows, delta, interval=interval)
+            candles.extend(buckets[key] for key in chunk if key in buckets)
+        
+        
+        StockCandle.objects.bulk_create(
+            candles,
+            update_conflicts=True,
+            unique_fields=['ticker', 'interval', 'bucket_start'],
+            update_fields=CANDLE_UPDATE_FIELDS,
+        )
+        updated += len(candles)
+        previous = interval
+    
+    
+    return updated
+
+
+
+def resample_candles(ticker:str, interval:str, start:datetime=None, end:datetime=None)->list:
+    """
+    Candles of a ticker for any interval, read from the coarsest rollup that divides it.
+    
+    Standard intervals are returned as stored, the others are resampled from a much smaller set of rollup rows
+    instead of the raw bars. Raises ValueError for an interval that is not a whole number of minutes.
+    """
+    delta:timedelta = parse_interval(interval)
+    source:str = source_interval(delta) if delta else None
+    
+    if source is None:
+        raise ValueError(f"Invalid interval {interval!r}, use a number followed by m, h or d.")
+    
+    
+    candles = StockCandle.objects.filter(ticker=ticker, interval=source).order_by('bucket_start')
+    
+    if start is not None:
+        candles = candles.filter(bucket_start__gte=bucket_start(start, delta))
+    if end is not None:
+        candles = candles.filter(bucket_start__lte=end)
+    
+    
+    if source == interval:
+        return list(candles)
+    
+    
+    buckets:dict = aggregate(candles, delta, interval=interval)
+    return [buckets[key] for key in sorted(buckets)]
+
+
+
+def _chunk_by_ticker(touched:set):
+    """
+    Split the touched buckets so one query never reads more than CANDLE_TICKER_CHUNK tickers.
+    """
+    tickers:list = sorted({ticker for ticker, _ in touched})
+    
+    
+    for index in range(0, len(tickers), CANDLE_TICKER_CHUNK):
+        chunk:set = set(tickers[index:index + CANDLE_TICKER_CHUNK])
+        yield {key for key in touched if key[0] in chunk}
+
+
+
+def _source_rows(previous:str, chunk:set, delta:timedelta):
+    """
+    Rows of the level below covering the touched buckets, bars for the first level.
+    
+    Every ticker is bounded by its own runs of adjacent touched buckets, so tickers touched at different times
+    or a ticker touched at both ends of a backfill don't read every row in between.
+    """
+    field:str = 'timestamp' if previous is None else 'bucket_start'
+    bounds:Q = Q()
+    
+    for ticker, start, end in _bucket_ranges(chunk, delta):
+        bounds |= Q(ticker=ticker, **{f'{field}__gte': start, f'{field}__lt': end})
+    
+    
+    if previous is None:
+        return StockBar.objects.filter(bounds).order_by()
+    
+    
+    return StockCandle.objects.filter(bounds, interval=previous).order_by()
+
+
+
+def _bucket_ranges(chunk:set, delta:timedelta)->list:
+    """
+    [ticker, start, end) of every run of adjacent buckets in the chunk.
+    """
+    ranges:list = []
+    
+    
+    for ticker, bucket in sorted(chunk):
+        if ranges and ranges[-1][0] == ticker and ranges[-1][2] == bucket:
+            ranges[-1][2] = bucket + delta
+        else:
+            ranges.append([ticker, bucket, bucket + delta])
+    
+    
+    return ranges
@@ -0,0 +1,60 @@
+import csv
+import json
+
+
+# column name in the export -> Transaction field, the names follow TransactionSerializer
+TRANSACTION_EXPORT_FIELDS = {
+    'transaction_id': 'transaction_id',
+    'user': 'user_id',
+    'ticker': 'ticker',
+    'transaction_type': 'transaction_type',
+    'transaction_volume': 'transaction_volume',
+    'transaction_price': 'transaction_price',
+    'timestamp': 'timestamp',
+}
+
+
+
+class Echo:
+    """
+    File-like object whose write returns the value instead of buffering it, used to stream csv.writer output.
+    """
+    def write(self, value:str)->str:
+        return value
+
+
+
+def _format_row(row:tuple)->list:
+    
+    transaction_id, user_id, ticker, transaction_type, transaction_volume, transaction_price, timestamp = row
+    return [str(transaction_id), str(user_id), ticker, transaction_type, transaction_volume, str(transaction_price), timestamp.isoformat()]
+
+
+
+def iter_transactions_ndjson(rows):
+    """
+    Render transaction rows (as returned by values_list over TRANSACTION_EXPORT_FIELDS) as NDJSON lines.
+    """
+    columns:list = list(TRANSACTION_EXPORT_FIELDS)
+    
+    for row in rows:
+        yield json.dumps(dict(zip(columns, _format_row(row)))) + '\n'
+
+
+
+def iter_transactions_csv(rows):
+    """
+    Render transaction rows (as returned by values_list over TRANSACTION_EXPORT_FIELDS) as CSV with a header line.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(list(TRANSACTION_EXPORT_FIELDS))
+    
+    for row in rows:
+        yield writer.writerow(_format_row(row))
+
+
+
+TRANSACTION_EXPORT_FORMATS = {
+    'ndjson': (iter_transactions_ndjson, 'application/x-ndjson'),
+    'csv': (iter_transactions_csv, 'text/csv'),
+}
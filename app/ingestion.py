@@ -0,0 +1,208 @@
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from itertools import islice
+import codecs
+import csv
+import json
+import numpy as np
+from .models import (StockData, StockBar)
+from .serializers import (StockRowSerializer, PRICE_INVARIANTS)
+from .candles import refresh_candles
+from .utils import (bump_generation, stock_tag)
+
+
+STOCK_UPSERT_FIELDS = ['open_price', 'close_price', 'high', 'low', 'volume', 'timestamp']
+
+
+def validate_stock_rows(rows:list, start:int=0)->tuple:
+    """
+    Validate a batch of raw stock rows, invalid rows are reported by their position (offset by `start`) instead of failing the batch.
+    
+    Every row is parsed by one reused serializer, then the OHLC invariants are checked on whole price columns
+    with numpy in one vectorized pass instead of one StockSerializer.validate call per row.
+    """
+    serializer:StockRowSerializer = StockRowSerializer()
+    parsed, errors = [], []
+    
+    
+    for index, row in enumerate(rows, start=start):
+        if isinstance(row, ValidationError):
+            # the row could not even be parsed
+            errors.append({'index': index, 'errors': row.detail})
+            continue
+        
+        try:
+            parsed.append((index, serializer.to_internal_value(row)))
+        except ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+    
+    
+    violations = price_violations([row for _, row in parsed])
+    valid_rows:list = []
+    
+    for (index, row), violation in zip(parsed, violations.tolist()):
+        if violation < 0:
+            valid_rows.append(row)
+            continue
+        
+        field, _, _, _, message = PRICE_INVARIANTS[violation]
+        errors.append({'index': index, 'errors': ValidationError({field: [message]}).detail})
+    
+    
+    errors.sort(key=lambda error: error['index'])
+    
+    
+    return valid_rows, errors
+
+
+
+def price_violations(rows:list):
+    """
+    Position in PRICE_INVARIANTS of the first invariant every row violates, -1 for the valid rows.
+    
+    The prices have at most 12 digits, so float64 keeps their order exactly.
+    """
+    columns:dict = {
+        name: np.array([row[name] for row in rows], dtype=np.float64)
+        for name in ('open_price', 'close_price', 'high', 'low')
+    }
+    violations = np.full(len(rows), -1)
+    
+    
+    # the later invariants are written first, so the first violated one is the one left
+    for position in reversed(range(len(PRICE_INVARIANTS))):
+        _, left, violated, right, _ = PRICE_INVARIANTS[position]
+        violations[violated(columns[left], columns[right])] = position
+    
+    
+    return violations
+
+
+
+def upsert_stock_rows(rows:list)->list:
+    """
+    Insert or update the validated rows on ticker in one statement and invalidate the cache in one round trip.
+    
+    When a ticker appears more than once in the batch the last row wins.
+    """
+    stocks:dict = {row['ticker']: StockData(**row) for row in rows}
+    
+    if not stocks:
+        return []
+    
+    
+    with transaction.atomic():
+        StockData.objects.bulk_create(
+            list(stocks.values()),
+            update_conflicts=True,
+            unique_fields=['ticker'],
+            update_fields=STOCK_UPSERT_FIELDS,
+        )
+        append_stock_bars(list(stocks.values()))
+    
+    
+    # one pipeline: the snapshots of the upserted tickers only, and the listings built from every ticker
+    bump_generation('stocks', *(stock_tag(ticker) for ticker in stocks))
+    
+    
+    return list(stocks.values())
+
+
+
+def append_stock_bars(stocks:list)->list:
+    """
+    Append one historical bar per StockData snapshot, keyed by (ticker, timestamp),
+    and roll the touched buckets up into the candle tables.
+    """
+    bars:list = [
+        StockBar(
+            ticker=stock.ticker,
+            open_price=stock.open_price,
+            close_price=stock.close_price,
+            high=stock.high,
+            low=stock.low,
+            volume=stock.volume,
+            timestamp=stock.timestamp,
+        )
+        for stock in stocks
+    ]
+    
+    
+    StockBar.objects.bulk_create(bars, ignore_conflicts=True)
+    refresh_candles(bars)
+    
+    
+    return bars
+
+
+
+def iter_ndjson_rows(stream):
+    """
+    Lazily parse newline delimited JSON, one row per line.
+    
+    Lines that are not valid JSON are yielded as a ValidationError so they are reported with the other rejected rows.
+    """
+    for line in stream:
+        line = line.strip()
+        
+        if not line:
+            continue
+        
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield ValidationError({'non_field_errors': [f'Invalid JSON: {exc}']})
+
+
+
+def iter_csv_rows(stream):
+    """
+    Lazily parse CSV with a header line, one row per line.
+    
+    A body that is not UTF-8 or not CSV ends the stream with a ValidationError, reported as the last rejected row,
+    the rows before it are still saved.
+    """
+    try:
+        yield from csv.DictReader(codecs.iterdecode(stream, 'utf-8'))
+    except (UnicodeDecodeError, csv.Error) as exc:
+        yield ValidationError({'non_field_errors': [f'Invalid CSV: {exc}']})
+
+
+
+def iter_chunks(rows, size:int):
+    """
+    Group an iterable into lists of at most `size` items without materializing it.
+    """
+    iterator = iter(rows)
+    
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+
+def ingest_stock_stream(rows, batch_size:int, max_errors:int=100)->dict:
+    """
+    Validate and upsert a stream of stock rows chunk by chunk, so memory is bounded by `batch_size`.
+    
+    Only the first `max_errors` row errors are reported, the others are only counted in `errors_omitted`.
+    """
+    report:dict = {'accepted': 0, 'rejected': 0, 'errors_omitted': 0, 'chunks': []}
+    
+    
+    for number, chunk in enumerate(iter_chunks(rows, batch_size)):
+        valid_rows, errors = validate_stock_rows(chunk, start=number * batch_size)
+        upsert_stock_rows(valid_rows)
+        
+        kept:list = errors[:max(max_errors - (report['rejected'] - report['errors_omitted']), 0)]
+        report['accepted'] += len(valid_rows)
+        report['rejected'] += len(errors)
+        report['errors_omitted'] += len(errors) - len(kept)
+        report['chunks'].append({
+            'chunk': number,
+            'accepted': len(valid_rows),
+            'rejected': len(errors),
+            'errors': kept,
+        })
+    
+    
+    return report
@@ -0,0 +1,116 @@
+"""
+Identity map of the rows read by one request, so the validation and dispatch path of an order fetches each row once.
+
+LoaderMiddleware opens a scope per request, get_loader() returns the loader of the current scope (a throwaway
+one outside of any). Stocks are read from their `stock:{ticker}` cache entry, the snapshot SotckViewSet.retrieve
+serves and every settlement drops once committed, and only hit the database when it is missing. Rows are snapshots
+for validation: the tasks re-check balances, volumes and holdings with conditional updates when they settle.
+"""
+from django.http import Http404
+from contextvars import ContextVar
+from contextlib import contextmanager
+from .models import (StockData, Position)
+from .utils import (get_from_cache, store_in_cache, stock_key)
+
+
+class Loader:
+    """
+    Rows by model and primary key, stock snapshots by ticker and positions by (user, ticker).
+    """
+    
+    def __init__(self):
+    
+        self.rows:dict = {}
+        self.stocks:dict = {}
+        self.positions:dict = {}
+    
+    
+    def add(self, instance):
+    
+        self.rows[(type(instance), str(instance.pk))] = instance
+    
+    
+    def get(self, model, pk):
+        """
+        The row of `model` with primary key `pk`, None when there is none.
+        """
+        key:tuple = (model, str(pk))
+        
+        if key not in self.rows:
+            self.rows[key] = model._default_manager.filter(pk=pk).first()
+        
+        
+        return self.rows[key]
+    
+    
+    def stock(self, ticker:str)->StockData:
+        """
+        Snapshot of a stock from its cache entry, raises Http404 like get_object_or_404 when the ticker does not exist.
+        """
+        if ticker not in self.stocks:
+            self.stocks[ticker] = self.load_stock(ticker)
+        
+        if self.stocks[ticker] is None:
+            raise Http404(f"No {StockData._meta.object_name} matches the given query.")
+        
+        
+        return self.stocks[ticker]
+    
+    
+    def load_stock(self, ticker:str)->StockData:
+    
+        from .serializers import StockSerializer
+        
+        cache_key:str = stock_key(ticker)
+        stock_data:dict = get_from_cache(key=cache_key, family='stock')
+        
+        if stock_data:
+            return StockData(**{field.attname: field.to_python(stock_data[field.name]) for field in StockData._meta.concrete_fields if field.name in stock_data})
+        
+        
+        stock:StockData = StockData.objects.filter(ticker=ticker).first()
+        
+        if stock is not None:
+            store_in_cache(key=cache_key, value=StockSerializer(stock).data, family='stock')
+        
+        
+        return stock
+    
+    
+    def position(self, user_id:str, ticker:str)->Position:
+        """
+        Position of a user in a ticker read with its user, which is kept too, None when the user holds none.
+        """
+        key:tuple = (str(user_id), ticker)
+        
+        if key not in self.positions:
+            self.positions[key] = Position.objects.select_related('user').filter(user_id=user_id, ticker=ticker).first()
+            
+            if self.positions[key] is not None:
+                self.add(self.positions[key].user)
+        
+        
+        return self.positions[key]
+
+
+
+_loader:ContextVar = ContextVar('loader', default=None)
+
+
+def get_loader()->Loader:
+
+    return _loader.get() or Loader()
+
+
+
+@contextmanager
+def loader_scope():
+    """
+    Share one loader with everything running in the block.
+    """
+    token = _loader.set(Loader())
+    
+    try:
+        yield _loader.get()
+    finally:
+        _loader.reset(token)
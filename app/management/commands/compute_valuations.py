@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app.analytics import refresh_valuations
+
+
+class Command(BaseCommand):
+    help = "Value every portfolio in one batched pass and store the result in redis for the risk dashboard."
+    
+    
+    def handle(self, *args, **options):
+        
+        valuations:dict = refresh_valuations()
+        self.stdout.write(self.style.SUCCESS(f"Valued {len(valuations['users'])} portfolios over {len(valuations['tickers'])} tickers."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from app.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed value for the profiling header, requests sending it are profiled by ProfilingMiddleware."
+    
+    
+    def handle(self, *args, **options):
+        
+        self.stdout.write(f"{settings.PROFILING['HEADER']}: {make_token()}")
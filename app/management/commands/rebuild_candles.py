@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import (StockBar, StockCandle)
+from app.candles import refresh_candles
+
+
+class Command(BaseCommand):
+    help = "Rebuild the candle rollups from the historical bars, for backfills and repairs."
+    
+    
+    def add_arguments(self, parser):
+        
+        parser.add_argument('--ticker', dest='tickers', action='append', help="Only rebuild the candles of this ticker (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+    
+    
+    def handle(self, *args, tickers=None, chunk_size=5000, **options):
+        
+        bars = StockBar.objects.order_by('ticker', 'timestamp')
+        candles = StockCandle.objects.all()
+        
+        if tickers:
+            bars = bars.filter(ticker__in=tickers)
+            candles = candles.filter(ticker__in=tickers)
+        
+        
+        with transaction.atomic():
+            candles.delete()
+            
+            # bars are refreshed in order, so each chunk only touches its own buckets and the boundary ones
+            chunk:list = []
+            for bar in bars.only('ticker', 'timestamp').iterator(chunk_size=chunk_size):
+                chunk.append(bar)
+                
+                if len(chunk) == chunk_size:
+                    refresh_candles(chunk)
+                    chunk = []
+            
+            refresh_candles(chunk)
+        
+        
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {candles.count()} candles."))
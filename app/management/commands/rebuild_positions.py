@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from decimal import Decimal
+from app.models import (Position, Transaction, User)
+from app.positions import replay_position
+
+
+class Command(BaseCommand):
+    help = "Rebuild the positions table by replaying the transaction ledger, for backfills and repairs."
+    
+    
+    def add_arguments(self, parser):
+        
+        parser.add_argument('--user', dest='user_ids', action='append', help="Only rebuild the positions of this user_id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+    
+    
+    def handle(self, *args, user_ids=None, chunk_size=5000, **options):
+        
+        ledger = Transaction.objects.order_by('user_id', 'ticker', 'timestamp', 'transaction_id')
+        positions = Position.objects.all()
+        users = User.objects.select_for_update().order_by('pk')
+        
+        if user_ids:
+            ledger = ledger.filter(user_id__in=user_ids)
+            positions = positions.filter(user_id__in=user_ids)
+            users = users.filter(pk__in=user_ids)
+        
+        
+        with transaction.atomic():
+            # every settlement updates the row of its user, so locking the users (in the pk order the batch settlement uses)
+            # blocks their settlements until the positions are rebuilt from a ledger no settlement can append to meanwhile
+            list(users.values_list('pk', flat=True))
+            
+            state:dict = {}
+            rows = ledger.values_list('user_id', 'ticker', 'transaction_type', 'transaction_volume', 'transaction_price').iterator(chunk_size=chunk_size)
+            
+            for user_id, ticker, transaction_type, transaction_volume, transaction_price in rows:
+                quantity, cost_basis = state.get((user_id, ticker), (0, Decimal(0)))
+                state[(user_id, ticker)] = replay_position(quantity, cost_basis, transaction_type, transaction_volume, transaction_price)
+            
+            
+            positions.delete()
+            Position.objects.bulk_create(
+                (
+                    Position(user_id=user_id, ticker=ticker, quantity=quantity, cost_basis=cost_basis)
+                    for (user_id, ticker), (quantity, cost_basis) in state.items()
+                ),
+                batch_size=chunk_size,
+            )
+        
+        
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(state)} positions."))
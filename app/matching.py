@@ -0,0 +1,174 @@
+"""
+Matching engine run by the dedicated matching worker (`celery -A config worker -Q matching --pool=solo`).
+
+One process owns the books of all tickers, so a book is only ever mutated by one order at a time.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from decimal import Decimal
+from .models import (User, Transaction, OrderBookSnapshot)
+from .orderbook import (Order, OrderBook, Fill)
+from .utils import (store_in_cache, get_from_cache, invalidate_on_commit, user_tag, stock_tag)
+from .positions import apply_position
+from .order_status import set_order_status
+
+
+# books of this process, loaded lazily from the last snapshot
+_books:dict = {}
+
+
+class FillRejected(Exception):
+    """
+    Raised to roll back a fill, `side` is the side whose user could not settle it.
+    """
+    def __init__(self, side:str):
+        super().__init__(side)
+        self.side = side
+
+
+
+def load_book(ticker:str)->OrderBook:
+    """
+    Restore the book of a ticker from the most recent of its redis and postgres snapshots.
+    """
+    snapshots:list = [get_from_cache(key=f"order_book_{ticker}", family='order_book')]
+    stored:OrderBookSnapshot = OrderBookSnapshot.objects.filter(ticker=ticker).first()
+    
+    if stored:
+        snapshots.append(stored.data)
+    
+    
+    snapshots = [snapshot for snapshot in snapshots if snapshot]
+    
+    if not snapshots:
+        return OrderBook(ticker)
+    
+    return OrderBook.restore(max(snapshots, key=lambda snapshot: snapshot['sequence']))
+
+
+
+def get_book(ticker:str)->OrderBook:
+    
+    if ticker not in _books:
+        _books[ticker] = load_book(ticker)
+    
+    return _books[ticker]
+
+
+
+def settled_tags(user_ids, usernames, tickers)->tuple:
+    """
+    Generation tags bumped by a settlement: every listing, range and page of the users, their snapshots and the stock snapshots.
+    
+    The snapshots are invalidated rather than overwritten: the on_commit hooks of concurrent settlements run in any order,
+    so a snapshot written by one of them could replace a newer one. The next read refills them from the database.
+    """
+    return (*(f"user:{user_id}" for user_id in user_ids), *(user_tag(username) for username in usernames), *(stock_tag(ticker) for ticker in tickers))
+
+
+
+def settle_fill(ticker:str, fill:Fill):
+    """
+    Move the cash and the shares of one fill and record it as a buy and a sell Transaction.
+    """
+    cost:Decimal = fill.price * fill.quantity
+    
+    
+    with transaction.atomic():
+        # lock both users in pk order like the batch processor, locking them in fill order could deadlock against it
+        list(User.objects.select_for_update().filter(pk__in=[fill.buyer_id, fill.seller_id]).order_by('pk').values_list('pk', flat=True))
+        
+        if not User.objects.filter(pk=fill.buyer_id, balance__gte=cost).update(balance=F('balance') - cost):
+            raise FillRejected('buy')
+        
+        if not User.objects.filter(pk=fill.seller_id).update(balance=F('balance') + cost):
+            raise FillRejected('sell')
+        
+        if not apply_position(fill.seller_id, ticker, 'sell', fill.quantity, fill.price):
+            raise FillRejected('sell')
+        
+        apply_position(fill.buyer_id, ticker, 'buy', fill.quantity, fill.price)
+        
+        
+        Transaction.objects.bulk_create([
+            Transaction(user_id=fill.buyer_id, ticker=ticker, transaction_type='buy', transaction_volume=fill.quantity, transaction_price=fill.price),
+            Transaction(user_id=fill.seller_id, ticker=ticker, transaction_type='sell', transaction_volume=fill.quantity, transaction_price=fill.price),
+        ])
+
+
+
+def match_order(order_data:dict)->dict:
+    """
+    Match one order, persist its fills and snapshot the book.
+    
+    The fills and, every ORDER_BOOK_SNAPSHOT_INTERVAL orders, the postgres snapshot are committed together,
+    the redis snapshot is written after the commit. If anything fails the in-memory book is dropped
+    and reloaded from the snapshots on the next order.
+    
+    The status of the order and of every resting order it touched is published once the fills are committed.
+    """
+    ticker:str = order_data['ticker']
+    book:OrderBook = get_book(ticker)
+    order = Order(
+        order_id=order_data['order_id'],
+        user_id=order_data['user'],
+        side=order_data['side'],
+        quantity=order_data['quantity'],
+        price=Decimal(order_data['price']) if order_data.get('price') is not None else None,
+    )
+    quantity:int = order.quantity
+    # resting orders the book cancelled because their user could not settle a fill
+    cancelled:list = []
+    
+    
+    def settle(fill:Fill):
+        try:
+            settle_fill(ticker, fill)
+        except FillRejected as exc:
+            if exc.side != order.side:
+                cancelled.append(fill.sell_order_id if order.side == 'buy' else fill.buy_order_id)
+            return exc.side
+    
+    
+    try:
+        with transaction.atomic():
+            fills:list = book.submit(order, settle=settle)
+            
+            if book.sequence % settings.ORDER_BOOK_SNAPSHOT_INTERVAL == 0:
+                OrderBookSnapshot.objects.update_or_create(ticker=ticker, defaults={'sequence': book.sequence, 'data': book.snapshot()})
+    except Exception:
+        _books.pop(ticker, None)
+        raise
+    
+    
+    store_in_cache(key=f"order_book_{ticker}", value=book.snapshot(), timeout=None, family='order_book')
+    
+    users:set = {fill.buyer_id for fill in fills} | {fill.seller_id for fill in fills}
+    if users:
+        # the fills are committed, invalidate the balances and everything derived from the users in one round trip
+        invalidate_on_commit(*settled_tags(users, User.objects.filter(pk__in=users).values_list('username', flat=True), ()))
+    
+    
+    filled:int = sum(fill.quantity for fill in fills)
+    
+    if order.order_id in book.orders:
+        status = 'partially_filled' if filled else 'resting'
+    else:
+        status = 'filled' if filled == quantity else 'partially_filled' if filled else 'cancelled'
+    
+    
+    set_order_status(order.order_id, status, f"Filled {filled} of {quantity}.")
+    
+    for resting_id in dict.fromkeys(fill.sell_order_id if order.side == 'buy' else fill.buy_order_id for fill in fills):
+        set_order_status(resting_id, 'partially_filled' if resting_id in book.orders else 'filled', 'Resting order matched.')
+    for resting_id in cancelled:
+        set_order_status(resting_id, 'cancelled', 'Resting order cancelled, its user could not settle a fill.')
+    
+    
+    return {
+        'order_id': order.order_id,
+        'status': status,
+        'filled': filled,
+        'fills': [{'price': str(fill.price), 'quantity': fill.quantity} for fill in fills],
+    }
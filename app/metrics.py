@@ -0,0 +1,66 @@
+"""
+Prometheus metrics of the web and worker processes, exposed on /metrics.
+
+With several worker processes (gunicorn, celery prefork) set PROMETHEUS_MULTIPROC_DIR so every
+process writes its samples there and /metrics aggregates them.
+"""
+from prometheus_client import (Counter, Histogram)
+from celery.signals import (before_task_publish, task_prerun, task_postrun)
+from time import (perf_counter, time)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latency of the requests by view.', ['view', 'method', 'status'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run by one request.', ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time one request spent in database queries.', ['view'],
+)
+
+CACHE_HITS = Counter('cache_hits', 'Cache hits by tier (l1 is the in-process cache, l2 is Redis) and key family.', ['tier', 'family'])
+CACHE_MISSES = Counter('cache_misses', 'Cache misses by tier (l1 is the in-process cache, l2 is Redis) and key family.', ['tier', 'family'])
+CACHE_BYTES = Counter('cache_bytes', 'Encoded bytes read from and written to the cache by key family.', ['family', 'operation'])
+
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Time between publishing a task and a worker starting it.', ['task'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+TASK_DURATION = Histogram('celery_task_duration_seconds', 'Run time of the tasks by final state.', ['task', 'state'])
+
+
+# start times of the tasks running in this process, by task id
+_task_starts:dict = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers:dict=None, **kwargs):
+    """
+    Record when a task was published, in a message header the worker reads back.
+    """
+    if headers is not None:
+        headers['published_at'] = time()
+
+
+
+@task_prerun.connect
+def record_queue_wait(task_id:str=None, task=None, **kwargs):
+
+    published_at = getattr(task.request, 'published_at', None)
+    
+    if published_at is not None:
+        TASK_QUEUE_WAIT.labels(task=task.name).observe(max(time() - published_at, 0))
+    
+    _task_starts[task_id] = perf_counter()
+
+
+
+@task_postrun.connect
+def record_task_duration(task_id:str=None, task=None, state:str=None, **kwargs):
+
+    start = _task_starts.pop(task_id, None)
+    
+    if start is not None:
+        TASK_DURATION.labels(task=task.name, state=state or 'UNKNOWN').observe(perf_counter() - start)
@@ -0,0 +1,410 @@
+from django.conf import settings
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction, sync_to_async)
+from django.db import connections
+from contextlib import ExitStack
+from datetime import datetime
+from threading import Lock
+from time import (perf_counter, time)
+from uuid import uuid4
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import random
+from .metrics import (REQUEST_LATENCY, REQUEST_DB_QUERIES, REQUEST_DB_DURATION)
+from .profiling import (is_valid_token, start_timeline, stop_timeline, record, save_profile)
+from .loaders import loader_scope
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries of a request and the time spent in them.
+    """
+    
+    def __init__(self):
+    
+        self.count = 0
+        self.duration = 0.0
+    
+    
+    def __call__(self, execute, sql, params, many, context):
+    
+        start = perf_counter()
+        
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - start
+
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database query count and database time of every request, labeled by view name.
+    
+    Like the other middlewares of this module it runs natively in both the WSGI and the ASGI request path,
+    so it never pushes the async views of app.async_views to a thread.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    
+    def __init__(self, get_response):
+    
+        self.get_response = get_response
+        
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    
+    def __call__(self, request):
+    
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        
+        counter = QueryCounter()
+        start = perf_counter()
+        
+        with count_queries(counter):
+            response = self.get_response(request)
+        
+        
+        self.observe(request, response, counter, start)
+        return response
+    
+    
+    async def __acall__(self, request):
+    
+        counter = QueryCounter()
+        start = perf_counter()
+        
+        with count_queries(counter):
+            response = await self.get_response(request)
+        
+        
+        self.observe(request, response, counter, start)
+        return response
+    
+    
+    def observe(self, request, response, counter:QueryCounter, start:float):
+    
+        # unresolved paths share one label so 404 scans can't blow up the label cardinality
+        view:str = getattr(request.resolver_match, 'view_name', None) or 'unmatched'
+        REQUEST_LATENCY.labels(view=view, method=request.method, status=response.status_code).observe(perf_counter() - start)
+        REQUEST_DB_QUERIES.labels(view=view).observe(counter.count)
+        REQUEST_DB_DURATION.labels(view=view).observe(counter.duration)
+
+
+
+def count_queries(wrapper)->ExitStack:
+    """
+    Install a database execute wrapper on every connection until the returned stack is closed.
+    """
+    stack = ExitStack()
+    
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    
+    
+    return stack
+
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper putting every query of a profiled request on its timeline.
+    """
+    
+    def __call__(self, execute, sql, params, many, context):
+    
+        start = perf_counter()
+        
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            record('sql', context['connection'].alias, start, perf_counter() - start, detail=sql)
+
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests carrying a valid signed PROFILING['HEADER'] (see `manage.py profiling_token`)
+    and a PROFILING['SAMPLE_RATE'] fraction of the others.
+    
+    The cProfile stats and the SQL and cache timeline are kept for the admin only /profiles/ endpoint,
+    the response carries the profile id in X-Profile-Id.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    
+    def __init__(self, get_response):
+    
+        self.get_response = get_response
+        
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    
+    def __call__(self, request):
+    
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        if not self.should_profile(request):
+            return self.get_response(request)
+        
+        
+        timeline, token = start_timeline()
+        profiler = cProfile.Profile()
+        
+        try:
+            with count_queries(QueryRecorder()):
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            stop_timeline(token)
+        
+        
+        return self.finish(request, response, profiler, timeline)
+    
+    
+    async def __acall__(self, request):
+        """
+        Under ASGI the cProfile stats also hold the other requests the event loop served in the meantime
+        and miss the sync code run in threads, the SQL and cache timeline is exact.
+        """
+        if not self.should_profile(request):
+            return await self.get_response(request)
+        
+        
+        timeline, token = start_timeline()
+        profiler = cProfile.Profile()
+        
+        try:
+            with count_queries(QueryRecorder()):
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            stop_timeline(token)
+        
+        
+        return await sync_to_async(self.finish)(request, response, profiler, timeline)
+    
+    
+    def finish(self, request, response, profiler, timeline:dict):
+    
+        profile_id:str = uuid4().hex
+        save_profile(self.build_profile(profile_id, request, response, profiler, timeline), self.dump(profiler))
+        response['X-Profile-Id'] = profile_id
+        
+        
+        return response
+    
+    
+    def should_profile(self, request)->bool:
+    
+        options:dict = settings.PROFILING
+        
+        if not options['ENABLED']:
+            return False
+        
+        token:str = request.headers.get(options['HEADER'])
+        if token is not None:
+            return is_valid_token(token)
+        
+        
+        return random.random() < options['SAMPLE_RATE']
+    
+    
+    def build_profile(self, profile_id:str, request, response, profiler, timeline:dict)->dict:
+    
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(settings.PROFILING['TOP_FUNCTIONS'])
+        events:list = timeline['events']
+        
+        
+        return {
+            'id': profile_id,
+            'path': request.get_full_path(),
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round((perf_counter() - timeline['start']) * 1000, 3),
+            'created_at': datetime.now().isoformat(),
+            'sql_queries': sum(1 for event in events if event['kind'] == 'sql'),
+            'sql_ms': round(sum(event['duration_ms'] for event in events if event['kind'] == 'sql'), 3),
+            'cache_calls': sum(1 for event in events if event['kind'] == 'cache'),
+            'cache_ms': round(sum(event['duration_ms'] for event in events if event['kind'] == 'cache'), 3),
+            'timeline': events,
+            'stats': summary.getvalue(),
+        }
+    
+    
+    def dump(self, profiler)->bytes:
+        """
+        The profile in the pstats file format, loadable with pstats.Stats or snakeviz.
+        """
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)
+
+
+
+class RecordingMiddleware:
+    """
+    Append a REQUEST_RECORDING['SAMPLE_RATE'] fraction of the requests to REQUEST_RECORDING['PATH'] as JSON lines,
+    the request mix replayed by benchmarks.load_replay.
+    
+    Only the method, path, content type and body are kept, cookies and credentials are never written.
+    """
+    
+    _lock = Lock()
+    sync_capable = True
+    async_capable = True
+    
+    
+    def __init__(self, get_response):
+    
+        self.get_response = get_response
+        
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    
+    def __call__(self, request):
+    
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        if not self.should_record():
+            return self.get_response(request)
+        
+        
+        entry:dict = self.start_entry(request)
+        response = self.get_response(request)
+        
+        
+        self.write(self.finish_entry(entry, request, response))
+        return response
+    
+    
+    async def __acall__(self, request):
+    
+        if not self.should_record():
+            return await self.get_response(request)
+        
+        
+        entry:dict = self.start_entry(request)
+        response = await self.get_response(request)
+        
+        
+        await sync_to_async(self.write, thread_sensitive=False)(self.finish_entry(entry, request, response))
+        return response
+    
+    
+    def should_record(self)->bool:
+    
+        options:dict = settings.REQUEST_RECORDING
+        
+        
+        return options['ENABLED'] and random.random() < options['SAMPLE_RATE']
+    
+    
+    def start_entry(self, request)->dict:
+    
+        return {
+            'at': round(time(), 6),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'content_type': request.content_type,
+            'body': self.read_body(request, settings.REQUEST_RECORDING['MAX_BODY_BYTES']),
+            'start': perf_counter(),
+        }
+    
+    
+    def finish_entry(self, entry:dict, request, response)->dict:
+    
+        start:float = entry.pop('start')
+        
+        
+        return {
+            **entry,
+            'route': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'duration_ms': round((perf_counter() - start) * 1000, 3),
+        }
+    
+    
+    def write(self, entry:dict):
+    
+        line:str = json.dumps(entry)
+        
+        # one write per line in append mode, so the lines of several processes don't interleave
+        with self._lock, open(settings.REQUEST_RECORDING['PATH'], 'a', encoding='utf-8') as output:
+            output.write(line + '\n')
+    
+    
+    def read_body(self, request, limit:int)->str:
+        """
+        The body as text, None when it is larger than `limit` or not UTF-8.
+        
+        Large bodies are not read so the streaming views (stock ingestion) keep streaming them.
+        """
+        try:
+            length:int = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        
+        if length == 0:
+            return ''
+        if length > limit:
+            return None
+        
+        
+        try:
+            return request.body.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+
+
+class LoaderMiddleware:
+    """
+    Run every request in its own app.loaders scope, the rows it reads are fetched once.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    
+    def __init__(self, get_response):
+    
+        self.get_response = get_response
+        
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    
+    def __call__(self, request):
+    
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        with loader_scope():
+            return self.get_response(request)
+    
+    
+    async def __acall__(self, request):
+    
+        with loader_scope():
+            return await self.get_response(request)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:37
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_alter_stockdata_volume'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=15)),
+                ('open_price', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('close_price', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('high', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('volume', models.PositiveIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'timestamp'), name='unique_stock_bar')],
+            },
+        ),
+    ]
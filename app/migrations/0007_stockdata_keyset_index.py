@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_stockbar'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockdata',
+            index=models.Index(fields=['-timestamp', '-ticker'], name='stockdata_ts_ticker_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderBookSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=15, unique=True)),
+                ('sequence', models.BigIntegerField()),
+                ('data', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
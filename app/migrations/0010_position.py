@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from decimal import Decimal
+
+
+def backfill_positions(apps, schema_editor):
+    """
+    Replay the ledger into the new table, the same way the rebuild_positions command does,
+    so the users holding shares before positions existed can sell them.
+    """
+    from app.positions import replay_position
+    
+    Transaction = apps.get_model('app', 'Transaction')
+    Position = apps.get_model('app', 'Position')
+    state = {}
+    rows = Transaction.objects.order_by('user_id', 'ticker', 'timestamp', 'transaction_id').values_list(
+        'user_id', 'ticker', 'transaction_type', 'transaction_volume', 'transaction_price',
+    )
+    
+    for user_id, ticker, transaction_type, transaction_volume, transaction_price in rows.iterator(chunk_size=5000):
+        quantity, cost_basis = state.get((user_id, ticker), (0, Decimal(0)))
+        state[(user_id, ticker)] = replay_position(quantity, cost_basis, transaction_type, transaction_volume, transaction_price)
+    
+    Position.objects.bulk_create(
+        (
+            Position(user_id=user_id, ticker=ticker, quantity=quantity, cost_basis=cost_basis)
+            for (user_id, ticker), (quantity, cost_basis) in state.items()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_orderbooksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=15)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('cost_basis', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='app.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'ticker'), name='unique_position')],
+            },
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=15)),
+                ('interval', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('open_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('close_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('volume', models.PositiveBigIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'interval', 'bucket_start'), name='unique_stock_candle')],
+            },
+        ),
+    ]
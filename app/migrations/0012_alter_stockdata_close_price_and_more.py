@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_stockcandle'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockdata',
+            name='close_price',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AlterField(
+            model_name='stockdata',
+            name='low',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AlterField(
+            model_name='stockdata',
+            name='open_price',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_volume',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+    ]
@@ -33,6 +33,75 @@ class StockData(models.Model):
     
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # keyset pagination of the stock listing
+            models.Index(fields=['-timestamp', '-ticker'], name='stockdata_ts_ticker_idx'),
+        ]
+
+
+
+class StockBar(models.Model):
+    """
+    Historical OHLCV bar, one row is appended for every ingested StockData snapshot.
+    """
+    ticker = models.CharField(max_length=15)
+    open_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0.0)])
+    close_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0.0)])
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2,validators=[MinValueValidator(0.0)])
+    volume = models.PositiveIntegerField()
+    timestamp = models.DateTimeField()
+    
+    
+    def __str__(self)-> str:
+        return f"{self.ticker} {self.timestamp}"
+    
+    
+    class Meta:
+        ordering = ["-timestamp"]
+        # the unique index on (ticker, timestamp) also serves the per ticker range scans
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'timestamp'], name='unique_stock_bar'),
+        ]
+
+
+
+class StockCandle(models.Model):
+    """
+    Precomputed OHLCV rollup of the bars of a ticker, one row per (ticker, interval, bucket).
+    """
+    
+    INTERVAL_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+    
+    ticker = models.CharField(max_length=15)
+    interval = models.CharField(max_length=3, choices=INTERVAL_CHOICES)
+    bucket_start = models.DateTimeField()
+    open_price = models.DecimalField(max_digits=12, decimal_places=2)
+    close_price = models.DecimalField(max_digits=12, decimal_places=2)
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2)
+    # sum of the volumes of the snapshots in the bucket, not a traded volume
+    volume = models.PositiveBigIntegerField()
+    # timestamps of the bars that set the open and close, so out of order bars are merged correctly
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    
+    
+    def __str__(self)-> str:
+        return f"{self.ticker} {self.interval} {self.bucket_start}"
+    
+    
+    class Meta:
+        ordering = ["bucket_start"]
+        # the unique index also serves the (ticker, interval) range scans
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'interval', 'bucket_start'], name='unique_stock_candle'),
+        ]
 
 
 
@@ -44,7 +113,8 @@ class Transaction(models.Model):
     ]
     
     transaction_id = models.CharField(primary_key=True, max_length=36, default=uuid4)
-    user = models.ForeignKey(to="User", on_delete=models.CASCADE, related_name="transactions")
+    # indexed by transaction_user_ts_idx, a separate foreign key index would be redundant
+    user = models.ForeignKey(to="User", on_delete=models.CASCADE, related_name="transactions", db_index=False)
     ticker = models.CharField(max_length=15)
     transaction_type = models.CharField(max_length=4, choices=TRANSACTION_TYPE_CHOICES)
     transaction_volume = models.IntegerField(validators=[MinValueValidator(1)])
@@ -54,4 +124,48 @@ class Transaction(models.Model):
     
     class Meta:
         
-        ordering = ["-timestamp"]
\ No newline at end of file
+        ordering = ["-timestamp"]
+        indexes = [
+            # history of a user, newest first, transaction_id breaks ties for keyset pagination
+            models.Index(fields=['user', '-timestamp', '-transaction_id'], name='transaction_user_ts_idx'),
+            models.Index(fields=['ticker', 'timestamp'], name='transaction_ticker_ts_idx'),
+        ]
+
+
+
+class Position(models.Model):
+    """
+    Shares a user holds in a ticker, kept up to date by the settlement tasks.
+    
+    cost_basis is the total cost of the shares held (average cost method), a sale removes its share of it.
+    """
+    # indexed by unique_position, a separate foreign key index would be redundant
+    user = models.ForeignKey(to="User", on_delete=models.CASCADE, related_name="positions", db_index=False)
+    ticker = models.CharField(max_length=15)
+    quantity = models.PositiveIntegerField(default=0)
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    
+    def __str__(self)-> str:
+        return f"{self.user_id} {self.ticker} {self.quantity}"
+    
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ticker'], name='unique_position'),
+        ]
+
+
+
+class OrderBookSnapshot(models.Model):
+    """
+    Last persisted state of the in-memory order book of a ticker, used to recover the matching worker.
+    """
+    ticker = models.CharField(max_length=15, unique=True)
+    sequence = models.BigIntegerField()
+    data = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    
+    def __str__(self)-> str:
+        return f"{self.ticker} #{self.sequence}"
@@ -0,0 +1,244 @@
+"""
+Status of the transactions submitted to POST /transactions/, served by GET /orders/<order_id>/ and its SSE stream.
+
+The status lives in the `order_status:{order_id}` cache entry for ORDER_STATUS['TIMEOUT'] seconds and every change
+is published on the `{ORDER_STATUS['CHANNEL']}:{order_id}` Redis channel, so a waiting client is pushed the change
+instead of polling the user and transaction routes. Without Redis the waiters poll the cache entry.
+"""
+from django.conf import settings
+from .async_cache import (aget_from_cache, astore_in_cache, get_backend, RedisBackend)
+from .cache_tiers import redis_connection
+from .utils import (get_from_cache, store_in_cache)
+import asyncio
+import json
+import time
+
+
+PENDING:str = 'pending'
+# the settlement raised and rolled back
+FAILED:str = 'failed'
+# a settled order never changes again, its waiters stop there
+# accepted and rejected are the results of transactions, filled and cancelled those of order book orders
+FINAL_STATUSES:tuple = ('accepted', 'rejected', FAILED, 'filled', 'cancelled')
+
+
+def status_key(order_id:str)->str:
+    return f"order_status:{order_id}"
+
+
+
+def status_channel(order_id:str)->str:
+    return f"{settings.ORDER_STATUS['CHANNEL']}:{order_id}"
+
+
+
+def build_status(order_id:str, status:str, message:str)->dict:
+
+    return {'order_id': order_id, 'status': status, 'message': message, 'updated_at': time.time()}
+
+
+
+def set_order_status(order_id:str, status:str, message:str)->dict:
+    """
+    Store the status of an order and push it to its waiters.
+    """
+    order_status:dict = build_status(order_id, status, message)
+    store_in_cache(key=status_key(order_id), value=order_status, timeout=settings.ORDER_STATUS['TIMEOUT'], family='order_status')
+    
+    connection = redis_connection()
+    if connection is not None:
+        connection.publish(status_channel(order_id), json.dumps(order_status))
+    
+    
+    return order_status
+
+
+
+async def aset_order_status(order_id:str, status:str, message:str)->dict:
+
+    order_status:dict = build_status(order_id, status, message)
+    await astore_in_cache(key=status_key(order_id), value=order_status, timeout=settings.ORDER_STATUS['TIMEOUT'], family='order_status')
+    await get_backend().publish(status_channel(order_id), json.dumps(order_status))
+    
+    
+    return order_status
+
+
+
+def get_order_status(order_id:str)->dict:
+    return get_from_cache(key=status_key(order_id), family='order_status')
+
+
+
+def is_final(order_status:dict)->bool:
+    return order_status is None or order_status['status'] in FINAL_STATUSES
+
+
+
+def format_event(order_status:dict)->bytes:
+    """
+    Server-sent event carrying a status.
+    """
+    return f"event: status\ndata: {json.dumps(order_status)}\n\n".encode('utf-8')
+
+
+
+class StatusSubscription:
+    """
+    Changes of the status of one order, pushed by Redis pub/sub, or polled from the cache without Redis.
+    """
+    
+    def __init__(self, order_id:str):
+    
+        self.order_id = order_id
+        connection = redis_connection()
+        self.pubsub = None if connection is None else connection.pubsub(ignore_subscribe_messages=True)
+        
+        if self.pubsub is not None:
+            self.pubsub.subscribe(status_channel(order_id))
+    
+    
+    def wait(self, status:str, timeout:float)->dict:
+        """
+        Status of the order once it is no longer `status`, the current one after `timeout` seconds.
+        """
+        deadline:float = time.monotonic() + timeout
+        # read after subscribing, a change published before is already in the cache
+        order_status:dict = get_order_status(self.order_id)
+        
+        
+        while order_status is not None and order_status['status'] == status and (remaining := deadline - time.monotonic()) > 0:
+            if self.pubsub is None:
+                time.sleep(min(settings.ORDER_STATUS['POLL_INTERVAL'], remaining))
+                order_status = get_order_status(self.order_id)
+                continue
+            
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is not None:
+                order_status = json.loads(message['data'])
+        
+        
+        return order_status
+    
+    
+    def close(self):
+    
+        if self.pubsub is not None:
+            self.pubsub.close()
+    
+    
+    def __enter__(self):
+        return self
+    
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+class AsyncStatusSubscription:
+    """
+    StatusSubscription on the redis.asyncio client of app.async_cache, for the async views.
+    """
+    
+    def __init__(self, order_id:str):
+    
+        self.order_id = order_id
+        self.pubsub = None
+        self.backend = get_backend()
+    
+    
+    async def wait(self, status:str, timeout:float)->dict:
+    
+        if self.pubsub is None and isinstance(self.backend, RedisBackend):
+            self.pubsub = self.backend.redis.pubsub(ignore_subscribe_messages=True)
+            await self.pubsub.subscribe(status_channel(self.order_id))
+        
+        deadline:float = time.monotonic() + timeout
+        order_status:dict = await aget_from_cache(key=status_key(self.order_id), family='order_status')
+        
+        
+        while order_status is not None and order_status['status'] == status and (remaining := deadline - time.monotonic()) > 0:
+            if self.pubsub is None:
+                await asyncio.sleep(min(settings.ORDER_STATUS['POLL_INTERVAL'], remaining))
+                order_status = await aget_from_cache(key=status_key(self.order_id), family='order_status')
+                continue
+            
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                order_status = json.loads(message['data'])
+        
+        
+        return order_status
+    
+    
+    async def close(self):
+    
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+    
+    
+    async def __aenter__(self):
+        return self
+    
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+
+def wait_timeout(query_params)->float:
+    """
+    Long-poll time asked with `?wait=<seconds>`, capped to ORDER_STATUS['MAX_WAIT'], 0 when missing or invalid.
+    """
+    try:
+        wait:float = float(query_params.get('wait', 0))
+    except ValueError:
+        return 0
+    
+    
+    return min(max(wait, 0), settings.ORDER_STATUS['MAX_WAIT'])
+
+
+
+def status_events(order_id:str, order_status:dict):
+    """
+    SSE stream of the status of an order until it is final, with a comment every ORDER_STATUS['HEARTBEAT'] seconds.
+    """
+    yield format_event(order_status)
+    
+    with StatusSubscription(order_id) as subscription:
+        while not is_final(order_status):
+            changed:dict = subscription.wait(order_status['status'], settings.ORDER_STATUS['HEARTBEAT'])
+            
+            if changed is None:
+                # the status expired
+                return
+            
+            if changed['status'] == order_status['status']:
+                # keeps proxies from closing an idle stream
+                yield b": keep-alive\n\n"
+                continue
+            
+            order_status = changed
+            yield format_event(order_status)
+
+
+
+async def astatus_events(order_id:str, order_status:dict):
+
+    yield format_event(order_status)
+    
+    async with AsyncStatusSubscription(order_id) as subscription:
+        while not is_final(order_status):
+            changed:dict = await subscription.wait(order_status['status'], settings.ORDER_STATUS['HEARTBEAT'])
+            
+            if changed is None:
+                return
+            
+            if changed['status'] == order_status['status']:
+                yield b": keep-alive\n\n"
+                continue
+            
+            order_status = changed
+            yield format_event(order_status)
@@ -0,0 +1,204 @@
+"""
+In-memory limit order book with price-time priority.
+
+The book has no Django dependency, it is driven by app.matching in the matching worker
+and can be benchmarked on its own (benchmarks/bench_orderbook.py).
+"""
+from bisect import insort
+from collections import deque
+from dataclasses import dataclass
+from decimal import Decimal
+
+
+@dataclass
+class Order:
+    order_id: str
+    user_id: str
+    side: str
+    quantity: int
+    # None for a market order
+    price: Decimal = None
+    sequence: int = 0
+
+
+
+@dataclass
+class Fill:
+    buy_order_id: str
+    sell_order_id: str
+    buyer_id: str
+    seller_id: str
+    price: Decimal
+    quantity: int
+
+
+
+class OrderBook:
+    """
+    Order book of one ticker.
+    
+    Each side maps a price to a FIFO queue of resting orders. The prices of a side are also kept in a
+    sorted list whose last item is the best price (asks are stored negated for that), so the best level
+    is found and removed in O(1) and a new level is inserted in O(log n) comparisons.
+    """
+    
+    def __init__(self, ticker:str):
+        self.ticker = ticker
+        self.sequence = 0
+        self.orders:dict = {}
+        self._levels:dict = {'buy': {}, 'sell': {}}
+        self._keys:dict = {'buy': [], 'sell': []}
+    
+    
+    @staticmethod
+    def _key(side:str, price:Decimal)->Decimal:
+        
+        return price if side == 'buy' else -price
+    
+    
+    def best_price(self, side:str)->Decimal:
+        """
+        Best resting price of a side, the highest bid or the lowest ask.
+        """
+        keys:list = self._keys[side]
+        
+        if not keys:
+            return None
+        
+        return self._key(side, keys[-1])
+    
+    
+    def depth(self, side:str)->int:
+        
+        return len(self._keys[side])
+    
+    
+    def _crosses(self, order:Order, price:Decimal)->bool:
+        
+        if order.price is None:
+            return True
+        
+        return price <= order.price if order.side == 'buy' else price >= order.price
+    
+    
+    def submit(self, order:Order, settle=None)->list:
+        """
+        Match an order against the opposite side and rest the remainder of a limit order.
+        
+        `settle(fill)` is called for every fill before it is applied to the book, it returns None when
+        the fill was settled or the side ('buy' or 'sell') whose user could not settle it. A resting
+        order that cannot settle is cancelled and matching goes on, an incoming order that cannot settle
+        stops matching and its remainder is dropped.
+        
+        Market orders never rest, their unfilled remainder is dropped.
+        """
+        self.sequence += 1
+        order.sequence = self.sequence
+        opposite:str = 'sell' if order.side == 'buy' else 'buy'
+        levels:dict = self._levels[opposite]
+        keys:list = self._keys[opposite]
+        fills:list = []
+        
+        
+        while order.quantity and keys:
+            price:Decimal = self._key(opposite, keys[-1])
+            
+            if not self._crosses(order, price):
+                break
+            
+            queue:deque = levels[price]
+            
+            while order.quantity and queue:
+                resting:Order = queue[0]
+                buy, sell = (order, resting) if order.side == 'buy' else (resting, order)
+                fill = Fill(buy.order_id, sell.order_id, buy.user_id, sell.user_id, price, min(order.quantity, resting.quantity))
+                failed:str = settle(fill) if settle else None
+                
+                if failed == order.side:
+                    order.quantity = 0
+                    break
+                
+                if failed:
+                    resting.quantity = 0
+                else:
+                    fills.append(fill)
+                    order.quantity -= fill.quantity
+                    resting.quantity -= fill.quantity
+                
+                if not resting.quantity:
+                    queue.popleft()
+                    del self.orders[resting.order_id]
+            
+            
+            if not queue:
+                del levels[price]
+                keys.pop()
+        
+        
+        if order.quantity and order.price is not None:
+            self._rest(order)
+        
+        
+        return fills
+    
+    
+    def _rest(self, order:Order):
+        
+        levels:dict = self._levels[order.side]
+        
+        if order.price not in levels:
+            levels[order.price] = deque()
+            insort(self._keys[order.side], self._key(order.side, order.price))
+        
+        levels[order.price].append(order)
+        self.orders[order.order_id] = order
+    
+    
+    def cancel(self, order_id:str)->bool:
+        """
+        Remove a resting order, returning False when it is not in the book.
+        """
+        order:Order = self.orders.pop(order_id, None)
+        
+        if order is None:
+            return False
+        
+        
+        queue:deque = self._levels[order.side][order.price]
+        queue.remove(order)
+        
+        if not queue:
+            del self._levels[order.side][order.price]
+            self._keys[order.side].remove(self._key(order.side, order.price))
+        
+        
+        return True
+    
+    
+    def snapshot(self)->dict:
+        """
+        JSON serializable state of the book, restored with OrderBook.restore.
+        """
+        def side(name:str)->list:
+            return [
+                [str(self._key(name, key)), [[order.order_id, order.user_id, order.quantity, order.sequence] for order in self._levels[name][self._key(name, key)]]]
+                for key in reversed(self._keys[name])
+            ]
+        
+        
+        return {'ticker': self.ticker, 'sequence': self.sequence, 'bids': side('buy'), 'asks': side('sell')}
+    
+    
+    @classmethod
+    def restore(cls, snapshot:dict)->'OrderBook':
+        
+        book:OrderBook = cls(snapshot['ticker'])
+        book.sequence = snapshot['sequence']
+        
+        for side, name in (('buy', 'bids'), ('sell', 'asks')):
+            for price, orders in snapshot[name]:
+                for order_id, user_id, quantity, sequence in orders:
+                    book._rest(Order(order_id, user_id, side, quantity, Decimal(price), sequence))
+        
+        
+        return book
@@ -0,0 +1,144 @@
+from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from datetime import datetime
+from .utils import (store_in_cache, get_from_cache)
+import base64
+import json
+
+
+TRANSACTION_KEYSET = ('timestamp', 'transaction_id')
+STOCK_KEYSET = ('timestamp', 'ticker')
+
+
+def is_page_requested(request)->bool:
+    """
+    Pagination is opt-in, the unpaginated response is kept for existing clients.
+    """
+    return 'cursor' in request.query_params or 'page_size' in request.query_params
+
+
+
+def encode_cursor(values:list)->str:
+    
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+
+def decode_cursor(cursor:str)->list:
+    """
+    Decode an opaque continuation token, raising ValueError when it was not produced by encode_cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError('Invalid cursor.') from exc
+    
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor.')
+    
+    return values
+
+
+
+def parse_cursor_values(model, keyset:tuple, values:list)->list:
+    """
+    Convert the decoded cursor values to the types of the keyset fields, raising ValueError when they do not fit.
+    
+    encode_cursor only writes strings, anything else or a value the field cannot parse (e.g. an impossible date)
+    would otherwise fail inside the query.
+    """
+    if len(values) != len(keyset) or not all(isinstance(value, str) for value in values):
+        raise ValueError('Invalid cursor.')
+    
+    try:
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(keyset, values)]
+    except ValidationError as exc:
+        raise ValueError('Invalid cursor.') from exc
+
+
+
+def keyset_queryset(queryset, keyset:tuple, cursor:str=None):
+    """
+    Order `queryset` descending on `keyset` and keep only the rows strictly after the row encoded in `cursor`.
+    """
+    queryset = queryset.order_by(*(f'-{field}' for field in keyset))
+    
+    if not cursor:
+        return queryset
+    
+    
+    values:list = parse_cursor_values(queryset.model, keyset, decode_cursor(cursor))
+    
+    # (f1, f2) < (v1, v2)  <=>  f1 < v1 OR (f1 = v1 AND f2 < v2)
+    after = Q()
+    for position, field in enumerate(keyset):
+        equal = {keyset[index]: values[index] for index in range(position)}
+        after |= Q(**equal, **{f'{field}__lt': values[position]})
+    
+    
+    # the redundant bound on the leading field lets the database turn the predicate into an index range
+    return queryset.filter(after, **{f'{keyset[0]}__lte': values[0]})
+
+
+
+def paginate_keyset(queryset, keyset:tuple, cursor:str=None, page_size:int=settings.KEYSET_PAGE_SIZE)->tuple:
+    """
+    Return one page of `queryset` in descending `keyset` order and the cursor of the next page.
+    
+    The page starts strictly after the row encoded in `cursor`, so every page is an index range scan
+    of constant cost instead of a growing OFFSET.
+    """
+    queryset = keyset_queryset(queryset, keyset, cursor=cursor)
+    rows:list = list(queryset[:page_size + 1])
+    
+    if len(rows) <= page_size:
+        return rows, None
+    
+    
+    last = rows[page_size - 1]
+    values = [getattr(last, field) for field in keyset]
+    values = [value.isoformat() if isinstance(value, datetime) else str(value) for value in values]
+    
+    
+    return rows[:page_size], encode_cursor(values)
+
+
+
+def keyset_page_response(request, queryset, keyset:tuple, serializer_class, cache_key:str, timeout:int=settings.DEFAULT_TIME_OUT, family:str='other')->Response:
+    """
+    Build the paginated response, pages of the default size are cached per cursor under `{cache_key}_{cursor}`.
+    """
+    cursor:str = request.query_params.get('cursor') or None
+    
+    try:
+        page_size:int = int(request.query_params.get('page_size', settings.KEYSET_PAGE_SIZE))
+    except ValueError:
+        page_size = 0
+    
+    if not 0 < page_size <= settings.KEYSET_MAX_PAGE_SIZE:
+        return Response({'page_size': f'Must be between 1 and {settings.KEYSET_MAX_PAGE_SIZE}.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    cache_key = f"{cache_key}_{cursor or 'first'}" if page_size == settings.KEYSET_PAGE_SIZE else None
+    page = get_from_cache(key=cache_key, family=family) if cache_key else None
+    
+    if page:
+        return Response(page, status=status.HTTP_200_OK)
+    
+    
+    try:
+        rows, next_cursor = paginate_keyset(queryset, keyset, cursor=cursor, page_size=page_size)
+    except ValueError:
+        return Response({'cursor': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    page:dict = {'results': serializer_class(rows, many=True).data, 'next': next_cursor}
+    
+    if cache_key:
+        store_in_cache(key=cache_key, value=page, timeout=timeout, family=family)
+    
+    
+    return Response(page, status=status.HTTP_200_OK)
@@ -0,0 +1,55 @@
+from django.db.models import F
+from decimal import (Decimal, ROUND_HALF_UP)
+from .models import Position
+
+
+CENT = Decimal('0.01')
+
+
+def apply_position(user_id:str, ticker:str, transaction_type:str, transaction_volume:int, transaction_price:Decimal)->bool:
+    """
+    Apply a settled transaction to the position of the user, in the caller's database transaction.
+    
+    A sale is a conditional UPDATE ... WHERE quantity >= n, False is returned when the user does not hold enough shares.
+    """
+    positions = Position.objects.filter(user_id=user_id, ticker=ticker)
+    
+    
+    if transaction_type == 'sell':
+        # every expression of an UPDATE reads the old row, so cost_basis is reduced by the old average cost
+        return bool(positions.filter(quantity__gte=transaction_volume).update(
+            cost_basis=F('cost_basis') - F('cost_basis') * transaction_volume / F('quantity'),
+            quantity=F('quantity') - transaction_volume,
+        ))
+    
+    
+    changes:dict = {
+        'quantity': F('quantity') + transaction_volume,
+        'cost_basis': F('cost_basis') + transaction_price * transaction_volume,
+    }
+    
+    if not positions.update(**changes):
+        Position.objects.get_or_create(user_id=user_id, ticker=ticker)
+        positions.update(**changes)
+    
+    
+    return True
+
+
+
+def replay_position(quantity:int, cost_basis:Decimal, transaction_type:str, transaction_volume:int, transaction_price:Decimal)->tuple:
+    """
+    Return the (quantity, cost_basis) of a position after one more transaction, the in-memory twin of apply_position.
+    """
+    if transaction_type == 'buy':
+        return quantity + transaction_volume, cost_basis + transaction_price * transaction_volume
+    
+    
+    if not quantity:
+        return 0, Decimal(0)
+    
+    sold:int = min(transaction_volume, quantity)
+    cost_basis = (cost_basis - cost_basis * sold / quantity).quantize(CENT, rounding=ROUND_HALF_UP)
+    
+    
+    return quantity - sold, cost_basis
@@ -0,0 +1,138 @@
+"""
+On demand profiling of single requests (see app.middleware.ProfilingMiddleware).
+
+A profiled request records a cProfile profile and a timeline of its SQL queries and cache calls.
+The last PROFILING['MAX_PROFILES'] profiles are kept in the cache so every process can list them.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from asgiref.sync import iscoroutinefunction
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+
+PROFILE_SALT = 'app.profiling'
+PROFILE_INDEX_KEY = 'profiles:index'
+
+# timeline of the request being profiled in this context, None when it is not profiled
+_timeline:ContextVar = ContextVar('profiling_timeline', default=None)
+
+
+def make_token()->str:
+    """
+    Signed value of the profiling header, valid for PROFILING['TOKEN_MAX_AGE'] seconds.
+    """
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign('profile')
+
+
+
+def is_valid_token(token:str)->bool:
+
+    try:
+        return signing.TimestampSigner(salt=PROFILE_SALT).unsign(token, max_age=settings.PROFILING['TOKEN_MAX_AGE']) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+
+def start_timeline()->tuple:
+    """
+    Start recording the timeline of this context, returns the token to stop it with.
+    """
+    timeline:dict = {'start': perf_counter(), 'events': []}
+    
+    
+    return timeline, _timeline.set(timeline)
+
+
+
+def stop_timeline(token):
+    _timeline.reset(token)
+
+
+
+def record(kind:str, name:str, start:float, duration:float, detail:str=''):
+    """
+    Add an event to the timeline of the request being profiled, if any.
+    """
+    timeline:dict = _timeline.get()
+    
+    if timeline is not None:
+        timeline['events'].append({
+            'kind': kind,
+            'name': name,
+            'detail': detail,
+            'offset_ms': round((start - timeline['start']) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+        })
+
+
+
+def traced(name:str):
+    """
+    Record calls of a cache helper (sync or async) on the timeline, a no-op outside of profiled requests.
+    """
+    def decorator(function):
+    
+        def record_call(start:float, args:tuple, kwargs:dict):
+            key = kwargs.get('key', kwargs.get('keys', args[0] if args else ''))
+            record('cache', name, start, perf_counter() - start, detail=str(key))
+        
+        
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+        
+            if _timeline.get() is None:
+                return function(*args, **kwargs)
+            
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_call(start, args, kwargs)
+        
+        
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+        
+            if _timeline.get() is None:
+                return await function(*args, **kwargs)
+            
+            start = perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                record_call(start, args, kwargs)
+        
+        
+        return async_wrapper if iscoroutinefunction(function) else wrapper
+    
+    
+    return decorator
+
+
+
+def save_profile(profile:dict, raw:bytes):
+    """
+    Keep a profile and its pstats dump, dropping the oldest beyond PROFILING['MAX_PROFILES'].
+    """
+    index:list = cache.get(PROFILE_INDEX_KEY) or []
+    index.insert(0, {key: profile[key] for key in ('id', 'path', 'method', 'status', 'duration_ms', 'created_at')})
+    expired:list = index[settings.PROFILING['MAX_PROFILES']:]
+    del index[settings.PROFILING['MAX_PROFILES']:]
+    
+    timeout:int = settings.PROFILING['TIMEOUT']
+    cache.set_many({f"profile:{profile['id']}": profile, f"profile:{profile['id']}:raw": raw, PROFILE_INDEX_KEY: index}, timeout=timeout)
+    cache.delete_many([key for entry in expired for key in (f"profile:{entry['id']}", f"profile:{entry['id']}:raw")])
+
+
+
+def list_profiles()->list:
+    return cache.get(PROFILE_INDEX_KEY) or []
+
+
+
+def get_profile(profile_id:str, raw:bool=False):
+    return cache.get(f"profile:{profile_id}:raw" if raw else f"profile:{profile_id}")
@@ -1,7 +1,10 @@
 from rest_framework import serializers
-from .models import (User, StockData, Transaction)
+from .models import (User, StockData, StockBar, StockCandle, Transaction, Position)
 from django.core.exceptions import ValidationError
-from django.shortcuts import get_object_or_404
+from .loaders import get_loader
+from collections.abc import Mapping
+from decimal import Decimal
+import operator
 
 
 class UserSerialzier(serializers.ModelSerializer):
@@ -27,6 +30,17 @@ class UserSerialzier(serializers.ModelSerializer):
     
     
     
+# (reported field, left, violation, right, message) of the OHLC invariants, checked in order and only the first violation is reported,
+# by StockSerializer row by row and by app.ingestion.validate_stock_rows on whole columns at once
+PRICE_INVARIANTS = (
+    ('low', 'low', operator.gt, 'high', 'The low value must be less than or equal to the high value.'),
+    ('open_price', 'open_price', operator.gt, 'high', 'The open price value must be less than or equal to the high value.'),
+    ('close_price', 'close_price', operator.gt, 'high', 'The close price value must be less than or equal to the high value.'),
+    ('close_price', 'close_price', operator.lt, 'low', 'The close price value must be greater than or equal to the low value.'),
+    ('open_price', 'open_price', operator.lt, 'low', 'The open price value must be greater than or equal to the low value.'),
+)
+
+
 class StockSerializer(serializers.ModelSerializer):
     
     
@@ -37,51 +51,96 @@ class StockSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         validated_data = super().validate(attrs)
-        low, high, open_price, close_price = validated_data['low'],validated_data['high'],validated_data['open_price'],validated_data['close_price']
-
-        if low > high:
-            raise ValidationError({
-                'low': 'The low value must be less than or equal to the high value.'
-            })
-        
-        if open_price > high:
-            raise ValidationError({
-                'open_price': 'The open price value must be less than or equal to the high value.'
-            })
         
-        
-        if close_price > high:
-            raise ValidationError({
-                'close_price': 'The close price value must be less than or equal to the high value.'
-            })
-        
-        
-        if close_price < low:
-            raise ValidationError({
-                'close_price': 'The close price value must be greater than or equal to the low value.'
-            })
-        
-        if open_price < low:
-            raise ValidationError({
-                'open_price': 'The open price value must be greater than or equal to the low value.'
-            })
+        for field, left, violated, right, message in PRICE_INVARIANTS:
+            if violated(validated_data[left], validated_data[right]):
+                raise ValidationError({field: message})
         
         return validated_data
+
+
+
+class StockRowSerializer(StockSerializer):
+    """
+    StockSerializer for bulk ingestion, an existing ticker is updated instead of rejected.
+    """
+    ticker = serializers.CharField(max_length=15)
+
+
+
+class StockBarSerializer(serializers.ModelSerializer):
+    
+    
+    class Meta:
+        model = StockBar
+        fields = ('ticker', 'open_price', 'close_price', 'high', 'low', 'volume', 'timestamp')
+    
+    
+
+class StockCandleSerializer(serializers.ModelSerializer):
+    
+    
+    class Meta:
+        model = StockCandle
+        fields = ('ticker', 'interval', 'bucket_start', 'open_price', 'close_price', 'high', 'low', 'volume')
     
     
 
+class PositionSerializer(serializers.ModelSerializer):
+    
+    
+    class Meta:
+        model = Position
+        fields = ('ticker', 'quantity', 'cost_basis')
+
+
+
+class LoadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField reading the related row through the loader of the request or task.
+    """
+    
+    def to_internal_value(self, data):
+    
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            instance = get_loader().get(self.get_queryset().model, data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        
+        
+        return instance
+
+
+
 class TransactionSerializer(serializers.ModelSerializer):
 
+    user = LoadedPrimaryKeyRelatedField(queryset=User.objects.all())
+
     class Meta:
         model = Transaction
         fields = '__all__'
         read_only_fields = ['transaction_price', 'transaction_id', 'timestamp']
     
     
+    def to_internal_value(self, data):
+    
+        # a sale reads the position with its user in one query, the user field then finds the user in the loader
+        if isinstance(data, Mapping) and data.get('transaction_type') == 'sell' and data.get('user') is not None and isinstance(data.get('ticker'), str):
+            get_loader().position(str(data['user']), data['ticker'])
+        
+        
+        return super().to_internal_value(data)
+    
+    
     def validate(self, attrs):
         
         validated_data = super().validate(attrs)
-        stock_instance:StockData = get_object_or_404(StockData, ticker=validated_data['ticker'])
+        stock_instance:StockData = get_loader().stock(validated_data['ticker'])
 
 
         if validated_data['transaction_type'] == 'buy' and (validated_data['transaction_volume'] > stock_instance.volume):
@@ -89,6 +148,15 @@ class TransactionSerializer(serializers.ModelSerializer):
             raise ValidationError({
                 'transaction_volume':'transaction_volume must be less than or equal to the stock volume'
             })
+        
+        
+        if validated_data['transaction_type'] == 'sell':
+            position:Position = get_loader().position(validated_data['user'].pk, validated_data['ticker'])
+            
+            if position is None or position.quantity < validated_data['transaction_volume']:
+                raise ValidationError({
+                    'transaction_volume':'transaction_volume must be less than or equal to the shares held'
+                })
             
         
         
@@ -100,3 +168,45 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     
     
+
+
+
+class OrderSerializer(serializers.Serializer):
+    """
+    Limit or market order for the order book of a ticker.
+    """
+    ORDER_TYPE_CHOICES = [
+        ('limit', 'Limit'),
+        ('market', 'Market'),
+    ]
+    
+    user = LoadedPrimaryKeyRelatedField(queryset=User.objects.all())
+    ticker = serializers.CharField(max_length=15)
+    side = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPE_CHOICES)
+    order_type = serializers.ChoiceField(choices=ORDER_TYPE_CHOICES)
+    quantity = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'), required=False, allow_null=True)
+    
+    
+    def validate(self, attrs):
+        
+        validated_data = super().validate(attrs)
+        get_loader().stock(validated_data['ticker'])
+        
+        
+        if validated_data['order_type'] == 'limit' and validated_data.get('price') is None:
+            raise ValidationError({
+                'price': 'A limit order must have a price.'
+            })
+        
+        if validated_data['order_type'] == 'market':
+            validated_data['price'] = None
+        
+        
+        if validated_data['side'] == 'buy' and validated_data['price'] is not None and validated_data['user'].balance < validated_data['price'] * validated_data['quantity']:
+            raise ValidationError({
+                'quantity': 'Insufficient balance for this order.'
+            })
+        
+        
+        return validated_data
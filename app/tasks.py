@@ -1,42 +1,404 @@
 from celery import shared_task
-from .models import (Transaction, StockData, User)
-from .utils import delete_from_cache
+from .models import (Transaction, StockData, User, Position)
+from .utils import (bump_generation, invalidate_on_commit)
+from .positions import (apply_position, replay_position)
+from .matching import (match_order, settled_tags)
+from .order_status import (FAILED, FINAL_STATUSES, get_order_status, set_order_status)
 from django.db import transaction
+from django.db.models import F
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+from functools import partial
+from uuid import uuid4
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task(name="process_transaction")
-def process_transaction_async(validated_data):
+def process_transaction_async(validated_data)->dict:
+    """
+    Settle one order and publish its accept/reject result as the status of its order_id.
+    """
+    try:
+        result:dict = settle_transaction(validated_data)
+    except Exception:
+        publish_order_failure([validated_data])
+        raise
+    
+    publish_order_results([validated_data], [result])
+    
+    
+    return result
+
+
+
+def settle_transaction(validated_data)->dict:
+    """
+    Settle one order and return its accept/reject result.
+    
+    Balances and volumes are changed with conditional UPDATE ... SET x = x - n WHERE x >= n statements,
+    so concurrent workers can never overdraw a user, oversell a stock or sell shares the user does not hold.
+    Rows are always written StockData, then User, then Position, the same order the batch processor locks them in.
+    """
+    user_id:str = validated_data['user']
+    ticker:str = validated_data['ticker']
+    transaction_type:str = validated_data['transaction_type']  
+    transaction_volume:int = validated_data['transaction_volume']  
+    
     
     with transaction.atomic():
         
-        user:User = User.objects.get(pk=validated_data['user'])
-        stock_data:StockData = StockData.objects.get(ticker=validated_data['ticker'])
-        transaction_type:str = validated_data['transaction_type']  
-        transaction_volume:int = validated_data['transaction_volume']  
+        close_price = StockData.objects.filter(ticker=ticker).values_list('close_price', flat=True).first()
+        
+        if close_price is None:
+            return {'status': 'rejected', 'message': 'User or stock not found.'}
+        
+        price = close_price * transaction_volume
 
 
         if transaction_type == 'buy':
-            user.balance -= stock_data.close_price * transaction_volume
-            stock_data.volume -= transaction_volume
+            if not StockData.objects.filter(ticker=ticker, volume__gte=transaction_volume).update(volume=F('volume') - transaction_volume):
+                return {'status': 'rejected', 'message': 'transaction_volume must be less than or equal to the stock volume'}
+            
+            if not User.objects.filter(pk=user_id, balance__gte=price).update(balance=F('balance') - price):
+                transaction.set_rollback(True)
+                return {'status': 'rejected', 'message': 'Insufficient balance for this transaction.'}
+            
+            apply_position(user_id, ticker, transaction_type, transaction_volume, close_price)
             
         if transaction_type == 'sell':
-            user.balance += stock_data.close_price * transaction_volume
-            stock_data.volume += transaction_volume
+            StockData.objects.filter(ticker=ticker).update(volume=F('volume') + transaction_volume)
             
-        user.save()
-        stock_data.save()
-
-
-        delete_from_cache(key=user.username)
-        delete_from_cache(key=stock_data.ticker)
-        delete_from_cache(key=f"{user.username}_transactions")
-        delete_from_cache(key='stock_data')
+            if not User.objects.filter(pk=user_id).update(balance=F('balance') + price):
+                transaction.set_rollback(True)
+                return {'status': 'rejected', 'message': 'User or stock not found.'}
+            
+            if not apply_position(user_id, ticker, transaction_type, transaction_volume, close_price):
+                transaction.set_rollback(True)
+                return {'status': 'rejected', 'message': 'Insufficient shares for this transaction.'}
+        
         
         Transaction.objects.create(
-            user=user,
+            user_id=user_id,
             transaction_type=transaction_type,
             transaction_volume=transaction_volume,
-            transaction_price=stock_data.close_price,
-            ticker=validated_data['ticker'],
+            transaction_price=close_price,
+            ticker=ticker,
         )
-    
\ No newline at end of file
+        
+        # the caches of the user and the stock and the stock listing are only invalidated once the transaction committed,
+        # the username is looked up from the hook so the locked section runs no extra query
+        transaction.on_commit(lambda: bump_generation('stocks', *settled_tags([user_id], User.objects.filter(pk=user_id).values_list('username', flat=True), [ticker])))
+    
+    
+    return {'status': 'accepted', 'message': 'Transaction settled.'}
+
+
+
+@shared_task(name="process_transaction_batch")
+def process_transaction_batch_async(orders:list)->list:
+    """
+    Settle a batch of orders and publish the accept/reject result of every order as the status of its order_id.
+    """
+    try:
+        results:list = settle_transaction_batch(orders)
+    except Exception:
+        publish_order_failure(orders)
+        raise
+    
+    publish_order_results(orders, results)
+    return results
+
+
+
+def settle_transaction_batch(orders:list)->list:
+    """
+    Settle a batch of orders in one atomic block and return the accept/reject result of every order.
+    
+    Orders are checked one after the other in their queue order, as process_transaction_async would,
+    but the writes are grouped: one bulk update per table and one bulk insert of the Transaction rows.
+    """
+    results:list = []
+    new_transactions:list = []
+    
+    
+    with transaction.atomic():
+        # lock the rows in a deterministic order, stocks by ticker then users by pk, so concurrent batches cannot deadlock
+        stocks:dict = {
+            stock_data.ticker: stock_data
+            for stock_data in StockData.objects.select_for_update().filter(ticker__in={order['ticker'] for order in orders}).order_by('ticker')
+        }
+        users:dict = {
+            user.pk: user
+            for user in User.objects.select_for_update().filter(pk__in={order['user'] for order in orders}).order_by('pk')
+        }
+        # create the missing positions first so all of them can be locked
+        pairs:set = {(order['user'], order['ticker']) for order in orders if order['user'] in users and order['ticker'] in stocks}
+        Position.objects.bulk_create([Position(user_id=user_id, ticker=ticker) for user_id, ticker in pairs], ignore_conflicts=True)
+        positions:dict = {
+            (position.user_id, position.ticker): position
+            for position in Position.objects.select_for_update().filter(user_id__in=users, ticker__in=stocks).order_by('user_id', 'ticker')
+        }
+        changed_users, changed_stocks, changed_positions = {}, {}, {}
+        
+        
+        for order in orders:
+            user:User = users.get(order['user'])
+            stock_data:StockData = stocks.get(order['ticker'])
+            transaction_type:str = order['transaction_type']
+            transaction_volume:int = order['transaction_volume']
+            
+            if user is None or stock_data is None:
+                results.append({'status': 'rejected', 'message': 'User or stock not found.'})
+                continue
+            
+            
+            price = stock_data.close_price * transaction_volume
+            
+            if transaction_type == 'buy':
+                if transaction_volume > stock_data.volume:
+                    results.append({'status': 'rejected', 'message': 'transaction_volume must be less than or equal to the stock volume'})
+                    continue
+                
+                if user.balance < price:
+                    results.append({'status': 'rejected', 'message': 'Insufficient balance for this transaction.'})
+                    continue
+                
+                user.balance -= price
+                stock_data.volume -= transaction_volume
+            
+            position:Position = positions[(user.pk, stock_data.ticker)]
+            
+            if transaction_type == 'sell':
+                if transaction_volume > position.quantity:
+                    results.append({'status': 'rejected', 'message': 'Insufficient shares for this transaction.'})
+                    continue
+                
+                user.balance += price
+                stock_data.volume += transaction_volume
+            
+            
+            position.quantity, position.cost_basis = replay_position(position.quantity, position.cost_basis, transaction_type, transaction_volume, stock_data.close_price)
+            changed_users[user.pk] = user
+            changed_stocks[stock_data.ticker] = stock_data
+            changed_positions[(user.pk, stock_data.ticker)] = position
+            new_transactions.append(Transaction(
+                user=user,
+                transaction_type=transaction_type,
+                transaction_volume=transaction_volume,
+                transaction_price=stock_data.close_price,
+                ticker=stock_data.ticker,
+            ))
+            results.append({'status': 'accepted', 'message': 'Transaction settled.'})
+        
+        
+        # the net change of every ticker and user is written once for the whole batch
+        User.objects.bulk_update(changed_users.values(), ['balance'])
+        StockData.objects.bulk_update(changed_stocks.values(), ['volume'])
+        Position.objects.bulk_update(changed_positions.values(), ['quantity', 'cost_basis'])
+        Transaction.objects.bulk_create(new_transactions)
+        
+        if changed_stocks:
+            invalidate_on_commit('stocks', *settled_tags(changed_users, [user.username for user in changed_users.values()], changed_stocks))
+    
+    
+    return results
+
+
+
+def publish_order_results(orders:list, results:list):
+    """
+    Publish the result of every order submitted with an order_id, once the settlement is committed.
+    """
+    for order, result in zip(orders, results):
+        if order.get('order_id'):
+            transaction.on_commit(partial(set_order_status, order['order_id'], result['status'], result['message']))
+
+
+
+def publish_order_failure(orders:list):
+    """
+    Publish a final `failed` status for orders whose settlement raised, their waiters would otherwise wait for the timeout.
+    
+    Published right away, the settlement was rolled back and nothing will commit.
+    """
+    for order in orders:
+        if order.get('order_id'):
+            try:
+                set_order_status(order['order_id'], FAILED, 'Transaction failed and was not settled.')
+            except Exception:
+                # keep the settlement error, it is re-raised by the caller
+                logger.exception("could not publish the failure of order %s", order['order_id'])
+
+
+
+def enqueue_transaction(validated_data:dict):
+    """
+    Queue an order for the batching processor and schedule a drain unless one already holds the drain lock.
+    """
+    connection = get_redis_connection("default")
+    connection.rpush(settings.TRANSACTION_QUEUE_KEY, json.dumps(validated_data))
+    schedule_drain(connection)
+    
+
+
+def schedule_drain(connection):
+    """
+    Schedule a drain task when the drain lock is free, the task gets the token the lock holds.
+    The lock expires, so a drain that died is replaced by the next order.
+    """
+    token:str = str(uuid4())
+    
+    if connection.set(f"{settings.TRANSACTION_QUEUE_KEY}:drain_lock", token, nx=True, ex=settings.TRANSACTION_DRAIN_LOCK_TIMEOUT):
+        drain_transaction_queue.delay(token)
+
+
+
+def hold_drain_lock(connection, token:str, release:bool=False)->bool:
+    """
+    Extend the drain lock, or release it, only while `token` holds it, returns False when another drain took it over.
+    
+    WATCH makes the check and the write atomic, a drain that lost the lock can never extend or delete its successor's.
+    """
+    lock_key:str = f"{settings.TRANSACTION_QUEUE_KEY}:drain_lock"
+    
+    with connection.pipeline(transaction=True) as pipeline:
+        try:
+            pipeline.watch(lock_key)
+            
+            if pipeline.get(lock_key) != token.encode():
+                return False
+            
+            pipeline.multi()
+            if release:
+                pipeline.delete(lock_key)
+            else:
+                pipeline.expire(lock_key, settings.TRANSACTION_DRAIN_LOCK_TIMEOUT)
+            pipeline.execute()
+        except WatchError:
+            return False
+    
+    
+    return True
+
+
+
+def claim_batch(connection)->tuple:
+    """
+    Return (orders, recovered): the orders a dead drain left in the processing list, else the next batch moved there from the queue.
+    """
+    processing_key:str = f"{settings.TRANSACTION_QUEUE_KEY}:processing"
+    orders:list = connection.lrange(processing_key, 0, -1)
+    
+    if orders:
+        return orders, True
+    
+    
+    # one MULTI, the orders are never only in memory
+    pipeline = connection.pipeline(transaction=True)
+    
+    for _ in range(settings.TRANSACTION_BATCH_SIZE):
+        pipeline.lmove(settings.TRANSACTION_QUEUE_KEY, processing_key, 'LEFT', 'RIGHT')
+    
+    
+    return [order for order in pipeline.execute() if order is not None], False
+
+
+
+def is_settled(order:dict)->bool:
+    """
+    Whether a recovered order already has a final status, its batch committed before the drain died.
+    """
+    order_status:dict = get_order_status(order['order_id']) if order.get('order_id') else None
+    
+    
+    return order_status is not None and order_status['status'] in FINAL_STATUSES
+
+
+
+def settle_claimed_batch(orders:list):
+    """
+    Settle a claimed batch in one atomic block, or order by order when the batch raised,
+    so one bad order only fails itself: it is logged and gets a `failed` status.
+    """
+    try:
+        results:list = settle_transaction_batch(orders)
+    except Exception:
+        logger.exception("batch of %s orders failed to settle, settling them one by one", len(orders))
+    else:
+        publish_order_results(orders, results)
+        return
+    
+    
+    for order in orders:
+        try:
+            process_transaction_async(order)
+        except Exception:
+            logger.exception("order %s failed to settle", order.get('order_id'))
+
+
+
+@shared_task(name="drain_transaction_queue")
+def drain_transaction_queue(token:str=None)->int:
+    """
+    Settle the queued orders in batches of TRANSACTION_BATCH_SIZE until the queue is empty.
+    
+    A batch is moved to the processing list with LMOVE and only removed once it is settled and committed,
+    the next drain settles what a killed drain left there. The drain renews the lock it was scheduled with
+    before every batch and stops once it lost it. Called without a token it takes the lock itself.
+    """
+    connection = get_redis_connection("default")
+    processing_key:str = f"{settings.TRANSACTION_QUEUE_KEY}:processing"
+    settled:int = 0
+    
+    if token is None:
+        token = str(uuid4())
+        
+        if not connection.set(f"{settings.TRANSACTION_QUEUE_KEY}:drain_lock", token, nx=True, ex=settings.TRANSACTION_DRAIN_LOCK_TIMEOUT):
+            return 0
+    
+    
+    try:
+        while hold_drain_lock(connection, token):
+            encoded, recovered = claim_batch(connection)
+            
+            if not encoded:
+                break
+            
+            orders:list = [json.loads(order) for order in encoded]
+            if recovered:
+                orders = [order for order in orders if not is_settled(order)]
+            
+            try:
+                if orders:
+                    settle_claimed_batch(orders)
+            finally:
+                connection.delete(processing_key)
+            
+            settled += len(orders)
+    finally:
+        hold_drain_lock(connection, token, release=True)
+        
+        # an order queued while the lock was held did not schedule a drain, neither did the orders left by a drain that raised
+        if connection.llen(settings.TRANSACTION_QUEUE_KEY):
+            schedule_drain(connection)
+    
+    
+    return settled
+
+
+
+@shared_task(name="match_order")
+def match_order_async(order_data:dict)->dict:
+    """
+    Match a limit or market order in the order book of its ticker, routed to the `matching` queue.
+    """
+    try:
+        return match_order(order_data)
+    except Exception:
+        publish_order_failure([order_data])
+        raise
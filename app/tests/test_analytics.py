@@ -0,0 +1,47 @@
+from app.models import (User, StockData, Position)
+from app.analytics import compute_valuations
+from django.test import TestCase
+
+
+class ComputeValuationsTestCases(TestCase):
+    """Test Cases For the batched portfolio valuation"""
+    
+    def setUp(self):
+        """Set up two users holding two tickers"""
+        self.alice = User.objects.create(username='alice', balance=0)
+        self.bob = User.objects.create(username='bob', balance=0)
+        StockData.objects.create(ticker='AAPL', open_price=10, close_price=20, high=20, low=10, volume=100)
+        StockData.objects.create(ticker='MSFT', open_price=10, close_price=5, high=10, low=5, volume=100)
+        
+        Position.objects.create(user=self.alice, ticker='AAPL', quantity=10, cost_basis=100)
+        Position.objects.create(user=self.alice, ticker='MSFT', quantity=4, cost_basis=40)
+        Position.objects.create(user=self.bob, ticker='AAPL', quantity=1, cost_basis=25)
+        Position.objects.create(user=self.bob, ticker='MSFT', quantity=0, cost_basis=0)
+    
+    
+    def test_compute_valuations(self):
+        
+        valuations = compute_valuations()
+        
+        self.assertEqual(valuations['users']['alice'], {
+            'market_value': 220.0,
+            'cost_basis': 140.0,
+            'unrealized_pnl': 80.0,
+            'exposure': {'AAPL': 200.0, 'MSFT': 20.0},
+        })
+        self.assertEqual(valuations['users']['bob']['unrealized_pnl'], -5.0)
+        self.assertEqual(valuations['users']['bob']['exposure'], {'AAPL': 20.0})
+        self.assertEqual(valuations['tickers'], {'AAPL': 220.0, 'MSFT': 20.0})
+    
+    
+    def test_compute_valuations_of_some_users(self):
+        
+        valuations = compute_valuations(['bob'])
+        
+        self.assertEqual(list(valuations['users']), ['bob'])
+        self.assertEqual(valuations['tickers'], {'AAPL': 20.0})
+    
+    
+    def test_compute_valuations_without_positions(self):
+        
+        self.assertEqual(compute_valuations(['nobody']), {'users': {}, 'tickers': {}})
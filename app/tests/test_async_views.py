@@ -0,0 +1,134 @@
+from app.models import (User, StockData, Transaction)
+from django.conf import settings
+from django.test import (TestCase, override_settings)
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from app.utils import (get_from_cache, bump_generation, user_key, stock_key)
+from app.order_status import set_order_status
+from asgiref.sync import sync_to_async
+import asyncio
+
+
+class AsyncViewsTestCases(TestCase):
+    """Test Cases For the async views"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.user = User.objects.create(username='john', balance=1000)
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+    
+    
+    async def test_create_user(self):
+    
+        response = await self.async_client.post(reverse('async-users'), {'username': 'jane', 'balance': '50.00'}, content_type='application/json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await User.objects.filter(username='jane').aexists())
+        self.assertEqual(get_from_cache(user_key('jane'))['balance'], '50.00')
+    
+    
+    async def test_create_user_with_invalid_data(self):
+    
+        response = await self.async_client.post(reverse('async-users'), {'username': 'jo', 'balance': '50.00'}, content_type='application/json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', response.json())
+    
+    
+    async def test_retrieve_user_is_cached(self):
+    
+        response = await self.async_client.get(reverse('async-user-detail', args=['john']))
+        await User.objects.filter(username='john').aupdate(balance=0)
+        cached = await self.async_client.get(reverse('async-user-detail', args=['john']))
+        
+        self.assertEqual(response.json()['balance'], '1000.00')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual((await self.async_client.get(reverse('async-user-detail', args=['nobody']))).status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    async def test_stock_list_shares_the_cache_of_the_sync_view(self):
+    
+        sync_response = await self.async_client.get(reverse('stocks-list'))
+        await StockData.objects.filter(ticker='AAPL').aupdate(close_price=1)
+        response = await self.async_client.get(reverse('async-stocks'))
+        
+        self.assertEqual(response.json(), sync_response.json())
+        
+        await sync_to_async(bump_generation)('stocks')
+        self.assertEqual((await self.async_client.get(reverse('async-stocks'))).json()[0]['close_price'], '1.00')
+    
+    
+    async def test_retrieve_stock(self):
+    
+        response = await self.async_client.get(reverse('async-stock-detail', args=['AAPL']))
+        
+        self.assertEqual(response.json()['ticker'], 'AAPL')
+        self.assertEqual(get_from_cache(stock_key('AAPL'), family='stock')['ticker'], 'AAPL')
+        self.assertEqual((await self.async_client.get(reverse('async-stock-detail', args=['MSFT']))).status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    @patch('app.async_views.process_transaction_async.delay')
+    async def test_create_transaction(self, mock_delay):
+    
+        data = {'user': str(self.user.user_id), 'ticker': 'AAPL', 'transaction_type': 'BUY', 'transaction_volume': 2}
+        response = await self.async_client.post(reverse('async-create-transaction'), data, content_type='application/json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_delay.call_args.args[0]['transaction_type'], 'buy')
+        self.assertEqual(mock_delay.call_args.args[0]['order_id'], response.json()['order_id'])
+    
+    
+    @override_settings(ORDER_STATUS={**settings.ORDER_STATUS, 'POLL_INTERVAL': 0.01})
+    async def test_order_status(self):
+    
+        await sync_to_async(set_order_status)('order-1', 'pending', 'Transaction is in progress.')
+        asyncio.get_running_loop().call_later(0.1, set_order_status, 'order-1', 'accepted', 'Transaction settled.')
+        
+        response = await self.async_client.get(reverse('async-order-status', args=['order-1']), {'wait': 5})
+        self.assertEqual(response.json()['status'], 'accepted')
+        
+        response = await self.async_client.get(reverse('async-order-events', args=['order-1']))
+        self.assertIn(b'"status": "accepted"', b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual((await self.async_client.get(reverse('async-order-status', args=['missing']))).status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    @patch('app.async_views.process_transaction_async.delay')
+    async def test_create_transaction_rejected(self, mock_delay):
+    
+        too_expensive = {'user': str(self.user.user_id), 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 10}
+        unknown_stock = {**too_expensive, 'ticker': 'MSFT', 'transaction_volume': 1}
+        
+        response = await self.async_client.post(reverse('async-create-transaction'), too_expensive, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = await self.async_client.post(reverse('async-create-transaction'), unknown_stock, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        response = await self.async_client.post(reverse('async-create-transaction'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_delay.assert_not_called()
+    
+    
+    async def test_user_transactions(self):
+    
+        await Transaction.objects.acreate(user=self.user, ticker='AAPL', transaction_type='buy', transaction_volume=1, transaction_price=155)
+        url = reverse('async-user-transactions', args=[self.user.user_id])
+        
+        response = await self.async_client.get(url)
+        cached = await self.async_client.get(url)
+        
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual((await self.async_client.get(reverse('user-transactions', args=[self.user.user_id]))).json(), response.json())
+    
+    
+    async def test_requests_are_measured(self):
+    
+        before = REGISTRY.get_sample_value('http_request_duration_seconds_count', {'view': 'async-stock-detail', 'method': 'GET', 'status': '200'}) or 0
+        await self.async_client.get(reverse('async-stock-detail', args=['AAPL']))
+        
+        self.assertEqual(REGISTRY.get_sample_value('http_request_duration_seconds_count', {'view': 'async-stock-detail', 'method': 'GET', 'status': '200'}), before + 1)
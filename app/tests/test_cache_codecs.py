@@ -0,0 +1,61 @@
+from app.cache_codecs import get_codec
+from app.utils import (store_in_cache, get_from_cache)
+from django.core.exceptions import ImproperlyConfigured
+from django.test import (SimpleTestCase, override_settings)
+from django.core.cache import cache
+from decimal import Decimal
+from datetime import datetime
+import importlib.util
+import unittest
+
+
+PAYLOAD = [{'ticker': 'AAPL', 'close_price': '155.00', 'volume': 1000000, 'timestamp': '2024-01-01T10:00:00'}]
+
+
+class CacheCodecTestCases(SimpleTestCase):
+    """Test Cases For the cache codecs"""
+    
+    def assertRoundTrip(self, name:str):
+        
+        codec = get_codec(name)
+        data:bytes = codec.encode(PAYLOAD)
+        
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(codec.decode(data), PAYLOAD)
+    
+    
+    def test_json_codec(self):
+        self.assertRoundTrip('json')
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('orjson') is None, "orjson is not installed")
+    def test_orjson_codec(self):
+        self.assertRoundTrip('orjson')
+        self.assertEqual(get_codec('orjson').encode(PAYLOAD), get_codec('json').encode(PAYLOAD))
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('msgpack') is None, "msgpack is not installed")
+    def test_msgpack_codec(self):
+        self.assertRoundTrip('msgpack')
+    
+    
+    def test_encodes_decimal_and_datetime_like_drf(self):
+        
+        data:bytes = get_codec('json').encode({'price': Decimal('1.50'), 'at': datetime(2024, 1, 1, 10)})
+        self.assertEqual(data, b'{"price":"1.50","at":"2024-01-01T10:00:00"}')
+    
+    
+    def test_unknown_codec(self):
+        
+        with self.assertRaises(ImproperlyConfigured):
+            get_codec('pickle5000')
+    
+    
+    @override_settings(CACHE_CODEC='json')
+    def test_store_and_get_use_the_configured_codec(self):
+        
+        store_in_cache(key='codec_test', value=PAYLOAD)
+        
+        self.assertEqual(cache.get('codec_test'), get_codec('json').encode(PAYLOAD))
+        self.assertEqual(get_from_cache(key='codec_test'), PAYLOAD)
+        cache.delete('codec_test')
@@ -0,0 +1,170 @@
+from app import cache_tiers
+from app.cache_tiers import LocalCache
+from app.utils import (store_in_cache, get_from_cache, delete_from_cache, get_or_compute)
+from django.test import (SimpleTestCase, override_settings)
+from django.core.cache import cache
+from prometheus_client import REGISTRY
+from unittest.mock import patch
+import json
+import time
+
+
+L1_SETTINGS = {'ENABLED': True, 'MAX_ENTRIES': 2, 'TIMEOUT': 60, 'CHANNEL': 'cache_invalidation'}
+
+
+class StopListening(BaseException):
+    pass
+
+
+
+class FakePubSub:
+    
+    def __init__(self, messages):
+        self.messages = iter(messages)
+        self.closed = False
+    
+    def subscribe(self, channel:str):
+        self.channel = channel
+    
+    def get_message(self, timeout:float=0):
+        try:
+            return next(self.messages)
+        except StopIteration:
+            raise StopListening
+    
+    def close(self):
+        self.closed = True
+
+
+
+class IdlePubSub(FakePubSub):
+    
+    def get_message(self, timeout:float=0):
+        time.sleep(min(timeout, 0.01))
+        return None
+
+
+
+class LocalCacheTestCases(SimpleTestCase):
+    """Test Cases For the in-process LRU cache"""
+    
+    def test_evicts_least_recently_used(self):
+        
+        l1 = LocalCache(max_entries=2, timeout=60)
+        l1.set('a', b'1')
+        l1.set('b', b'2')
+        l1.get('a')
+        l1.set('c', b'3')
+        
+        self.assertEqual((l1.get('a'), l1.get('b'), l1.get('c')), (b'1', None, b'3'))
+    
+    
+    def test_expires_entries(self):
+        
+        l1 = LocalCache(max_entries=2, timeout=0.01)
+        l1.set('a', b'1')
+        time.sleep(0.02)
+        
+        self.assertIsNone(l1.get('a'))
+        self.assertEqual(len(l1), 0)
+
+
+
+@override_settings(CACHE_L1=L1_SETTINGS)
+class TwoTierCacheTestCases(SimpleTestCase):
+    """Test Cases For reads and invalidations through the L1 and L2 tiers"""
+    
+    def setUp(self):
+        """Start every test with empty tiers"""
+        cache.clear()
+        cache_tiers.reset_l1()
+    
+    
+    def tearDown(self):
+        cache_tiers.reset_l1()
+    
+    
+    def sample(self, name:str, tier:str)->float:
+        return REGISTRY.get_sample_value(f'{name}_total', {'tier': tier, 'family': 'other'}) or 0
+    
+    
+    def test_second_read_is_served_by_l1(self):
+        
+        store_in_cache(key='AAPL', value={'ticker': 'AAPL'})
+        l1_hits, l2_hits = self.sample('cache_hits', 'l1'), self.sample('cache_hits', 'l2')
+        
+        self.assertEqual(get_from_cache(key='AAPL'), {'ticker': 'AAPL'})
+        with patch.object(cache, 'get', side_effect=AssertionError("L2 should not be read")):
+            self.assertEqual(get_from_cache(key='AAPL'), {'ticker': 'AAPL'})
+        
+        self.assertEqual(self.sample('cache_hits', 'l1') - l1_hits, 1)
+        self.assertEqual(self.sample('cache_hits', 'l2') - l2_hits, 1)
+    
+    
+    def test_single_flight_reads_are_served_by_l1(self):
+        """Test that get_or_compute keeps fresh values in the L1, like the stock listing and user retrieve use it"""
+        self.assertEqual(get_or_compute('users', lambda: ['sohail'], timeout=60), ['sohail'])
+        # the first read after the compute fills the L1
+        get_or_compute('users', lambda: ['other'], timeout=60)
+        
+        with patch.object(cache, 'get_many', side_effect=AssertionError("L2 should not be read")):
+            self.assertEqual(get_or_compute('users', lambda: ['other'], timeout=60), ['sohail'])
+        
+        store_in_cache(key='users', value=['sohail', 'jane'])
+        self.assertEqual(get_or_compute('users', lambda: ['other'], timeout=60), ['sohail', 'jane'])
+    
+    
+    def test_writes_and_deletes_invalidate_l1(self):
+        
+        store_in_cache(key='AAPL', value={'close_price': '1.00'})
+        get_from_cache(key='AAPL')
+        
+        store_in_cache(key='AAPL', value={'close_price': '2.00'})
+        self.assertEqual(get_from_cache(key='AAPL'), {'close_price': '2.00'})
+        
+        delete_from_cache(key='AAPL')
+        self.assertIsNone(get_from_cache(key='AAPL'))
+    
+    
+    def test_subscriber_drops_published_keys(self):
+        
+        l1 = cache_tiers.get_l1()
+        
+        def messages():
+            # filled after subscribing, the subscriber clears the L1 when it (re)connects
+            l1.set(cache.make_key('AAPL'), b'{}')
+            l1.set(cache.make_key('MSFT'), b'{}')
+            yield {'data': json.dumps([cache.make_key('AAPL')])}
+        
+        connection = type('Connection', (), {'pubsub': lambda self, **kwargs: FakePubSub(messages())})()
+        
+        with self.assertRaises(StopListening):
+            cache_tiers.listen(connection, l1)
+        
+        self.assertIsNone(l1.get(cache.make_key('AAPL')))
+        self.assertEqual(l1.get(cache.make_key('MSFT')), b'{}')
+    
+    
+    def test_subscriber_keeps_the_l1_it_was_started_for(self):
+        """Test that the subscriber thread survives a reset of the L1 and is stopped with it"""
+        pubsub = IdlePubSub([])
+        connection = type('Connection', (), {'pubsub': lambda self, **kwargs: pubsub})()
+        
+        with patch('app.cache_tiers.redis_connection', return_value=connection):
+            cache_tiers.get_l1()
+        thread = cache_tiers._subscriber
+        
+        with self.assertNoLogs('app.cache_tiers'):
+            cache_tiers._l1 = None
+            time.sleep(0.05)
+        self.assertTrue(thread.is_alive())
+        
+        cache_tiers.reset_l1()
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(pubsub.closed)
+    
+    
+    @override_settings(CACHE_L1={**L1_SETTINGS, 'ENABLED': False})
+    def test_disabled_l1(self):
+        
+        self.assertIsNone(cache_tiers.get_l1())
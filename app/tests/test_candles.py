@@ -0,0 +1,110 @@
+from app.models import (StockBar, StockCandle)
+from app.candles import (parse_interval, bucket_start, source_interval, refresh_candles, resample_candles, _source_rows)
+from django.test import (SimpleTestCase, TestCase)
+from datetime import (datetime, timedelta)
+from decimal import Decimal
+
+
+class IntervalTestCases(SimpleTestCase):
+    """Test Cases For interval parsing and bucketing"""
+    
+    def test_parse_interval(self):
+        
+        self.assertEqual(parse_interval('5m'), timedelta(minutes=5))
+        self.assertEqual(parse_interval('4h'), timedelta(hours=4))
+        self.assertIsNone(parse_interval('0m'))
+        self.assertIsNone(parse_interval('5s'))
+        self.assertIsNone(parse_interval(None))
+    
+    
+    def test_bucket_start(self):
+        
+        self.assertEqual(bucket_start(datetime(2024, 1, 1, 10, 7, 30), timedelta(minutes=5)), datetime(2024, 1, 1, 10, 5))
+        self.assertEqual(bucket_start(datetime(2024, 1, 1, 10, 7, 30), timedelta(days=1)), datetime(2024, 1, 1))
+    
+    
+    def test_source_interval(self):
+        
+        self.assertEqual(source_interval(timedelta(minutes=15)), '5m')
+        self.assertEqual(source_interval(timedelta(hours=4)), '1h')
+        self.assertEqual(source_interval(timedelta(days=7)), '1d')
+        self.assertEqual(source_interval(timedelta(minutes=7)), '1m')
+
+
+
+class RefreshCandlesTestCases(TestCase):
+    """Test Cases For the incremental candle rollups"""
+    
+    def setUp(self):
+        """Set up bars spread over two hours, out of order"""
+        self.start = datetime(2024, 1, 1, 10, 0)
+        self.bars = [
+            self.bar(minutes=3, open_price=11, close_price=12, high=13, low=10, volume=20),
+            self.bar(minutes=0, open_price=10, close_price=11, high=12, low=9, volume=10),
+            self.bar(minutes=7, open_price=12, close_price=14, high=15, low=11, volume=30),
+            self.bar(minutes=65, open_price=20, close_price=21, high=22, low=19, volume=40),
+        ]
+        StockBar.objects.bulk_create(self.bars)
+        refresh_candles(self.bars)
+    
+    
+    def bar(self, minutes:int, **prices)->StockBar:
+        return StockBar(ticker='AAPL', timestamp=self.start + timedelta(minutes=minutes), **prices)
+    
+    
+    def test_rollups_of_every_interval(self):
+        
+        self.assertEqual(StockCandle.objects.filter(interval='1m').count(), 4)
+        self.assertEqual(StockCandle.objects.filter(interval='5m').count(), 3)
+        self.assertEqual(StockCandle.objects.filter(interval='1h').count(), 2)
+        
+        day:StockCandle = StockCandle.objects.get(interval='1d')
+        self.assertEqual(day.bucket_start, datetime(2024, 1, 1))
+        self.assertEqual((day.open_price, day.close_price), (Decimal(10), Decimal(21)))
+        self.assertEqual((day.high, day.low, day.volume), (Decimal(22), Decimal(9), 100))
+    
+    
+    def test_refresh_is_incremental_and_idempotent(self):
+        
+        late_bar:StockBar = self.bar(minutes=1, open_price=9, close_price=30, high=30, low=8, volume=5)
+        StockBar.objects.bulk_create([late_bar])
+        refresh_candles([late_bar])
+        refresh_candles([late_bar])
+        
+        five:StockCandle = StockCandle.objects.get(interval='5m', bucket_start=self.start)
+        self.assertEqual((five.open_price, five.close_price), (Decimal(10), Decimal(12)))
+        self.assertEqual((five.high, five.low, five.volume), (Decimal(30), Decimal(8), 35))
+        self.assertEqual(StockCandle.objects.get(interval='1d').volume, 105)
+    
+    
+    def test_source_rows_are_bounded_per_ticker(self):
+        """Test that a ticker only reads the rows of its own touched buckets"""
+        StockBar.objects.bulk_create([
+            StockBar(ticker='MSFT', timestamp=self.start + timedelta(minutes=minutes), open_price=1, close_price=1, high=1, low=1, volume=1)
+            for minutes in (3, 65)
+        ])
+        chunk:set = {('AAPL', self.start), ('MSFT', self.start + timedelta(minutes=65))}
+        
+        rows = _source_rows(None, chunk, timedelta(minutes=1))
+        
+        self.assertEqual({(row.ticker, row.timestamp) for row in rows}, chunk)
+    
+    
+    def test_resample_non_standard_interval(self):
+        
+        candles:list = resample_candles('AAPL', '15m')
+        
+        self.assertEqual([candle.bucket_start for candle in candles], [self.start, self.start + timedelta(hours=1)])
+        self.assertEqual((candles[0].interval, candles[0].close_price, candles[0].volume), ('15m', Decimal(14), 60))
+    
+    
+    def test_resample_within_range(self):
+        
+        candles:list = resample_candles('AAPL', '5m', start=self.start + timedelta(minutes=6), end=self.start + timedelta(minutes=30))
+        self.assertEqual([candle.bucket_start for candle in candles], [self.start + timedelta(minutes=5)])
+    
+    
+    def test_resample_invalid_interval(self):
+        
+        with self.assertRaises(ValueError):
+            resample_candles('AAPL', '30s')
@@ -0,0 +1,100 @@
+from app.models import (User, StockData, StockBar, StockCandle, Transaction, Position)
+from django.core.management import call_command
+from django.test import TestCase
+from django.apps import apps
+from importlib import import_module
+from django.core.cache import cache
+from app.utils import get_from_cache
+from django.utils import timezone
+from io import StringIO
+
+
+class RebuildPositionsCommandTestCases(TestCase):
+    """Test Cases For the rebuild_positions management command"""
+    
+    def setUp(self):
+        """Set up a ledger of transactions"""
+        self.user = User.objects.create(username='ledger_user', balance=1000)
+        self.other_user = User.objects.create(username='other_ledger_user', balance=1000)
+        
+        for user, ticker, transaction_type, volume, price in [
+            (self.user, 'AAPL', 'buy', 10, 10),
+            (self.user, 'AAPL', 'buy', 10, 20),
+            (self.user, 'AAPL', 'sell', 5, 30),
+            (self.user, 'MSFT', 'buy', 1, 100),
+            (self.other_user, 'AAPL', 'buy', 2, 10),
+        ]:
+            Transaction.objects.create(user=user, ticker=ticker, transaction_type=transaction_type, transaction_volume=volume, transaction_price=price)
+    
+    
+    def test_rebuild_positions(self):
+        """Test that positions are replayed from the ledger with average cost"""
+        Position.objects.create(user=self.user, ticker='AAPL', quantity=999, cost_basis=1)
+        
+        call_command('rebuild_positions', stdout=StringIO())
+        
+        position = Position.objects.get(user=self.user, ticker='AAPL')
+        self.assertEqual(position.quantity, 15)
+        self.assertEqual(position.cost_basis, 225)
+        self.assertEqual(Position.objects.get(user=self.user, ticker='MSFT').quantity, 1)
+        self.assertEqual(Position.objects.count(), 3)
+    
+    
+    def test_rebuild_positions_of_one_user(self):
+        
+        Position.objects.create(user=self.other_user, ticker='AAPL', quantity=999, cost_basis=1)
+        
+        call_command('rebuild_positions', '--user', self.user.pk, stdout=StringIO())
+        
+        self.assertEqual(Position.objects.get(user=self.other_user, ticker='AAPL').quantity, 999)
+        self.assertEqual(Position.objects.filter(user=self.user).count(), 2)
+    
+    
+    def test_migration_backfills_positions(self):
+        """Test that the migration creating positions replays the existing ledger into them"""
+        backfill_positions = import_module('app.migrations.0010_position').backfill_positions
+        
+        backfill_positions(apps, None)
+        
+        self.assertEqual(Position.objects.get(user=self.user, ticker='AAPL').quantity, 15)
+        self.assertEqual(Position.objects.get(user=self.other_user, ticker='AAPL').cost_basis, 20)
+        self.assertEqual(Position.objects.count(), 3)
+
+
+
+class ComputeValuationsCommandTestCases(TestCase):
+    """Test Cases For the compute_valuations management command"""
+    
+    def test_compute_valuations_stores_in_cache(self):
+        
+        user = User.objects.create(username='valued_user', balance=0)
+        StockData.objects.create(ticker='AAPL', open_price=10, close_price=20, high=20, low=10, volume=100)
+        Position.objects.create(user=user, ticker='AAPL', quantity=10, cost_basis=100)
+        cache.delete('portfolio_valuations')
+        
+        call_command('compute_valuations', stdout=StringIO())
+        
+        self.assertIn('valued_user', get_from_cache(key='portfolio_valuations')['users'])
+
+
+
+class RebuildCandlesCommandTestCases(TestCase):
+    """Test Cases For the rebuild_candles management command"""
+    
+    def test_rebuild_candles_from_bars(self):
+        
+        now = timezone.now()
+        StockBar.objects.bulk_create([
+            StockBar(ticker=ticker, open_price=10, close_price=11, high=12, low=9, volume=100, timestamp=now - timezone.timedelta(minutes=minutes))
+            for ticker in ('AAPL', 'MSFT') for minutes in (0, 1, 2)
+        ])
+        StockCandle.objects.create(
+            ticker='AAPL', interval='1d', bucket_start=now, open_price=1, close_price=1, high=1, low=1, volume=1,
+            first_timestamp=now, last_timestamp=now,
+        )
+        
+        call_command('rebuild_candles', '--ticker', 'AAPL', '--chunk-size', '2', stdout=StringIO())
+        
+        self.assertEqual(StockCandle.objects.filter(ticker='AAPL', interval='1m').count(), 3)
+        self.assertEqual(sum(StockCandle.objects.filter(ticker='AAPL', interval='1d').values_list('volume', flat=True)), 300)
+        self.assertFalse(StockCandle.objects.filter(ticker='MSFT').exists())
@@ -0,0 +1,39 @@
+from config.database import connection_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+import importlib.util
+import unittest
+
+
+class ConnectionSettingsTestCases(SimpleTestCase):
+    """Test Cases For the database connection modes"""
+    
+    def test_fresh_connections_by_default(self):
+    
+        self.assertEqual(connection_settings({}), {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}})
+    
+    
+    def test_persistent_connections_are_health_checked(self):
+    
+        database:dict = connection_settings({'DATABASE_CONNECTION_MODE': 'persistent', 'DATABASE_CONN_MAX_AGE': '300'})
+        
+        self.assertEqual(database['CONN_MAX_AGE'], 300)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('psycopg_pool') is None, "psycopg_pool is not installed")
+    def test_pool(self):
+    
+        database:dict = connection_settings({'DATABASE_CONNECTION_MODE': 'pool', 'DATABASE_POOL_MAX_SIZE': '20'})
+        pool:dict = database['OPTIONS']['pool']
+        
+        # Django refuses a pool with persistent connections
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual((pool['min_size'], pool['max_size'], pool['timeout']), (2, 20, 10.0))
+        self.assertTrue(callable(pool['check']))
+    
+    
+    def test_unknown_mode(self):
+    
+        with self.assertRaises(ImproperlyConfigured):
+            connection_settings({'DATABASE_CONNECTION_MODE': 'pgbouncer'})
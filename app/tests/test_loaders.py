@@ -0,0 +1,100 @@
+from app.loaders import (Loader, get_loader, loader_scope)
+from app.models import (User, StockData, Position)
+from app.serializers import StockSerializer
+from app.utils import (store_in_cache, stock_key)
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from unittest.mock import patch
+
+
+class LoaderTestCases(APITestCase):
+    """Test Cases For the request and task scoped loader"""
+    
+    def setUp(self):
+    
+        cache.clear()
+        self.user = User.objects.create(username='loader_user', balance=10000)
+        self.stock = StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+        Position.objects.create(user=self.user, ticker='AAPL', quantity=10, cost_basis=1500)
+        self.create_url = reverse('create-transaction')
+    
+    
+    def test_rows_are_fetched_once_per_scope(self):
+    
+        with loader_scope():
+            with self.assertNumQueries(1):
+                self.assertEqual(get_loader().get(User, self.user.pk).username, self.user.username)
+                self.assertIs(get_loader().get(User, self.user.pk), get_loader().get(User, self.user.pk))
+            
+            with self.assertNumQueries(1):
+                self.assertIsNone(get_loader().get(User, 'missing'))
+                self.assertIsNone(get_loader().get(User, 'missing'))
+        
+        # outside a scope every call gets a new loader
+        self.assertIsNot(get_loader(), get_loader())
+    
+    
+    def test_stock_snapshot_is_read_from_the_cache(self):
+    
+        store_in_cache(key=stock_key('AAPL'), value=StockSerializer(self.stock).data, family='stock')
+        
+        with self.assertNumQueries(0):
+            stock:StockData = Loader().stock('AAPL')
+        
+        self.assertEqual((stock.pk, stock.close_price, stock.volume), (self.stock.pk, self.stock.close_price, 1000))
+        
+        with self.assertRaises(Http404):
+            Loader().stock('MSFT')
+    
+    
+    def test_stock_snapshot_fills_the_cache(self):
+    
+        with self.assertNumQueries(1):
+            Loader().stock('AAPL')
+        
+        with self.assertNumQueries(0):
+            Loader().stock('AAPL')
+    
+    
+    @patch('app.views.process_transaction_async.delay')
+    def test_buy_order_makes_one_query(self, mock_delay):
+    
+        Loader().stock('AAPL')
+        
+        with self.assertNumQueries(1):
+            response = self.client.post(self.create_url, {'user': self.user.pk, 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 5})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_delay.assert_called_once()
+    
+    
+    @patch('app.views.process_transaction_async.delay')
+    def test_sell_order_makes_one_query(self, mock_delay):
+    
+        Loader().stock('AAPL')
+        
+        with self.assertNumQueries(1):
+            response = self.client.post(self.create_url, {'user': self.user.pk, 'ticker': 'AAPL', 'transaction_type': 'sell', 'transaction_volume': 5})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_delay.assert_called_once()
+        
+        response = self.client.post(self.create_url, {'user': self.user.pk, 'ticker': 'AAPL', 'transaction_type': 'sell', 'transaction_volume': 50})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('transaction_volume', response.data)
+    
+    
+    @patch('app.views.process_transaction_async.delay')
+    def test_user_named_like_a_ticker(self, mock_delay):
+        """Test that the cached snapshot of a user named like a ticker is never read as the stock"""
+        user = User.objects.create(username='AAPL', balance=10000)
+        self.assertEqual(self.client.get(reverse('users-detail', args=['AAPL'])).data['username'], 'AAPL')
+        self.client.get(reverse('stocks-detail', args=['AAPL']))
+        
+        response = self.client.post(self.create_url, {'user': user.pk, 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 5})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Loader().stock('AAPL').volume, 1000)
@@ -0,0 +1,84 @@
+from app.models import StockData
+from app.metrics import (stamp_published_at, record_queue_wait, record_task_duration)
+from django.test import SimpleTestCase
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from prometheus_client import REGISTRY
+from types import SimpleNamespace
+
+
+def sample(name:str, **labels)->float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+
+class MetricsEndpointTestCases(APITestCase):
+    """Test Cases For the request and cache metrics"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+    
+    
+    def test_metrics_endpoint(self):
+        
+        self.client.get(reverse('stocks-list'))
+        response = self.client.get(reverse('metrics'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'http_request_duration_seconds_count{method="GET",status="200",view="stocks-list"}', response.content)
+    
+    
+    def test_request_latency_and_queries_by_view(self):
+        
+        requests = sample('http_request_duration_seconds_count', view='stocks-detail', method='GET', status='200')
+        queries = sample('http_request_db_queries_sum', view='stocks-detail')
+        
+        self.client.get(reverse('stocks-detail', args=['AAPL']))
+        
+        self.assertEqual(sample('http_request_duration_seconds_count', view='stocks-detail', method='GET', status='200') - requests, 1)
+        self.assertGreaterEqual(sample('http_request_db_queries_sum', view='stocks-detail') - queries, 1)
+    
+    
+    def test_unresolved_paths_share_a_label(self):
+        
+        requests = sample('http_request_duration_seconds_count', view='unmatched', method='GET', status='404')
+        self.client.get('/no/such/path/')
+        self.assertEqual(sample('http_request_duration_seconds_count', view='unmatched', method='GET', status='404') - requests, 1)
+    
+    
+    def test_cache_counters_by_family(self):
+        
+        misses = sample('cache_misses_total', tier='l2', family='stock')
+        hits = sample('cache_hits_total', tier='l2', family='stock')
+        read = sample('cache_bytes_total', family='stock', operation='read')
+        
+        self.client.get(reverse('stocks-detail', args=['AAPL']))
+        self.client.get(reverse('stocks-detail', args=['AAPL']))
+        
+        self.assertEqual(sample('cache_misses_total', tier='l2', family='stock') - misses, 1)
+        self.assertEqual(sample('cache_hits_total', tier='l2', family='stock') - hits, 1)
+        self.assertGreater(sample('cache_bytes_total', family='stock', operation='read') - read, 0)
+
+
+
+class CeleryMetricsTestCases(SimpleTestCase):
+    """Test Cases For the celery signal handlers"""
+    
+    def test_queue_wait_and_duration(self):
+        
+        headers:dict = {}
+        stamp_published_at(headers=headers)
+        task = SimpleNamespace(name='process_transaction', request=SimpleNamespace(published_at=headers['published_at'] - 1))
+        waits = sample('celery_task_queue_wait_seconds_count', task='process_transaction')
+        runs = sample('celery_task_duration_seconds_count', task='process_transaction', state='SUCCESS')
+        
+        record_queue_wait(task_id='1', task=task)
+        record_task_duration(task_id='1', task=task, state='SUCCESS')
+        
+        self.assertEqual(sample('celery_task_queue_wait_seconds_count', task='process_transaction') - waits, 1)
+        self.assertGreaterEqual(sample('celery_task_queue_wait_seconds_sum', task='process_transaction'), 1)
+        self.assertEqual(sample('celery_task_duration_seconds_count', task='process_transaction', state='SUCCESS') - runs, 1)
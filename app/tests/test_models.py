@@ -1,4 +1,4 @@
-from app.models import (User, StockData, Transaction)
+from app.models import (User, StockData, StockBar, Transaction)
 from django.test import TestCase 
 from django.db import IntegrityError
 from uuid import UUID
@@ -109,6 +109,36 @@ class StockDataModelTestCases(TestCase):
     
 
 
+class StockBarModelTestCases(TestCase):
+    """Test cases for StockBar model"""
+    
+    def setUp(self):
+        self.bar_data = {
+            'ticker': 'AAPL',
+            'open_price': 150,
+            'close_price': 200,
+            'high': 250,
+            'low': 130,
+            'volume': 8900,
+            'timestamp': timezone.now(),
+        }
+        self.bar = StockBar.objects.create(**self.bar_data)
+    
+    
+    def test_stock_bar_creation(self):
+        
+        self.assertEqual(self.bar.ticker, self.bar_data['ticker'])
+        self.assertEqual(self.bar.close_price, self.bar_data['close_price'])
+    
+    
+    def test_stock_bar_is_unique_per_ticker_and_timestamp(self):
+        """Test that a ticker cannot have two bars with the same timestamp"""
+        
+        with self.assertRaises(IntegrityError):
+            StockBar.objects.create(**self.bar_data)
+
+
+
 class TransactionModelTestCases(TestCase):
     """Test cases for Transaction model"""
     
@@ -0,0 +1,126 @@
+from app.models import (User, StockData)
+from app.order_status import (StatusSubscription, get_order_status, set_order_status)
+from app.tasks import (process_transaction_async, process_transaction_batch_async)
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from threading import Timer
+from unittest.mock import (MagicMock, patch)
+import json
+
+
+ORDER_STATUS = {'TIMEOUT': 60, 'CHANNEL': 'order_status', 'MAX_WAIT': 5, 'HEARTBEAT': 1, 'POLL_INTERVAL': 0.01}
+
+
+@override_settings(ORDER_STATUS=ORDER_STATUS)
+class OrderStatusTestCases(APITestCase):
+    """Test Cases For the order status endpoints"""
+    
+    def setUp(self):
+    
+        cache.clear()
+        self.user = User.objects.create(username='status_user', balance=1000)
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+    
+    
+    @patch('app.views.process_transaction_async.delay')
+    def submit(self, mock_delay)->tuple:
+    
+        response = self.client.post(reverse('create-transaction'), {'user': self.user.pk, 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        
+        return response.data['order_id'], mock_delay.call_args.args[0]
+    
+    
+    def test_order_is_pending_until_settled(self):
+    
+        order_id, order = self.submit()
+        self.assertEqual(order['order_id'], order_id)
+        self.assertEqual(self.client.get(reverse('orders-detail', args=[order_id])).data['status'], 'pending')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction_async(order)
+        
+        response = self.client.get(reverse('orders-detail', args=[order_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['message']), ('accepted', 'Transaction settled.'))
+    
+    
+    def test_rejected_order(self):
+    
+        order_id, order = self.submit()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction_async({**order, 'transaction_volume': 5000})
+        
+        self.assertEqual(get_order_status(order_id)['status'], 'rejected')
+    
+    
+    def test_failed_settlement_is_final(self):
+        """Test that an order whose settlement raised is reported failed instead of pending until the timeout"""
+        order_id, order = self.submit()
+        
+        with patch('app.tasks.settle_transaction', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            process_transaction_async(order)
+        
+        self.assertEqual(get_order_status(order_id)['status'], 'failed')
+        self.assertEqual(self.client.get(reverse('orders-detail', args=[order_id]), {'wait': 5}).data['status'], 'failed')
+        
+        order_id, order = self.submit()
+        
+        with patch('app.tasks.settle_transaction_batch', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            process_transaction_batch_async([order])
+        
+        self.assertEqual(get_order_status(order_id)['status'], 'failed')
+    
+    
+    def test_unknown_order(self):
+    
+        self.assertEqual(self.client.get(reverse('orders-detail', args=['missing'])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('orders-events', args=['missing'])).status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    def test_long_poll_returns_the_change(self):
+    
+        order_id, _ = self.submit()
+        Timer(0.1, set_order_status, args=(order_id, 'accepted', 'Transaction settled.')).start()
+        
+        response = self.client.get(reverse('orders-detail', args=[order_id]), {'wait': 5})
+        self.assertEqual(response.data['status'], 'accepted')
+    
+    
+    def test_long_poll_times_out_with_the_current_status(self):
+    
+        order_id, _ = self.submit()
+        
+        response = self.client.get(reverse('orders-detail', args=[order_id]), {'wait': 0.05})
+        self.assertEqual(response.data['status'], 'pending')
+    
+    
+    def test_event_stream(self):
+    
+        order_id, _ = self.submit()
+        Timer(0.1, set_order_status, args=(order_id, 'accepted', 'Transaction settled.')).start()
+        
+        response = self.client.get(reverse('orders-events', args=[order_id]), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        events:list = [json.loads(line[len('data: '):]) for line in b''.join(response.streaming_content).decode().splitlines() if line.startswith('data: ')]
+        self.assertEqual([event['status'] for event in events], ['pending', 'accepted'])
+    
+    
+    def test_subscription_is_pushed_by_redis(self):
+    
+        order_id, _ = self.submit()
+        connection = MagicMock()
+        connection.pubsub.return_value.get_message.return_value = {'data': json.dumps({'order_id': order_id, 'status': 'accepted'}).encode()}
+        
+        with patch('app.order_status.redis_connection', return_value=connection):
+            with StatusSubscription(order_id) as subscription:
+                self.assertEqual(subscription.wait('pending', 5)['status'], 'accepted')
+        
+        connection.pubsub.return_value.subscribe.assert_called_once_with(f"order_status:{order_id}")
+        connection.pubsub.return_value.close.assert_called_once()
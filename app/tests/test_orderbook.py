@@ -0,0 +1,86 @@
+from app.orderbook import (Order, OrderBook)
+from django.test import SimpleTestCase
+from decimal import Decimal
+
+
+class OrderBookTestCases(SimpleTestCase):
+    """Test Cases For the in-memory order book"""
+    
+    def setUp(self):
+        self.book = OrderBook('AAPL')
+        self.book.submit(Order('s1', 'seller_1', 'sell', 5, Decimal('101')))
+        self.book.submit(Order('s2', 'seller_2', 'sell', 5, Decimal('100')))
+        self.book.submit(Order('s3', 'seller_3', 'sell', 5, Decimal('100')))
+    
+    
+    def test_limit_order_rests_when_not_crossing(self):
+        
+        fills = self.book.submit(Order('b1', 'buyer', 'buy', 5, Decimal('99')))
+        
+        self.assertEqual(fills, [])
+        self.assertEqual(self.book.best_price('buy'), Decimal('99'))
+        self.assertEqual(self.book.best_price('sell'), Decimal('100'))
+    
+    
+    def test_price_time_priority(self):
+        """Test that the best price fills first and orders at one price fill in arrival order"""
+        fills = self.book.submit(Order('b1', 'buyer', 'buy', 12, Decimal('101')))
+        
+        self.assertEqual([(fill.sell_order_id, fill.price, fill.quantity) for fill in fills], [
+            ('s2', Decimal('100'), 5),
+            ('s3', Decimal('100'), 5),
+            ('s1', Decimal('101'), 2),
+        ])
+        self.assertEqual(self.book.orders['s1'].quantity, 3)
+        self.assertEqual(self.book.depth('sell'), 1)
+    
+    
+    def test_limit_order_remainder_rests(self):
+        
+        self.book.submit(Order('b1', 'buyer', 'buy', 15, Decimal('100')))
+        
+        self.assertEqual(self.book.orders['b1'].quantity, 5)
+        self.assertEqual(self.book.best_price('buy'), Decimal('100'))
+        self.assertEqual(self.book.best_price('sell'), Decimal('101'))
+    
+    
+    def test_market_order_remainder_is_dropped(self):
+        
+        fills = self.book.submit(Order('b1', 'buyer', 'buy', 20))
+        
+        self.assertEqual(sum(fill.quantity for fill in fills), 15)
+        self.assertNotIn('b1', self.book.orders)
+        self.assertIsNone(self.book.best_price('sell'))
+    
+    
+    def test_resting_order_that_cannot_settle_is_cancelled(self):
+        """Test that a failed fill cancels the resting order and matching continues"""
+        fills = self.book.submit(Order('b1', 'buyer', 'buy', 5, Decimal('100')), settle=lambda fill: 'sell' if fill.sell_order_id == 's2' else None)
+        
+        self.assertEqual([fill.sell_order_id for fill in fills], ['s3'])
+        self.assertNotIn('s2', self.book.orders)
+    
+    
+    def test_incoming_order_that_cannot_settle_stops_matching(self):
+        
+        fills = self.book.submit(Order('b1', 'buyer', 'buy', 5, Decimal('100')), settle=lambda fill: 'buy')
+        
+        self.assertEqual(fills, [])
+        self.assertNotIn('b1', self.book.orders)
+        self.assertIn('s2', self.book.orders)
+    
+    
+    def test_cancel(self):
+        
+        self.assertTrue(self.book.cancel('s1'))
+        self.assertFalse(self.book.cancel('s1'))
+        self.assertEqual(self.book.depth('sell'), 1)
+    
+    
+    def test_snapshot_restore(self):
+        
+        self.book.submit(Order('b1', 'buyer', 'buy', 5, Decimal('99')))
+        restored = OrderBook.restore(self.book.snapshot())
+        
+        self.assertEqual(restored.snapshot(), self.book.snapshot())
+        self.assertEqual([fill.sell_order_id for fill in restored.submit(Order('b2', 'buyer', 'buy', 6, Decimal('100')))], ['s2', 's3'])
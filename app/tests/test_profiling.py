@@ -0,0 +1,79 @@
+from app.models import StockData
+from app.profiling import (make_token, list_profiles, get_profile)
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+import marshal
+
+
+class ProfilingMiddlewareTestCases(APITestCase):
+    """Test Cases For ProfilingMiddleware and ProfileViewSet"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+        self.staff = get_user_model().objects.create_user(username='admin', password='admin', is_staff=True)
+        self.url = reverse('stocks-detail', args=['AAPL'])
+    
+    
+    def profiled_get(self):
+        return self.client.get(self.url, HTTP_X_PROFILE=make_token())
+    
+    
+    def test_signed_header_profiles_the_request(self):
+    
+        response = self.profiled_get()
+        profile:dict = get_profile(response['X-Profile-Id'])
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((profile['path'], profile['status']), (self.url, 200))
+        self.assertGreaterEqual(profile['sql_queries'], 1)
+        self.assertEqual({event['name'] for event in profile['timeline'] if event['kind'] == 'cache'}, {'generation', 'get', 'set'})
+        self.assertIn('cumulative', profile['stats'])
+    
+    
+    def test_requests_without_a_valid_header_are_not_profiled(self):
+    
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url))
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url, HTTP_X_PROFILE='profile:forged'))
+        self.assertEqual(list_profiles(), [])
+    
+    
+    @override_settings(PROFILING={**settings.PROFILING, 'SAMPLE_RATE': 1.0, 'MAX_PROFILES': 2})
+    def test_sampling_keeps_the_last_profiles(self):
+    
+        ids:list = [self.client.get(self.url)['X-Profile-Id'] for _ in range(3)]
+        
+        self.assertEqual([profile['id'] for profile in list_profiles()], ids[:0:-1])
+        self.assertIsNone(get_profile(ids[0]))
+    
+    
+    def test_profiles_endpoint_is_staff_only(self):
+    
+        self.profiled_get()
+        self.assertIn(self.client.get(reverse('profiles-list')).status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('profiles-list'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+    
+    
+    def test_retrieve_and_download_profile(self):
+    
+        profile_id:str = self.profiled_get()['X-Profile-Id']
+        self.client.force_authenticate(self.staff)
+        
+        self.assertEqual(self.client.get(reverse('profiles-detail', args=[profile_id])).data['id'], profile_id)
+        
+        response = self.client.get(reverse('profiles-download', args=[profile_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(marshal.loads(response.content), dict)
+        
+        self.assertEqual(self.client.get(reverse('profiles-detail', args=['missing'])).status_code, status.HTTP_404_NOT_FOUND)
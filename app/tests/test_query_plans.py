@@ -0,0 +1,95 @@
+from app.models import (User, Transaction)
+from app.pagination import (TRANSACTION_KEYSET, keyset_queryset, encode_cursor)
+from django.test import TestCase
+from django.db import connection
+from django.utils import timezone
+from unittest import skipUnless
+import re
+
+
+USERS = 2000
+TRANSACTIONS_PER_USER = 25
+TICKERS = [f'TICK{index}' for index in range(500)]
+
+
+# patterns of plan lines meaning the whole table was read or the rows were sorted after reading them
+PLAN_PATTERNS = {
+    'postgresql': {
+        'scan': re.compile(r'Seq Scan on app_transaction'),
+        'sort': re.compile(r'^\s*(->\s*)?(Incremental )?Sort\b', re.MULTILINE),
+    },
+    'sqlite': {
+        'scan': re.compile(r'\bSCAN app_transaction\b'),
+        'sort': re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY'),
+    },
+}
+
+
+@skipUnless(connection.vendor in PLAN_PATTERNS, 'query plan checks are only written for PostgreSQL and SQLite')
+class TransactionQueryPlanTests(TestCase):
+    """Regression tests for the query plans of the TransactionViewSet queries"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        """Generate a transaction table large enough for the planner to prefer indexes when they exist"""
+        users = User.objects.bulk_create([User(username=f'plan_user_{index}', balance=1000) for index in range(USERS)])
+        
+        # interleave the users like real traffic, so the rows of one user are spread over the table
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    user=user,
+                    ticker=TICKERS[(round_number * USERS + index) % len(TICKERS)],
+                    transaction_type='buy',
+                    transaction_volume=1,
+                    transaction_price=10,
+                )
+                for round_number in range(TRANSACTIONS_PER_USER)
+                for index, user in enumerate(users)
+            ),
+            batch_size=5000,
+        )
+        
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        
+        cls.user = users[USERS // 2]
+    
+    
+    def assertIndexedPlan(self, queryset):
+        """Fail when the plan reads the whole table or has to sort the rows"""
+        plan:str = queryset.explain()
+        patterns:dict = PLAN_PATTERNS[connection.vendor]
+        
+        self.assertIsNone(patterns['scan'].search(plan), f'sequential scan in plan:\n{plan}')
+        self.assertIsNone(patterns['sort'].search(plan), f'sort in plan:\n{plan}')
+    
+    
+    def test_user_transactions_plan(self):
+        
+        self.assertIndexedPlan(self.user.transactions.all())
+    
+    
+    def test_user_transactions_within_range_plan(self):
+        
+        now = timezone.now()
+        self.assertIndexedPlan(self.user.transactions.filter(timestamp__range=[now - timezone.timedelta(days=30), now]))
+    
+    
+    def test_user_transactions_first_page_plan(self):
+        
+        self.assertIndexedPlan(keyset_queryset(self.user.transactions.all(), TRANSACTION_KEYSET)[:101])
+    
+    
+    def test_user_transactions_next_page_plan(self):
+        
+        middle:Transaction = self.user.transactions.all()[TRANSACTIONS_PER_USER // 2]
+        cursor:str = encode_cursor([middle.timestamp.isoformat(), str(middle.transaction_id)])
+        
+        self.assertIndexedPlan(keyset_queryset(self.user.transactions.all(), TRANSACTION_KEYSET, cursor=cursor)[:101])
+    
+    
+    def test_ticker_transactions_plan(self):
+        
+        since = timezone.now() - timezone.timedelta(days=1)
+        self.assertIndexedPlan(Transaction.objects.filter(ticker=TICKERS[0], timestamp__gte=since).order_by('-timestamp')[:100])
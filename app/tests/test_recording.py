@@ -0,0 +1,67 @@
+from app.models import StockData
+from django.test import override_settings
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework import status
+from tempfile import TemporaryDirectory
+from pathlib import Path
+import json
+
+
+class RecordingMiddlewareTestCases(APITestCase):
+    """Test Cases For RecordingMiddleware"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'recorded_requests.jsonl'
+    
+    
+    def recording(self, **options):
+        return override_settings(REQUEST_RECORDING={**settings.REQUEST_RECORDING, 'ENABLED': True, 'PATH': self.path, **options})
+    
+    
+    def recorded(self)->list:
+        return [json.loads(line) for line in self.path.read_text().splitlines()]
+    
+    
+    def test_disabled_by_default(self):
+    
+        self.client.get(reverse('stocks-list'))
+        self.assertFalse(self.path.exists())
+    
+    
+    def test_requests_are_recorded_as_json_lines(self):
+    
+        with self.recording():
+            self.client.get(reverse('stocks-detail', args=['AAPL']), HTTP_COOKIE='csrftoken=c2VjcmV0')
+            self.client.post(reverse('users-list'), {'username': 'john', 'balance': '100.00'}, format='json')
+        
+        get, post = self.recorded()
+        
+        self.assertEqual((get['method'], get['path'], get['route'], get['body'], get['status']), ('GET', '/stocks/AAPL/', 'stocks-detail', '', 200))
+        self.assertEqual((post['route'], post['content_type'], post['status']), ('users-list', 'application/json', 201))
+        self.assertEqual(json.loads(post['body']), {'username': 'john', 'balance': '100.00'})
+        self.assertNotIn('c2VjcmV0', self.path.read_text())
+    
+    
+    def test_large_bodies_are_not_recorded(self):
+    
+        with self.recording(MAX_BODY_BYTES=10):
+            response = self.client.post(reverse('users-list'), {'username': 'john', 'balance': '100.00'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(self.recorded()[0]['body'])
+    
+    
+    def test_sample_rate(self):
+    
+        with self.recording(SAMPLE_RATE=0.0):
+            self.client.get(reverse('stocks-list'))
+        
+        self.assertFalse(self.path.exists())
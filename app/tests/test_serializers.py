@@ -1,6 +1,6 @@
 from rest_framework.test import APITestCase
 from app.serializers import (UserSerialzier, StockSerializer, TransactionSerializer)
-from app.models import (User, StockData, Transaction)
+from app.models import (User, StockData, Transaction, Position)
 from decimal import Decimal
 
 
@@ -194,4 +194,16 @@ class TransactionSerializerTestCases(APITestCase):
 
         serializer = TransactionSerializer(data=transaction_data)
         self.assertFalse(serializer.is_valid())
-        self.assertIn('ticker', serializer.errors)
\ No newline at end of file
+        self.assertIn('ticker', serializer.errors)
+    
+    
+    def test_transaction_serializer_sell_more_than_held(self):
+        """Test that a sale is only valid for shares the user holds"""
+        Position.objects.create(user=self.user, ticker='AAPL', quantity=5, cost_basis=500)
+        
+        serializer = TransactionSerializer(data={**self.transaction_data, 'transaction_type': 'sell', 'transaction_volume': 6})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('transaction_volume', serializer.errors)
+        
+        serializer = TransactionSerializer(data={**self.transaction_data, 'transaction_type': 'sell', 'transaction_volume': 5})
+        self.assertTrue(serializer.is_valid())
@@ -0,0 +1,398 @@
+from app.models import (User, StockData, Transaction, OrderBookSnapshot, Position)
+from app.tasks import (process_transaction_async, process_transaction_batch_async, drain_transaction_queue, enqueue_transaction, match_order_async)
+from app import matching
+from app.orderbook import Fill
+from django.test import (TestCase, TransactionTestCase, override_settings)
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from app.utils import (get_from_cache, store_in_cache, user_key, stock_key)
+from app.order_status import (get_order_status, set_order_status)
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest.mock import patch
+import importlib.util
+import json
+import unittest
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class TransactionTaskTestCases(TestCase):
+    """Test Cases For process_transaction_async"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create(username='task_user', balance=100)
+        self.stock = StockData.objects.create(ticker='AAPL', open_price=10, close_price=10, high=10, low=10, volume=5)
+    
+    
+    def order(self, transaction_type, transaction_volume):
+        
+        return {'user': str(self.user.pk), 'ticker': 'AAPL', 'transaction_type': transaction_type, 'transaction_volume': transaction_volume}
+    
+    
+    def test_buy_and_sell(self):
+        
+        self.assertEqual(process_transaction_async(self.order('buy', 5))['status'], 'accepted')
+        self.assertEqual(process_transaction_async(self.order('sell', 2))['status'], 'accepted')
+        
+        self.user.refresh_from_db()
+        self.stock.refresh_from_db()
+        self.assertEqual(self.user.balance, 70)
+        self.assertEqual(self.stock.volume, 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+        position = Position.objects.get(user=self.user, ticker='AAPL')
+        self.assertEqual(position.quantity, 3)
+        self.assertEqual(position.cost_basis, 30)
+    
+    
+    def test_sell_without_shares_is_rejected(self):
+        
+        self.assertEqual(process_transaction_async(self.order('sell', 1))['status'], 'rejected')
+        self.user.refresh_from_db()
+        self.stock.refresh_from_db()
+        self.assertEqual(self.user.balance, 100)
+        self.assertEqual(self.stock.volume, 5)
+        self.assertFalse(Transaction.objects.exists())
+    
+    
+    def test_buy_more_than_stock_volume_is_rejected(self):
+        
+        self.assertEqual(process_transaction_async(self.order('buy', 6))['status'], 'rejected')
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.volume, 5)
+    
+    
+    def test_buy_with_insufficient_balance_is_rolled_back(self):
+        """Test that the stock volume taken before the balance check is given back"""
+        self.user.balance = 10
+        self.user.save()
+        
+        self.assertEqual(process_transaction_async(self.order('buy', 2))['status'], 'rejected')
+        self.stock.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.stock.volume, 5)
+        self.assertEqual(self.user.balance, 10)
+        self.assertFalse(Transaction.objects.exists())
+    
+    
+    def test_cache_is_invalidated_after_commit(self):
+        """Test that the user and stock snapshots are invalidated only once the settlement committed"""
+        store_in_cache(key=user_key('task_user'), value={'balance': '100.00'})
+        store_in_cache(key=stock_key('AAPL'), value={'volume': 5}, family='stock')
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            process_transaction_async(self.order('buy', 5))
+            self.assertEqual(get_from_cache(key=user_key('task_user'))['balance'], '100.00')
+        
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        # an older snapshot of a concurrent settlement can no longer overwrite a newer one, the next read refills them
+        self.assertIsNone(get_from_cache(key=user_key('task_user')))
+        self.assertIsNone(get_from_cache(key=stock_key('AAPL')))
+    
+    
+    def test_snapshot_loaded_before_the_commit_is_not_served(self):
+        """Test that a reader which loaded the user before the settlement committed cannot refill its snapshot"""
+        key:str = user_key('task_user')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction_async(self.order('buy', 5))
+        
+        store_in_cache(key=key, value={'balance': '100.00'})
+        self.assertIsNone(get_from_cache(key=user_key('task_user')))
+    
+    
+    def test_rejected_transaction_does_not_touch_the_cache(self):
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            process_transaction_async(self.order('sell', 1))
+        
+        self.assertEqual(callbacks, [])
+
+
+
+class TransactionBatchTaskTestCases(TestCase):
+    """Test Cases For the batching transaction processor"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create(username='batch_user', balance=1000)
+        self.other_user = User.objects.create(username='other_user', balance=100)
+        self.stock = StockData.objects.create(ticker='AAPL', open_price=10, close_price=10, high=10, low=10, volume=50)
+        self.other_stock = StockData.objects.create(ticker='MSFT', open_price=20, close_price=20, high=20, low=20, volume=50)
+    
+    
+    def order(self, user, ticker, transaction_type, transaction_volume):
+        
+        return {'user': str(user.pk), 'ticker': ticker, 'transaction_type': transaction_type, 'transaction_volume': transaction_volume}
+    
+    
+    def test_batch_settles_orders_in_queue_order(self):
+        """Test that every order gets its own result and the net changes are written once"""
+        orders = [
+            self.order(self.user, 'AAPL', 'buy', 30),
+            self.order(self.other_user, 'MSFT', 'buy', 5),
+            self.order(self.other_user, 'AAPL', 'buy', 30),   # only 20 left
+            self.order(self.other_user, 'MSFT', 'buy', 1),    # balance already spent
+            self.order(self.user, 'AAPL', 'sell', 10),
+        ]
+        
+        results = process_transaction_batch_async(orders)
+        
+        self.assertEqual([result['status'] for result in results], ['accepted', 'accepted', 'rejected', 'rejected', 'accepted'])
+        self.stock.refresh_from_db()
+        self.other_stock.refresh_from_db()
+        self.user.refresh_from_db()
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.stock.volume, 30)
+        self.assertEqual(self.other_stock.volume, 45)
+        self.assertEqual(self.user.balance, 1000 - 300 + 100)
+        self.assertEqual(self.other_user.balance, 0)
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(Position.objects.get(user=self.user, ticker='AAPL').quantity, 20)
+    
+    
+    def test_batch_rejects_sell_without_shares(self):
+        
+        results = process_transaction_batch_async([self.order(self.user, 'AAPL', 'sell', 1)])
+        
+        self.assertEqual(results[0]['status'], 'rejected')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, 1000)
+    
+    
+    def test_batch_rejects_unknown_ticker(self):
+        
+        results = process_transaction_batch_async([self.order(self.user, 'UNKNOWN', 'buy', 1)])
+        
+        self.assertEqual(results[0]['status'], 'rejected')
+        self.assertFalse(Transaction.objects.exists())
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @override_settings(TRANSACTION_BATCH_SIZE=2)
+    @patch('app.tasks.get_redis_connection')
+    def test_drain_transaction_queue(self, mock_get_redis_connection):
+        """Test that the drain task settles queued orders until the queue is empty"""
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        redis.rpush('transaction_queue', *[json.dumps(self.order(self.user, 'AAPL', 'buy', 1)) for _ in range(3)])
+        redis.set('transaction_queue:drain_lock', 'token')
+        
+        self.assertEqual(drain_transaction_queue('token'), 3)
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertFalse(redis.exists('transaction_queue', 'transaction_queue:processing', 'transaction_queue:drain_lock'))
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @patch('app.tasks.get_redis_connection')
+    def test_drain_recovers_the_batch_of_a_dead_drain(self, mock_get_redis_connection):
+        """Test that orders left in the processing list are settled, unless their batch already committed"""
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        set_order_status('settled', 'accepted', 'Transaction settled.')
+        redis.rpush('transaction_queue:processing', *[
+            json.dumps({**self.order(self.user, 'AAPL', 'buy', 1), 'order_id': order_id}) for order_id in ('settled', 'lost')
+        ])
+        
+        self.assertEqual(drain_transaction_queue(), 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertFalse(redis.exists('transaction_queue:processing', 'transaction_queue:drain_lock'))
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @override_settings(TRANSACTION_BATCH_SIZE=3)
+    @patch('app.tasks.settle_transaction_batch', side_effect=RuntimeError)
+    @patch('app.tasks.get_redis_connection')
+    def test_failed_batch_is_settled_order_by_order(self, mock_get_redis_connection, mock_batch):
+        """Test that a batch that raised is settled order by order, the bad order alone is failed"""
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        orders:list = [{**self.order(self.user, 'AAPL', 'buy', 1), 'order_id': f'order-{index}'} for index in range(3)]
+        orders[1]['transaction_volume'] = 'bad'
+        redis.rpush('transaction_queue', *[json.dumps(order) for order in orders])
+        
+        with self.assertLogs('app.tasks', level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(drain_transaction_queue(), 3)
+        
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual([get_order_status(order['order_id'])['status'] for order in orders], ['accepted', 'failed', 'accepted'])
+        self.assertFalse(redis.exists('transaction_queue:processing', 'transaction_queue:drain_lock'))
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @patch('app.tasks.drain_transaction_queue.delay')
+    @patch('app.tasks.settle_claimed_batch', side_effect=RuntimeError)
+    @patch('app.tasks.get_redis_connection')
+    def test_drain_that_raised_schedules_the_next_one(self, mock_get_redis_connection, mock_settle, mock_delay):
+        
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        redis.rpush('transaction_queue', *[json.dumps(self.order(self.user, 'AAPL', 'buy', 1)) for _ in range(5)])
+        
+        with override_settings(TRANSACTION_BATCH_SIZE=2), self.assertRaises(RuntimeError):
+            drain_transaction_queue()
+        
+        self.assertEqual(redis.llen('transaction_queue'), 3)
+        mock_delay.assert_called_once()
+        self.assertEqual(redis.get('transaction_queue:drain_lock').decode(), mock_delay.call_args.args[0])
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @patch('app.tasks.get_redis_connection')
+    def test_drain_stops_once_it_lost_the_lock(self, mock_get_redis_connection):
+        """Test that a drain whose lock expired and was taken over neither settles nor releases its successor's lock"""
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        redis.rpush('transaction_queue', json.dumps(self.order(self.user, 'AAPL', 'buy', 1)))
+        redis.set('transaction_queue:drain_lock', 'successor')
+        
+        self.assertEqual(drain_transaction_queue('expired'), 0)
+        self.assertEqual(redis.llen('transaction_queue'), 1)
+        self.assertEqual(redis.get('transaction_queue:drain_lock'), b'successor')
+    
+    
+    @unittest.skipIf(importlib.util.find_spec('fakeredis') is None, "fakeredis is not installed")
+    @patch('app.tasks.drain_transaction_queue.delay')
+    @patch('app.tasks.get_redis_connection')
+    def test_enqueue_schedules_a_drain_while_the_lock_is_free(self, mock_get_redis_connection, mock_delay):
+        
+        redis = mock_get_redis_connection.return_value = fakeredis.FakeRedis()
+        
+        enqueue_transaction(self.order(self.user, 'AAPL', 'buy', 1))
+        enqueue_transaction(self.order(self.user, 'AAPL', 'buy', 1))
+        mock_delay.assert_called_once()
+        
+        # the lock of a dead drain expired
+        redis.delete('transaction_queue:drain_lock')
+        enqueue_transaction(self.order(self.user, 'AAPL', 'buy', 1))
+        
+        self.assertEqual(mock_delay.call_count, 2)
+        self.assertEqual(redis.llen('transaction_queue'), 3)
+
+
+
+class MatchOrderTaskTestCases(TestCase):
+    """Test Cases For the order book matching task"""
+    
+    def setUp(self):
+        """Set up test data"""
+        matching._books.clear()
+        cache.clear()
+        self.buyer = User.objects.create(username='buyer', balance=1000)
+        self.seller = User.objects.create(username='seller', balance=0)
+        Position.objects.create(user=self.seller, ticker='AAPL', quantity=100, cost_basis=1000)
+    
+    
+    def tearDown(self):
+        
+        matching._books.clear()
+    
+    
+    def order(self, order_id, user, side, quantity, price=None):
+        
+        return {'order_id': order_id, 'user': str(user.pk), 'ticker': 'AAPL', 'side': side, 'quantity': quantity, 'price': price}
+    
+    
+    def test_fills_are_settled_and_recorded(self):
+        
+        self.assertEqual(match_order_async(self.order('s1', self.seller, 'sell', 10, '20.00'))['status'], 'resting')
+        result = match_order_async(self.order('b1', self.buyer, 'buy', 4))
+        
+        self.assertEqual(result['status'], 'filled')
+        self.assertEqual(result['fills'], [{'price': '20.00', 'quantity': 4}])
+        self.buyer.refresh_from_db()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.buyer.balance, 920)
+        self.assertEqual(self.seller.balance, 80)
+        self.assertEqual(Transaction.objects.filter(user=self.buyer, transaction_type='buy').count(), 1)
+        self.assertEqual(Transaction.objects.filter(user=self.seller, transaction_type='sell').count(), 1)
+        self.assertEqual(Position.objects.get(user=self.buyer, ticker='AAPL').quantity, 4)
+        self.assertEqual(Position.objects.get(user=self.seller, ticker='AAPL').quantity, 96)
+    
+    
+    def test_seller_without_shares_is_not_filled(self):
+        
+        match_order_async(self.order('b1', self.buyer, 'buy', 5, '20.00'))
+        result = match_order_async({**self.order('s1', self.buyer, 'sell', 5, '20.00')})
+        
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertFalse(Transaction.objects.exists())
+    
+    
+    def test_buyer_without_balance_is_not_filled(self):
+        
+        match_order_async(self.order('s1', self.seller, 'sell', 100, '20.00'))
+        result = match_order_async(self.order('b1', self.buyer, 'buy', 60))
+        
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertFalse(Transaction.objects.exists())
+    
+    
+    def test_book_is_recovered_from_snapshot(self):
+        """Test that a restarted worker rebuilds the book from the persisted snapshot"""
+        match_order_async(self.order('s1', self.seller, 'sell', 10, '20.00'))
+        self.assertEqual(OrderBookSnapshot.objects.get(ticker='AAPL').sequence, 1)
+        
+        matching._books.clear()
+        result = match_order_async(self.order('b1', self.buyer, 'buy', 10, '20.00'))
+        
+        self.assertEqual(result['status'], 'filled')
+    
+    
+    def test_fill_locks_users_in_pk_order(self):
+        """Test that a fill locks the buyer and the seller in pk order, like the batch processor, before moving the cash"""
+        fill = Fill('b1', 's1', str(self.buyer.pk), str(self.seller.pk), Decimal('20.00'), 1)
+        
+        with CaptureQueriesContext(connection) as queries:
+            matching.settle_fill('AAPL', fill)
+        
+        statements:list = [query['sql'] for query in queries.captured_queries if 'app_user' in query['sql']]
+        self.assertIn('ORDER BY "app_user"."user_id" ASC', statements[0])
+        self.assertTrue(statements[1].startswith('UPDATE "app_user"'))
+
+
+
+class ConcurrentSettlementTests(TransactionTestCase):
+    """Stress test settling orders from many threads at once"""
+    
+    WORKERS = 8
+    ORDERS = 400
+    
+    def setUp(self):
+        """Two users who can afford 100 shares each competing for 150 shares"""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('an in-memory SQLite database cannot be shared by threads')
+        
+        self.users = [User.objects.create(username=f'stress_user_{index}', balance=1000) for index in range(2)]
+        self.stock = StockData.objects.create(ticker='AAPL', open_price=10, close_price=10, high=10, low=10, volume=150)
+    
+    
+    def settle(self, index):
+        
+        try:
+            order = {'user': str(self.users[index % 2].pk), 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 1}
+            
+            if index % 4 == 3:
+                process_transaction_batch_async([order])
+                return 1
+            
+            return int(process_transaction_async(order)['status'] == 'accepted')
+        finally:
+            connection.close()
+    
+    
+    def test_no_balance_or_volume_drift(self):
+        
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            list(executor.map(self.settle, range(self.ORDERS)))
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.volume, 0)
+        self.assertEqual(Transaction.objects.count(), 150)
+        
+        for user in self.users:
+            user.refresh_from_db()
+            bought = Transaction.objects.filter(user=user).count()
+            self.assertGreaterEqual(user.balance, 0)
+            self.assertEqual(user.balance, 1000 - 10 * bought)
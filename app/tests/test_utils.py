@@ -0,0 +1,170 @@
+from app.utils import (get_or_compute, should_refresh, store_in_cache, get_from_cache, generation_key, bump_generation, invalidate_on_commit, user_key)
+from django.test import (SimpleTestCase, TestCase, override_settings)
+from django.core.cache import cache
+from unittest.mock import patch
+from threading import (Thread, Barrier)
+import time
+
+
+class SingleFlightTestCases(SimpleTestCase):
+    """Test Cases For the stampede protected get_or_compute"""
+    
+    def setUp(self):
+        """Start every test with an empty cache"""
+        cache.clear()
+        self.calls = 0
+    
+    
+    def compute(self):
+        self.calls += 1
+        return {'calls': self.calls}
+    
+    
+    def test_miss_computes_once(self):
+        
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 1})
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 1})
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get('hot_key__lock'))
+    
+    
+    def test_stale_value_is_served_while_locked(self):
+        
+        get_or_compute('hot_key', self.compute, timeout=60)
+        cache.set('hot_key__meta', (time.time() - 1, 0.1))
+        cache.add('hot_key__lock', 'other worker')
+        
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 1})
+        self.assertEqual(self.calls, 1)
+    
+    
+    def test_expired_value_is_refreshed_by_lock_holder(self):
+        
+        get_or_compute('hot_key', self.compute, timeout=60)
+        cache.set('hot_key__meta', (time.time() - 1, 0.1))
+        
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 2})
+    
+    
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_waiter_computes_when_lock_holder_is_gone(self):
+        
+        cache.add('hot_key__lock', 'crashed worker')
+        
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 1})
+        self.assertEqual(cache.get('hot_key__lock'), 'crashed worker')
+    
+    
+    def test_values_stored_without_meta_are_not_refreshed(self):
+        
+        store_in_cache(key='hot_key', value={'calls': 0})
+        self.assertEqual(get_or_compute('hot_key', self.compute, timeout=60), {'calls': 0})
+    
+    
+    def test_should_refresh_probability_grows_near_expiry(self):
+        
+        with patch('app.utils.random.random', return_value=0.5):
+            # -log(0.5) * 2s of compute time is about 1.4s of head start
+            self.assertTrue(should_refresh((time.time() + 1, 2.0)))
+            self.assertFalse(should_refresh((time.time() + 60, 2.0)))
+        
+        self.assertFalse(should_refresh(None))
+    
+    
+    def test_concurrent_misses_compute_once(self):
+        
+        barrier = Barrier(8)
+        results:list = []
+        
+        def slow_compute():
+            time.sleep(0.2)
+            return self.compute()
+        
+        def request():
+            barrier.wait()
+            results.append(get_or_compute('hot_key', slow_compute, timeout=60))
+        
+        threads = [Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'calls': 1}] * 8)
+
+
+
+class GenerationTestCases(SimpleTestCase):
+    """Test Cases For generation based invalidation of derived keys"""
+    
+    def setUp(self):
+        """Start every test with an empty cache"""
+        cache.clear()
+    
+    
+    def test_bump_invalidates_every_derived_key(self):
+        
+        keys:list = [generation_key(f"sohail_{day}_transactions", 'user:1') for day in range(3)]
+        for key in keys:
+            store_in_cache(key=key, value=[key])
+        
+        self.assertEqual(generation_key("sohail_0_transactions", 'user:1'), keys[0])
+        bump_generation('user:1')
+        
+        self.assertNotEqual(generation_key("sohail_0_transactions", 'user:1'), keys[0])
+        self.assertIsNone(get_from_cache(key=generation_key("sohail_0_transactions", 'user:1')))
+    
+    
+    def test_bump_only_affects_its_tag(self):
+        
+        key:str = generation_key('listing', 'user:1', 'stocks')
+        other:str = generation_key('other', 'user:2')
+        bump_generation('stocks')
+        
+        self.assertNotEqual(generation_key('listing', 'user:1', 'stocks'), key)
+        self.assertEqual(generation_key('other', 'user:2'), other)
+    
+    
+    def test_evicted_generation_does_not_go_back(self):
+        
+        key:str = generation_key('listing', 'stocks')
+        bump_generation('stocks')
+        cache.delete('gen:stocks')
+        
+        self.assertNotEqual(generation_key('listing', 'stocks'), key)
+
+
+
+class InvalidateOnCommitTestCases(TestCase):
+    """Test Cases For invalidate_on_commit"""
+    
+    def setUp(self):
+        
+        cache.clear()
+    
+    
+    def test_invalidate_on_commit(self):
+        
+        listing:str = generation_key('listing', 'user:1')
+        other:str = generation_key('other', 'user:2')
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_on_commit('user:1', 'stocks')
+            self.assertEqual(generation_key('listing', 'user:1'), listing)
+        
+        callbacks[0]()
+        self.assertNotEqual(generation_key('listing', 'user:1'), listing)
+        self.assertEqual(generation_key('other', 'user:2'), other)
+    
+    
+    def test_snapshot_refilled_with_an_old_generation_is_not_read(self):
+        """Test that a reader which resolved the key before an invalidation cannot refill the current snapshot"""
+        key:str = user_key('sohail')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_on_commit('username:sohail')
+        
+        store_in_cache(key=key, value={'balance': '1.00'})
+        
+        self.assertIsNone(get_from_cache(key=user_key('sohail')))
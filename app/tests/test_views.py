@@ -1,12 +1,20 @@
-from app.models import (User, StockData, Transaction)
+from app.models import (User, StockData, StockBar, StockCandle, Transaction, Position)
+from app.serializers import StockSerializer
 from django.db import IntegrityError
 from uuid import UUID
 from django.utils import timezone
 from rest_framework.test import APITestCase
 from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
 from rest_framework import status
 from unittest.mock import patch
 from django.core.cache import cache
+from app.utils import (generation_key, bump_generation, get_from_cache, stock_key)
+from app.tasks import (process_transaction_async, match_order_async)
+from app import matching
+from app.pagination import encode_cursor
+import json
 
 
 class UserViewSetTests(APITestCase):
@@ -56,6 +64,26 @@ class UserViewSetTests(APITestCase):
         
         response = self.client.get(path=reverse('users-detail', kwargs={'username':'invalid user'}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    def test_portfolio(self):
+        """Test that the portfolio lists the open positions of a user"""
+        user = User.objects.create(**self.user_data)
+        Position.objects.create(user=user, ticker='MSFT', quantity=3, cost_basis=30)
+        Position.objects.create(user=user, ticker='AAPL', quantity=5, cost_basis=750)
+        Position.objects.create(user=user, ticker='GOOGL', quantity=0, cost_basis=0)
+        
+        response = self.client.get(reverse('users-portfolio', kwargs={'username': user.username}))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([position['ticker'] for position in response.data], ['AAPL', 'MSFT'])
+        self.assertEqual(response.data[0]['cost_basis'], '750.00')
+    
+    
+    def test_portfolio_user_not_found(self):
+        
+        response = self.client.get(reverse('users-portfolio', kwargs={'username': 'invalid user'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 
@@ -115,6 +143,273 @@ class StockViewSetTests(APITestCase):
         
         response = self.client.get(path=self.create_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    
+    def test_stock_list_served_from_cached_bytes(self):
+        """Test that a cache hit sends the stored bytes without rendering them again"""
+        bump_generation('stocks')
+        StockData.objects.create(**self.stock_data)
+        
+        first = self.client.get(path=self.create_url)
+        second = self.client.get(path=self.create_url)
+        
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        self.assertEqual(second.content, cache.get(generation_key('stock_data', 'stocks')))
+    
+    
+    def test_stock_list_keyset_pagination(self):
+        """Test that the stock listing can be paginated with a cursor"""
+        for ticker in ('AAPL', 'MSFT', 'GOOGL'):
+            StockData.objects.create(**{**self.stock_data, 'ticker': ticker})
+        
+        first = self.client.get(self.create_url, {'page_size': 2})
+        second = self.client.get(self.create_url, {'page_size': 2, 'cursor': first.data['next']})
+        
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertEqual(len(second.data['results']), 1)
+        self.assertIsNone(second.data['next'])
+        tickers = [stock['ticker'] for stock in first.data['results'] + second.data['results']]
+        self.assertEqual(sorted(tickers), ['AAPL', 'GOOGL', 'MSFT'])
+    
+    
+    def test_bulk_upsert_stocks(self):
+        """Test that bulk ingestion creates new tickers and updates existing ones"""
+        StockData.objects.create(**self.stock_data)
+        rows = [
+            {**self.stock_data, 'close_price': 151, 'volume': 10},
+            {**self.stock_data, 'ticker': 'MSFT'},
+        ]
+        
+        response = self.client.post(reverse('stocks-bulk'), rows, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['upserted'], 2)
+        self.assertEqual(response.data['rejected'], 0)
+        self.assertEqual(StockData.objects.count(), 2)
+        self.assertEqual(StockData.objects.get(ticker='AAPL').volume, 10)
+    
+    
+    def test_bulk_upsert_only_invalidates_its_tickers(self):
+        """Test that upserting a ticker keeps the cached responses of the other tickers and drops the listing"""
+        StockData.objects.create(**self.stock_data)
+        StockData.objects.create(**{**self.stock_data, 'ticker': 'MSFT'})
+        self.client.get(self.retrieve_url)
+        self.client.get(reverse('stocks-detail', args=['MSFT']))
+        keys:tuple = (stock_key('AAPL'), stock_key('MSFT'), generation_key('stock_data', 'stocks'))
+        
+        self.client.post(reverse('stocks-bulk'), [{**self.stock_data, 'close_price': 151}], format='json')
+        
+        self.assertNotEqual(stock_key('AAPL'), keys[0])
+        self.assertEqual(stock_key('MSFT'), keys[1])
+        self.assertEqual(get_from_cache(key=keys[1], family='stock')['ticker'], 'MSFT')
+        self.assertNotEqual(generation_key('stock_data', 'stocks'), keys[2])
+    
+    
+    def test_bulk_upsert_reports_invalid_rows(self):
+        """Test that invalid rows are reported by index without failing the batch"""
+        rows = [
+            self.stock_data,
+            {**self.stock_data, 'ticker': 'MSFT', 'low': 200},
+            {**self.stock_data, 'ticker': 'GOOGL', 'volume': 'invalid'},
+        ]
+        
+        response = self.client.post(reverse('stocks-bulk'), rows, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['upserted'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('low', response.data['errors'][0]['errors'])
+        self.assertIn('volume', response.data['errors'][1]['errors'])
+        self.assertTrue(StockData.objects.filter(ticker='AAPL').exists())
+    
+    
+    def test_bulk_upsert_reports_the_first_violated_invariant(self):
+        """Test that the vectorized checks report the same error as StockSerializer for each row"""
+        rows = [
+            {**self.stock_data, 'open_price': 160, 'close_price': 140},
+            {**self.stock_data, 'ticker': 'MSFT', 'close_price': 140},
+            {**self.stock_data, 'ticker': 'GOOGL', 'low': 157},
+        ]
+        
+        response = self.client.post(reverse('stocks-bulk'), rows, format='json')
+        
+        self.assertEqual(response.data['upserted'], 0)
+        for row, error in zip(rows, response.data['errors']):
+            serializer = StockSerializer(data=row)
+            self.assertFalse(serializer.is_valid())
+            self.assertEqual(error['errors'], serializer.errors)
+    
+    
+    def test_bulk_upsert_requires_list(self):
+        
+        response = self.client.post(reverse('stocks-bulk'), self.stock_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
+    @override_settings(STOCK_BULK_MAX_ROWS=2)
+    def test_bulk_upsert_rejects_too_many_rows(self):
+        """Test that a payload over STOCK_BULK_MAX_ROWS is refused and pointed to the streaming endpoint"""
+        rows = [{**self.stock_data, 'ticker': ticker} for ticker in ('AAPL', 'MSFT', 'GOOGL')]
+        
+        response = self.client.post(reverse('stocks-bulk'), rows, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn(reverse('stocks-ingest'), response.data['message'])
+        self.assertFalse(StockData.objects.exists())
+
+    
+    def test_stream_ingest_ndjson(self):
+        """Test streaming NDJSON ingestion reports accepted and rejected rows per chunk"""
+        lines = [
+            json.dumps(self.stock_data),
+            json.dumps({**self.stock_data, 'ticker': 'MSFT'}),
+            'not json',
+            json.dumps({**self.stock_data, 'ticker': 'GOOGL', 'high': 1}),
+        ]
+        
+        response = self.client.post(
+            reverse('stocks-ingest') + '?batch_size=2',
+            data='\n'.join(lines),
+            content_type='application/x-ndjson',
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual([chunk['accepted'] for chunk in response.data['chunks']], [2, 0])
+        self.assertEqual([error['index'] for error in response.data['chunks'][1]['errors']], [2, 3])
+        self.assertEqual(StockData.objects.count(), 2)
+    
+    
+    def test_stream_ingest_csv(self):
+        """Test streaming CSV ingestion"""
+        header = ','.join(self.stock_data)
+        rows = [','.join(str(value) for value in {**self.stock_data, 'ticker': ticker}.values()) for ticker in ('AAPL', 'MSFT')]
+        
+        response = self.client.post(reverse('stocks-ingest'), data='\n'.join([header, *rows]), content_type='text/csv')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(StockBar.objects.count(), 2)
+    
+    
+    def test_stream_ingest_csv_that_is_not_utf8(self):
+        """Test that an undecodable CSV body is reported as a rejected row instead of failing the request"""
+        header = ','.join(self.stock_data)
+        row = ','.join(str(value) for value in self.stock_data.values())
+        
+        response = self.client.post(reverse('stocks-ingest'), data=b'\xff\xfe' + header.encode() + b'\n' + row.encode(), content_type='text/csv')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['accepted'], response.data['rejected']), (0, 1))
+        self.assertIn('Invalid CSV', str(response.data['chunks'][0]['errors'][0]['errors']))
+    
+    
+    @override_settings(STOCK_INGEST_MAX_ERRORS=3)
+    def test_stream_ingest_caps_the_reported_errors(self):
+        
+        response = self.client.post(reverse('stocks-ingest') + '?batch_size=2', data='\n'.join(['not json'] * 5), content_type='application/x-ndjson')
+        
+        self.assertEqual(response.data['rejected'], 5)
+        self.assertEqual(response.data['errors_omitted'], 2)
+        self.assertEqual([len(chunk['errors']) for chunk in response.data['chunks']], [2, 1, 0])
+    
+    
+    def test_stream_ingest_with_invalid_batch_size(self):
+        
+        response = self.client.post(reverse('stocks-ingest') + '?batch_size=0', data='', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
+    def test_ingestion_appends_history(self):
+        """Test that every ingested snapshot is kept as a historical bar"""
+        self.client.post(self.create_url, self.stock_data)
+        self.client.post(reverse('stocks-bulk'), [{**self.stock_data, 'close_price': 150}], format='json')
+        
+        self.assertEqual(StockBar.objects.filter(ticker='AAPL').count(), 2)
+        self.assertEqual(StockData.objects.filter(ticker='AAPL').count(), 1)
+    
+    
+    def test_stock_history_within_range(self):
+        """Test retrieving the bars of a ticker within a timestamp range"""
+        StockData.objects.create(**self.stock_data)
+        now = timezone.now()
+        for days in (1, 10, 40):
+            StockBar.objects.create(**self.stock_data, timestamp=now - timezone.timedelta(days=days))
+        
+        response = self.client.get(reverse('stocks-history', args=['AAPL']), {
+            'from': (now - timezone.timedelta(days=30)).isoformat(),
+            'to': now.isoformat(),
+        })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertLess(response.data[0]['timestamp'], response.data[1]['timestamp'])
+    
+    
+    def test_stock_history_with_invalid_range(self):
+        
+        response = self.client.get(reverse('stocks-history', args=['AAPL']), {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # well formatted but impossible dates
+        response = self.client.get(reverse('stocks-history', args=['AAPL']), {'from': '2024-13-01T00:00:00'})
+        self.assertEqual(response.data, {'from': 'Enter a valid date/time.'})
+        
+        response = self.client.get(reverse('stocks-candles', args=['AAPL']), {'to': '2024-02-30T00:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
+    @override_settings(STOCK_HISTORY_MAX_BARS=2)
+    def test_stock_history_is_capped(self):
+        """Test that a long history is returned in capped slices linked with a next header"""
+        StockData.objects.create(**self.stock_data)
+        now = timezone.now().replace(tzinfo=None)
+        for days in (5, 4, 3):
+            StockBar.objects.create(**self.stock_data, timestamp=now - timezone.timedelta(days=days))
+        
+        response = self.client.get(reverse('stocks-history', args=['AAPL']))
+        self.assertEqual(len(response.data), 2)
+        
+        next_url = response['Link'][1:response['Link'].index('>')]
+        response = self.client.get(next_url)
+        self.assertEqual(len(response.data), 1)
+        self.assertGreater(response.data[0]['timestamp'], self.client.get(reverse('stocks-history', args=['AAPL'])).data[1]['timestamp'])
+        self.assertNotIn('Link', response)
+    
+    
+    def test_stock_history_not_found(self):
+        
+        response = self.client.get(reverse('stocks-history', args=['UNKNOWN']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    
+    def test_stock_candles(self):
+        """Test that ingested snapshots are served as rolled up candles"""
+        self.client.post(reverse('stocks-bulk'), [self.stock_data], format='json')
+        self.client.post(reverse('stocks-bulk'), [{**self.stock_data, 'close_price': 150}], format='json')
+        
+        response = self.client.get(reverse('stocks-candles', args=['AAPL']), {'interval': '1d'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({candle['interval'] for candle in response.data}, {'1d'})
+        self.assertEqual(sum(candle['volume'] for candle in response.data), 2 * self.stock_data['volume'])
+        self.assertTrue(StockCandle.objects.filter(ticker='AAPL', interval='1m').exists())
+    
+    
+    def test_stock_candles_with_invalid_interval(self):
+        
+        response = self.client.get(reverse('stocks-candles', args=['AAPL']), {'interval': '90s'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('interval', response.data)
+    
+    
+    def test_stock_candles_not_found(self):
+        
+        response = self.client.get(reverse('stocks-candles', args=['UNKNOWN']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 
@@ -202,6 +497,72 @@ class TransactionViewSetTestCases(APITestCase):
         self.assertEqual(response.data[0]['ticker'], 'AAPL')
         
     
+    def test_user_transactions_keyset_pagination(self):
+        """Test walking the transactions of a user page by page with the continuation cursor"""
+        created = {
+            Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='buy', transaction_volume=volume, transaction_price=155).pk
+            for volume in range(1, 6)
+        }
+        seen, cursor, pages = [], None, 0
+        
+        while True:
+            params = {'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.user_transactions_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            
+            seen += [transaction['transaction_id'] for transaction in response.data['results']]
+            cursor, pages = response.data['next'], pages + 1
+            if not cursor:
+                break
+        
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), {str(pk) for pk in created})
+    
+    
+    def test_user_transactions_with_invalid_cursor(self):
+        
+        response = self.client.get(self.user_transactions_url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.get(self.user_transactions_url, {'page_size': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # well formed cursors carrying values the keyset fields cannot take
+        for values in (["notadate", "X"], [{"a": 1}, "X"], ["2024-13-01T00:00:00", "X"]):
+            response = self.client.get(self.user_transactions_url, {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
+    def test_export_user_transactions(self):
+        """Test streaming the transactions of a user as NDJSON and CSV"""
+        for volume in (1, 2):
+            Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='buy', transaction_volume=volume, transaction_price=155)
+        url = reverse('user-transactions-export', args=[self.user.user_id])
+        
+        response = self.client.get(url)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['user'], str(self.user.user_id))
+        self.assertEqual(rows[0]['transaction_price'], '155.00')
+        
+        response = self.client.get(url, {'output': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0].split(',')[0], 'transaction_id')
+        self.assertEqual(len(lines), 3)
+    
+    
+    def test_export_user_transactions_with_invalid_output(self):
+        
+        response = self.client.get(reverse('user-transactions-export', args=[self.user.user_id]), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
     def test_get_user_transactions_within_range(self):
         """Test retrieving transactions of user within a specific date range"""
         Transaction.objects.create(
@@ -218,3 +579,117 @@ class TransactionViewSetTestCases(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
     
+    def test_transactions_within_range_cache_invalidated_by_new_transaction(self):
+        """Test that settling a transaction invalidates every cached range of the user"""
+        url:str = reverse('user-transactions_in_date_range', args=[
+            self.user.user_id,
+            timezone.now() - timezone.timedelta(days=30),
+            timezone.now() + timezone.timedelta(days=1),
+        ])
+        Transaction.objects.create(user=self.user, ticker='AAPL', transaction_type='buy', transaction_volume=5, transaction_price=155)
+        self.assertEqual(len(self.client.get(url).data), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            process_transaction_async({'user': self.user.user_id, 'ticker': 'AAPL', 'transaction_type': 'buy', 'transaction_volume': 1})
+        
+        self.assertEqual(len(self.client.get(url).data), 2)
+        
+    
+
+
+
+class OrderViewSetTestCases(APITestCase):
+    """Test Cases For OrderViewSet"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create(username='order_user', balance=1000)
+        StockData.objects.create(ticker='AAPL', open_price=150, close_price=155, high=156, low=149, volume=1000)
+        self.order_data = {'user': self.user.pk, 'ticker': 'AAPL', 'side': 'buy', 'order_type': 'limit', 'quantity': 5, 'price': '150.00'}
+        self.create_url = reverse('orders-list')
+    
+    
+    @patch('app.views.match_order_async.delay')
+    def test_create_order(self, mock_delay):
+        
+        response = self.client.post(self.create_url, self.order_data)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('order_id', response.data)
+        dispatched = mock_delay.call_args.args[0]
+        self.assertEqual(dispatched['order_id'], response.data['order_id'])
+        self.assertEqual(dispatched['price'], '150.00')
+    
+    
+    def test_limit_order_requires_price(self):
+        
+        response = self.client.post(self.create_url, {**self.order_data, 'price': ''})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price', response.data)
+    
+    
+    def test_limit_buy_with_insufficient_balance(self):
+        
+        response = self.client.post(self.create_url, {**self.order_data, 'quantity': 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    
+    def test_order_status(self):
+        """Test that the order_id returned by POST /orders/ is followed through the same viewset, for the order and the resting order it filled"""
+        matching._books.clear()
+        cache.clear()
+        seller = User.objects.create(username='order_seller', balance=0)
+        Position.objects.create(user=seller, ticker='AAPL', quantity=10, cost_basis=1000)
+        
+        with patch('app.views.match_order_async.delay') as mock_delay:
+            resting_id = self.client.post(self.create_url, {**self.order_data, 'user': seller.pk, 'side': 'sell', 'quantity': 10}).data['order_id']
+            self.assertEqual(self.client.get(reverse('orders-detail', args=[resting_id])).data['status'], 'pending')
+        
+        match_order_async(mock_delay.call_args.args[0])
+        self.assertEqual(self.client.get(reverse('orders-detail', args=[resting_id])).data['status'], 'resting')
+        
+        order_id = self.client.post(self.create_url, self.order_data).data['order_id']
+        response = self.client.get(reverse('orders-detail', args=[order_id]), {'wait': 1})
+        
+        self.assertEqual((response.data['status'], response.data['message']), ('filled', 'Filled 5 of 5.'))
+        self.assertEqual(self.client.get(reverse('orders-detail', args=[resting_id])).data['status'], 'partially_filled')
+        self.assertEqual(self.client.get(reverse('orders-events', args=[order_id])).status_code, status.HTTP_200_OK)
+        matching._books.clear()
+
+
+
+class AnalyticsViewSetTestCases(APITestCase):
+    """Test Cases For AnalyticsViewSet"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache.delete('portfolio_valuations')
+        user = User.objects.create(username='analytics_user', balance=0)
+        StockData.objects.create(ticker='AAPL', open_price=10, close_price=20, high=20, low=10, volume=100)
+        Position.objects.create(user=user, ticker='AAPL', quantity=10, cost_basis=100)
+        self.client.force_authenticate(get_user_model().objects.create_user(username='admin', password='admin', is_staff=True))
+    
+    
+    def test_valuations_are_staff_only(self):
+        
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(reverse('analytics-valuations')).status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        
+        self.client.force_authenticate(get_user_model().objects.create_user(username='member', password='member'))
+        self.assertEqual(self.client.get(reverse('analytics-valuations')).status_code, status.HTTP_403_FORBIDDEN)
+    
+    
+    def test_valuations(self):
+        
+        response = self.client.get(reverse('analytics-valuations'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['users']['analytics_user']['unrealized_pnl'], 100.0)
+        self.assertIsNotNone(cache.get('portfolio_valuations'))
+    
+    
+    def test_valuations_of_some_users(self):
+        
+        response = self.client.get(reverse('analytics-valuations'), {'users': 'someone_else'})
+        self.assertEqual(response.data['users'], {})
@@ -1,21 +1,41 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, SotckViewSet, TransactionViewSet
+from .views import UserViewSet, SotckViewSet, TransactionViewSet, OrderViewSet, AnalyticsViewSet, ProfileViewSet, metrics
+from . import async_views
 
 
 router = DefaultRouter()
 router.register("users", viewset=UserViewSet, basename="users")
 router.register("stocks", viewset=SotckViewSet, basename="stocks")
+router.register("orders", viewset=OrderViewSet, basename="orders")
+router.register("analytics", viewset=AnalyticsViewSet, basename="analytics")
+router.register("profiles", viewset=ProfileViewSet, basename="profiles")
 
 
 transaction_urls  = [
     path('transactions/', TransactionViewSet.as_view({'post':'create'}), name='create-transaction'),
     path('transactions/<str:user_id>/', TransactionViewSet.as_view({'get': 'user_transactions'}), name="user-transactions"),
+    path('transactions/<str:user_id>/export/', TransactionViewSet.as_view({'get': 'export_transactions'}), name="user-transactions-export"),
     path('transactions/<str:user_id>/<str:start_timestamp>/<str:end_timestamp>/', TransactionViewSet.as_view({'get': 'get_user_transactions_within_range'}), name="user-transactions_in_date_range")
 ]
 
 
+# async variants of the main endpoints, for the ASGI deployment
+async_urls = [
+    path('users/', async_views.create_user, name='async-users'),
+    path('users/<str:username>/', async_views.retrieve_user, name='async-user-detail'),
+    path('stocks/', async_views.list_stocks, name='async-stocks'),
+    path('stocks/<str:ticker>/', async_views.retrieve_stock, name='async-stock-detail'),
+    path('transactions/', async_views.create_transaction, name='async-create-transaction'),
+    path('transactions/<str:user_id>/', async_views.user_transactions, name='async-user-transactions'),
+    path('orders/<str:order_id>/', async_views.order_status, name='async-order-status'),
+    path('orders/<str:order_id>/events/', async_views.order_events, name='async-order-events'),
+]
+
+
 urlpatterns = [
     path("", include(router.urls)),
-    path("", include(transaction_urls))
+    path("", include(transaction_urls)),
+    path("metrics", metrics, name="metrics"),
+    path("async/", include(async_urls)),
 ]   
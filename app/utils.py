@@ -1,24 +1,370 @@
 from django.core.cache import cache
-import json
 from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.response import Response
+from rest_framework import status
+from .cache_codecs import get_codec
+from .cache_tiers import (get_l1, invalidate)
+from .metrics import (CACHE_HITS, CACHE_MISSES, CACHE_BYTES)
+from .profiling import traced
+from functools import partial
+from math import log
+from uuid import uuid4
+import random
+import time
 
 
-def store_in_cache(key:str, value:object, version:int=1, timeout:int=settings.DEFAULT_TIME_OUT):        
+@traced('set')
+def store_in_cache(key:str, value:object, version:int=1, timeout:int=settings.DEFAULT_TIME_OUT, family:str='other'):        
         
-        cache.set(key=key, value=json.dumps(value), version=version, timeout=timeout)
+        cache_data:bytes = get_codec().encode(value)
+        cache.set(key=key, value=cache_data, version=version, timeout=timeout)
+        CACHE_BYTES.labels(family=family, operation='write').inc(len(cache_data))
+        invalidate([key], version=version)
         
 
 
-def get_from_cache(key:str, version:int=1):
+def get_from_cache(key:str, version:int=1, family:str='other'):
+    
+    cache_data = get_from_tiers(key=key, version=version, family=family)
+    
+    if cache_data:
+        return get_codec().decode(cache_data)
+    
+    return None
+
+
+
+def user_tag(username:str)->str:
+    """
+    Generation tag of the snapshot of a user, bumped by every settlement of the user once it committed.
+    """
+    return f"username:{username}"
+
+
+
+def user_key(username:str)->str:
+    """
+    Cache key of the snapshot of a user, namespaced so a username can never collide with a ticker.
+    
+    The key carries the generation of user_tag: a reader that loaded the row before a settlement committed
+    fills a name nobody reads once the settlement bumps the tag, rather than serving the stale snapshot until it expires.
+    """
+    return generation_key(f"user:{username}", user_tag(username))
+
+
+
+def stock_tag(ticker:str)->str:
+    
+    return f"stock:{ticker}"
+
+
+
+def stock_key(ticker:str)->str:
+    
+    return generation_key(f"stock:{ticker}", stock_tag(ticker))
+
+
+
+@traced('get')
+def get_from_tiers(key:str, version:int=1, family:str='other'):
+    """
+    Encoded value of `key` from the in-process L1 when it is enabled, else from Redis, filling the L1.
+    
+    Hits, misses and bytes read are counted by tier and by `family` (user, stock, stock_data, transactions...).
+    """
+    cache_data = get_from_l1(key=key, version=version, family=family)
+    
+    if cache_data is not None:
+        return cache_data
+    
     
     cache_data = cache.get(key=key, version=version)
+    count_read('l2', family, cache_data)
+    fill_l1(key=key, version=version, cache_data=cache_data)
+    
+    
+    return cache_data
+
+
+
+def get_from_l1(key:str, version:int=1, family:str='other'):
+    """
+    Encoded value of `key` from the L1, None when it is disabled or misses.
+    """
+    l1 = get_l1()
+    
+    if l1 is None:
+        return None
+    
+    
+    cache_data = l1.get(cache.make_key(key, version=version))
+    
+    if cache_data is not None:
+        CACHE_HITS.labels(tier='l1', family=family).inc()
+    else:
+        CACHE_MISSES.labels(tier='l1', family=family).inc()
+    
+    
+    return cache_data
+
+
+
+def fill_l1(key:str, cache_data:bytes, version:int=1):
+    
+    l1 = get_l1()
+    
+    if cache_data and l1 is not None:
+        l1.set(cache.make_key(key, version=version), cache_data)
+
+
+
+def count_read(tier:str, family:str, cache_data:bytes):
     
     if cache_data:
-        return json.loads(cache_data)
+        CACHE_HITS.labels(tier=tier, family=family).inc()
+        CACHE_BYTES.labels(family=family, operation='read').inc(len(cache_data))
+    else:
+        CACHE_MISSES.labels(tier=tier, family=family).inc()
+
+
+
+def get_cached_response(request, key:str, version:int=1, family:str='other'):
+    """
+    Serve a cached value, the stored bytes are sent as the body when the client accepts the codec's content type
+    so a hit is neither decoded nor rendered again. Returns None on a miss.
+    """
+    cache_data = get_from_tiers(key=key, version=version, family=family)
+    
+    if not cache_data:
+        return None
+    
+    
+    return bytes_response(request, cache_data)
+
+
+
+def bytes_response(request, cache_data:bytes):
+    """
+    Response for encoded cache bytes, sent as they are when the client accepts the codec's content type.
+    """
+    codec = get_codec()
+    renderer = getattr(request, 'accepted_renderer', None)
+    
+    if renderer is not None and renderer.media_type == codec.content_type:
+        return HttpResponse(cache_data, content_type=codec.content_type, status=status.HTTP_200_OK)
+    
+    
+    return Response(data=codec.decode(cache_data), status=status.HTTP_200_OK)
+
+
+
+def get_or_compute(key:str, compute, timeout:int=settings.DEFAULT_TIME_OUT, version:int=1, family:str='other'):
+    """
+    Cached value of `key`, computed by a single caller when it is missing or about to expire.
+    """
+    cache_data, value = single_flight(key, compute, timeout, version, family)
+    
+    
+    return get_codec().decode(cache_data) if value is None else value
+
+
+
+def get_or_compute_response(request, key:str, compute, timeout:int=settings.DEFAULT_TIME_OUT, version:int=1, family:str='other'):
+    """
+    Like get_or_compute but returns a response, hits send the cached bytes as they are.
+    """
+    cache_data, value = single_flight(key, compute, timeout, version, family)
+    
+    if value is None:
+        return bytes_response(request, cache_data)
+    
+    
+    return Response(data=value, status=status.HTTP_200_OK)
+
+
+
+@traced('get_or_compute')
+def single_flight(key:str, compute, timeout:int, version:int=1, family:str='other')->tuple:
+    """
+    Stampede protected read of `key`, returns (cache_data, value) where value is None on a cache hit.
+    
+    Values are kept for CACHE_STALE_TIMEOUT past their timeout and next to a `{key}__meta` entry holding the
+    logical expiry and how long `compute` took. Each read refreshes early with a probability that grows as the
+    expiry nears and with the compute time (XFetch), so hot keys are refreshed before they expire.
+    Only the caller that takes the `{key}__lock` lock recomputes, the others get the stale value,
+    or wait up to CACHE_LOCK_WAIT seconds for it when there is none.
+    
+    Fresh values are kept in the L1 too. An L1 hit skips the early refresh, the L1 TIMEOUT is short and the
+    next read that reaches Redis takes the XFetch decision.
+    """
+    cache_data = get_from_l1(key=key, version=version, family=family)
+    
+    if cache_data is not None:
+        return cache_data, None
+    
+    
+    meta_key, lock_key = f"{key}__meta", f"{key}__lock"
+    cached:dict = cache.get_many([key, meta_key], version=version)
+    cache_data, meta = cached.get(key), cached.get(meta_key)
+    count_read('l2', family, cache_data)
+    
+    if cache_data and not should_refresh(meta):
+        fill_l1(key=key, version=version, cache_data=cache_data)
+        return cache_data, None
+    
+    
+    token:str = str(uuid4())
+    
+    if not cache.add(lock_key, token, timeout=settings.CACHE_LOCK_TIMEOUT, version=version):
+        if cache_data:
+            # someone else is refreshing, the stale value is still good enough
+            return cache_data, None
+        
+        cache_data = wait_for(key, version)
+        if cache_data:
+            return cache_data, None
+    
+    
+    try:
+        start:float = time.monotonic()
+        value = compute()
+        delta:float = time.monotonic() - start
+        cache_data = get_codec().encode(value)
+        CACHE_BYTES.labels(family=family, operation='write').inc(len(cache_data))
+        
+        cache.set_many(
+            {key: cache_data, meta_key: (time.time() + timeout, delta)},
+            timeout=timeout + settings.CACHE_STALE_TIMEOUT,
+            version=version,
+        )
+        invalidate([key], version=version)
+    finally:
+        if cache.get(lock_key, version=version) == token:
+            cache.delete(lock_key, version=version)
+    
+    
+    return cache_data, value
+
+
+
+def should_refresh(meta:tuple)->bool:
+    """
+    XFetch: true once `now - delta * beta * log(rand)` reaches the expiry, values stored without meta never refresh early.
+    """
+    if meta is None:
+        return False
+    
+    
+    expiry, delta = meta
+    return time.time() - delta * settings.CACHE_EARLY_REFRESH_BETA * log(1 - random.random()) >= expiry
+
+
+
+def wait_for(key:str, version:int=1):
+    """
+    Poll for a value another caller is computing, None when it did not show up within CACHE_LOCK_WAIT.
+    """
+    deadline:float = time.monotonic() + settings.CACHE_LOCK_WAIT
+    
+    
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        cache_data = cache.get(key, version=version)
+        
+        if cache_data:
+            return cache_data
+    
     
     return None
 
 
+@traced('generation')
+def generation_key(key:str, *tags:str)->str:
+    """
+    `key` suffixed with the current generation of every tag, e.g. `{username}_transactions:g17`.
+    
+    Bumping any of the tags moves every derived key to a new name in one INCR, the orphaned entries just expire.
+    """
+    generations:list = get_generations(tags)
+    
+    
+    return f"{key}:g{'.'.join(str(generation) for generation in generations)}"
+
+
+
+def get_generations(tags:tuple)->list:
+    """
+    Current generation of each tag, a missing counter starts at the current time in microseconds
+    so an evicted counter never goes back to a generation that is still cached.
+    """
+    keys:list = [f"gen:{tag}" for tag in tags]
+    generations:dict = cache.get_many(keys)
+    
+    
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            generations[key] = cache.get(key)
+    
+    
+    return [generations[key] for key in keys]
+
+
+
+@traced('bump_generation')
+def bump_generation(*tags:str):
+    """
+    Invalidate every key derived from the tags, e.g. `user:{user_id}` or `stocks`.
+    
+    With django-redis every tag is bumped through one pipeline, other backends fall back to one INCR per tag.
+    """
+    client = getattr(cache, 'client', None)
+    
+    
+    if not hasattr(client, 'get_client'):
+        for tag in tags:
+            try:
+                cache.incr(f"gen:{tag}")
+            except ValueError:
+                # the counter is missing or was evicted, start a new one
+                cache.add(f"gen:{tag}", time.time_ns() // 1000, timeout=None)
+        return
+    
+    
+    pipeline = client.get_client(write=True).pipeline(transaction=False)
+    
+    for tag in tags:
+        # start a missing counter at the current time, then INCR it
+        pipeline.set(client.make_key(f"gen:{tag}"), time.time_ns() // 1000, nx=True)
+        pipeline.incr(client.make_key(f"gen:{tag}"))
+    
+    pipeline.execute()
+
+
+
+def invalidate_on_commit(*tags:str):
+    """
+    Bump the generation tags once the current transaction commits, right away outside of one.
+    
+    Readers resolve a generation key before they query the database, so a reader that loaded rows before the commit
+    stores them under the previous generation, which nobody reads anymore, instead of refilling the current key.
+    """
+    transaction.on_commit(partial(bump_generation, *tags))
+
+
+
+@traced('delete')
 def delete_from_cache(key:str, version:int=1):
     
-    cache.delete(key=key, version=version)
\ No newline at end of file
+    cache.delete(key=key, version=version)
+    invalidate([key], version=version)
+
+
+
+@traced('delete_many')
+def delete_many_from_cache(keys:list, version:int=1):
+    
+    cache.delete_many(keys=keys, version=version)
+    invalidate(keys, version=version)
@@ -3,14 +3,64 @@ from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.decorators import action
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import (BaseRenderer, JSONRenderer)
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.http import (HttpResponse, StreamingHttpResponse)
 from django.conf import settings
+from django.db import transaction
 from django.db.models import F, Q
-from .utils import (store_in_cache, get_from_cache, delete_from_cache)
-from .serializers import (UserSerialzier, StockSerializer, TransactionSerializer)
-from .models import (User, StockData)
-from .tasks import process_transaction_async
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .utils import (store_in_cache, get_from_cache, get_or_compute, get_or_compute_response, generation_key, bump_generation, user_key, stock_key)
+from .serializers import (UserSerialzier, StockSerializer, StockRowSerializer, StockBarSerializer, StockCandleSerializer, TransactionSerializer, OrderSerializer, PositionSerializer)
+from .models import (User, StockData, StockBar, Position)
+from .tasks import (process_transaction_async, enqueue_transaction, match_order_async)
+from .pagination import (TRANSACTION_KEYSET, STOCK_KEYSET, is_page_requested, keyset_page_response)
+from .candles import resample_candles
+from .profiling import (list_profiles, get_profile)
+from .loaders import get_loader
+from .order_status import (PENDING, StatusSubscription, get_order_status, set_order_status, is_final, wait_timeout, status_events)
+from .analytics import (compute_valuations, refresh_valuations)
+from .exports import (TRANSACTION_EXPORT_FIELDS, TRANSACTION_EXPORT_FORMATS)
+from .ingestion import (validate_stock_rows, upsert_stock_rows, append_stock_bars, iter_ndjson_rows, iter_csv_rows, ingest_stock_stream)
 from drf_yasg.utils import swagger_auto_schema
+from prometheus_client import (REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess)
+from uuid import uuid4
+from datetime import timedelta
+import json
+import os
+
+
+
+def parse_range_params(request:Request)->tuple:
+    """
+    Parse the optional `from` and `to` query parameters into naive datetimes, returns (start, end, errors).
+    """
+    bounds:dict = {'from': None, 'to': None}
+    
+    
+    for param in bounds:
+        if param not in request.query_params:
+            continue
+        
+        try:
+            value = parse_datetime(request.query_params[param])
+        except ValueError:
+            # well formatted but impossible, e.g. 2024-02-30
+            value = None
+        
+        if value is None:
+            return None, None, {param: 'Enter a valid date/time.'}
+        
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value)
+        bounds[param] = value
+    
+    
+    return bounds['from'], bounds['to'], None
+
 
 class UserViewSet(ViewSet):
     """
@@ -28,12 +78,12 @@ class UserViewSet(ViewSet):
         
         if serializer.is_valid():
             user:User = serializer.save()
-            store_in_cache(key=user.username, value=serializer.data)
+            store_in_cache(key=user_key(user.username), value=serializer.data, family='user')
             
             
             return Response({"message": "User created", "user_id": user.user_id}, status=status.HTTP_201_CREATED)
-
-
+        
+        
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
@@ -41,21 +91,29 @@ class UserViewSet(ViewSet):
         """
         Retrieve user data by username. Check cache first, then database.
         """
-        cache_user = get_from_cache(key=username)
+        def load_user()->dict:
+            user:User  = get_object_or_404(User, username=username)
+            return UserSerialzier(user).data
         
         
-        if cache_user:
-            print("GET FORM CACHE")
-            return Response(cache_user, status=status.HTTP_200_OK)
+        # only one request reloads a popular user when its entry expires
+        return Response(get_or_compute(key=user_key(username), compute=load_user, family='user'), status=status.HTTP_200_OK)
+    
+    
+    @action(detail=True, methods=['get'], url_path='portfolio', url_name='portfolio')
+    def portfolio(self, request:Request, username:str=None):
+        """
+        Retrieve the open positions of a user from the positions table, without aggregating the transaction history.
+        """
+        positions = Position.objects.filter(user__username=username, quantity__gt=0).order_by('ticker')
+        serializer:PositionSerializer = PositionSerializer(positions, many=True)
         
+        if not serializer.data:
+            get_object_or_404(User, username=username)
         
-        user:User  = get_object_or_404(User, username=username)
-        serializer:UserSerialzier = UserSerialzier(user)
         
-        store_in_cache(key=user.username, value=serializer.data)
-        print("GET FORM DATABASE")
         return Response(serializer.data, status=status.HTTP_200_OK)
-    
+
 
 class SotckViewSet(ViewSet):
     """
@@ -72,55 +130,172 @@ class SotckViewSet(ViewSet):
         
         
         if serializer.is_valid():
-            serializer.save()
-            delete_from_cache("stock_data")
+            with transaction.atomic():
+                stock:StockData = serializer.save()
+                append_stock_bars([stock])
+            bump_generation("stocks")
             return Response(data={'message': "stock created", 'stock': serializer.data}, status=status.HTTP_201_CREATED)
         
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
-    def list(self, request:Request):
+    @swagger_auto_schema(request_body=StockRowSerializer(many=True))
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk(self, request:Request):
         """
-        List all stock records. First check the cache, then query the database if needed.
+        Create or update many stock records at once, invalid rows are reported without failing the batch.
         """
-        stock_data = get_from_cache(key='stock_data')
+        if not isinstance(request.data, list):
+            return Response({'message': 'Expected a list of stock records.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(request.data) > settings.STOCK_BULK_MAX_ROWS:
+            return Response({
+                'message': f'At most {settings.STOCK_BULK_MAX_ROWS} stock records per request, stream larger payloads as NDJSON or CSV to {reverse("stocks-ingest")}.'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         
-        if stock_data:
-            print("get from cache")
-            return Response(data=stock_data, status=status.HTTP_200_OK)
         
+        valid_rows, errors = validate_stock_rows(request.data)
+        stocks = upsert_stock_rows(valid_rows)
+        
+        
+        return Response(data={
+            'message': 'stocks upserted',
+            'upserted': len(stocks),
+            'rejected': len(errors),
+            'errors': errors,
+        }, status=status.HTTP_200_OK)
+    
     
-        stock_data = StockData.objects.all()
-        serializer = StockSerializer(stock_data, many=True)
+    @action(detail=False, methods=['post'], url_path='ingest', url_name='ingest')
+    def ingest(self, request:Request):
+        """
+        Stream NDJSON or CSV (`Content-Type: text/csv`) stock records, validating and saving them in batches.
         
+        The body is read line by line and never buffered as a whole, `batch_size` controls how many rows are flushed at once.
+        """
+        try:
+            batch_size:int = int(request.query_params.get('batch_size', settings.STOCK_INGEST_BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
         
-        if stock_data.exists():
-            store_in_cache(key='stock_data', value=serializer.data, timeout=settings.CACHE_TIMEOUT_FOR_STOCK)
-            
-            
-        print("get from database")
-        return Response(serializer.data, status=status.HTTP_200_OK)        
+        if not 0 < batch_size <= settings.STOCK_INGEST_MAX_BATCH_SIZE:
+            return Response({'batch_size': f'Must be between 1 and {settings.STOCK_INGEST_MAX_BATCH_SIZE}.'}, status=status.HTTP_400_BAD_REQUEST)
         
-
+        
+        # read the underlying stream directly, request.data would buffer and parse the whole body
+        stream = request.stream or []
+        rows = iter_csv_rows(stream) if request.content_type.startswith('text/csv') else iter_ndjson_rows(stream)
+        report:dict = ingest_stock_stream(rows, batch_size=batch_size, max_errors=settings.STOCK_INGEST_MAX_ERRORS)
+        
+        
+        return Response(data={'message': 'stocks ingested', **report}, status=status.HTTP_200_OK)
+    
+    
+    def list(self, request:Request):
+        """
+        List all stock records. First check the cache, then query the database if needed.
+        
+        Passing `cursor` or `page_size` returns one page ordered by (timestamp, ticker) with the cursor of the next page.
+        """
+        if is_page_requested(request):
+            return keyset_page_response(
+                request, StockData.objects.all(), keyset=STOCK_KEYSET, serializer_class=StockSerializer,
+                cache_key=generation_key('stock_data_page', 'stocks'), timeout=settings.CACHE_TIMEOUT_FOR_STOCK, family='stock_data',
+            )
+        
+        
+        def load_stocks()->list:
+            return StockSerializer(StockData.objects.all(), many=True).data
+        
+        
+        # one request recomputes the listing when it expires, the others are served the stale or refreshed bytes
+        return get_or_compute_response(request, key=generation_key('stock_data', 'stocks'), compute=load_stocks, timeout=settings.CACHE_TIMEOUT_FOR_STOCK, family='stock_data')
+    
+    
     def retrieve(self, request:Request, ticker:str):
         """
         Retrieve a specific stock record by ticker. First check the cache, then the database.
         """
-        stcok_data = get_from_cache(key=ticker)
+        # resolved before the query, so a snapshot loaded before a settlement commits lands under the previous generation
+        cache_key:str = stock_key(ticker)
+        stcok_data = get_from_cache(key=cache_key, family='stock')
         
         if stcok_data:
-            print("GET FROM CACHE")
             return Response(data=stcok_data, status=status.HTTP_200_OK)
         
         stock_data = get_object_or_404(StockData, ticker=ticker)
         serializer = StockSerializer(stock_data)
         
-
+        
         if stock_data:
-            store_in_cache(key=ticker, value=serializer.data)
-        print('GET FROM DATABAES')
+            store_in_cache(key=cache_key, value=serializer.data, family='stock')
         return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    
+    @action(detail=True, methods=['get'], url_path='history', url_name='history')
+    def history(self, request:Request, ticker:str):
+        """
+        Retrieve the historical bars of a ticker, optionally bounded by the `from` and `to` query parameters.
+        
+        At most STOCK_HISTORY_MAX_BARS bars are returned, oldest first, a `Link: rel="next"` header points to the
+        same range starting right after the last of them.
+        """
+        bars = StockBar.objects.filter(ticker=ticker).order_by('timestamp')
+        start, end, errors = parse_range_params(request)
+        
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        
+        if start is not None:
+            bars = bars.filter(timestamp__gte=start)
+        if end is not None:
+            bars = bars.filter(timestamp__lte=end)
+        
+        
+        limit:int = settings.STOCK_HISTORY_MAX_BARS
+        bars:list = list(bars[:limit + 1])
+        serializer = StockBarSerializer(bars[:limit], many=True)
+        
+        if not serializer.data and not StockData.objects.filter(ticker=ticker).exists():
+            return Response({'detail': 'No StockData matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        
+        if len(bars) > limit:
+            query_params = request.query_params.copy()
+            query_params['from'] = (bars[limit - 1].timestamp + timedelta(microseconds=1)).isoformat()
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{query_params.urlencode()}>; rel="next"'
+        
+        
+        return response
+    
+    
+    @action(detail=True, methods=['get'], url_path='candles', url_name='candles')
+    def candles(self, request:Request, ticker:str):
+        """
+        Retrieve the OHLCV candles of a ticker for `interval` (1m, 5m, 1h, 1d or any multiple of a minute),
+        optionally bounded by the `from` and `to` query parameters. Candles are read from the precomputed rollups.
+        """
+        start, end, errors = parse_range_params(request)
+        
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        
+        try:
+            candles:list = resample_candles(ticker, request.query_params.get('interval', '1m'), start, end)
+        except ValueError as exc:
+            return Response({'interval': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        
+        if not candles and not StockData.objects.filter(ticker=ticker).exists():
+            return Response({'detail': 'No StockData matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        return Response(StockCandleSerializer(candles, many=True).data, status=status.HTTP_200_OK)
 
 
 class TransactionViewSet(ViewSet):
@@ -132,19 +307,28 @@ class TransactionViewSet(ViewSet):
     def create(self, request:Request)->Response:
         """
         Create a new transaction and pass the processing to a Celery task if the request is valid.
+        
+        The response carries the order_id whose status GET /orders/<order_id>/ reports, pending until the task settled it.
         """
         request_data = request.data.copy()
         if 'transaction_type' in request.data:
             request_data['transaction_type'] = request_data['transaction_type'].lower()
-            
+        
         serialzer:TransactionSerializer = TransactionSerializer(data=request_data)
         
         if serialzer.is_valid():
             if self._is_balance_sufficent(serialzer.validated_data):
+                order_id:str = str(uuid4())
+                # the status exists before the task can settle the order
+                set_order_status(order_id, PENDING, 'Transaction is in progress.')
+                
                 # pass process to celery
-                process_transaction_async.delay(serialzer.data)
+                if settings.TRANSACTION_BATCHING:
+                    enqueue_transaction({**serialzer.data, 'order_id': order_id})
+                else:
+                    process_transaction_async.delay({**serialzer.data, 'order_id': order_id})
                 
-                return Response({'message':'Transaction is in progress.'}, status=status.HTTP_200_OK)
+                return Response({'message':'Transaction is in progress.', 'order_id': order_id}, status=status.HTTP_200_OK)
             return Response({'message':'Insufficient balance for this transaction.'}, status=status.HTTP_400_BAD_REQUEST)
         
         
@@ -155,39 +339,81 @@ class TransactionViewSet(ViewSet):
     def user_transactions(self, request:Request, user_id:str):
         """
         Retrieve all transactions for a specific user.
+        
+        Passing `cursor` or `page_size` returns one page ordered by (timestamp, transaction_id) with the cursor of the next page.
         """
         user:User = get_object_or_404(User, user_id=user_id)
         
-        cache_transactions = get_from_cache(key=f"{user.username}_transactions")
+        if is_page_requested(request):
+            return keyset_page_response(
+                request, user.transactions.all(), keyset=TRANSACTION_KEYSET, serializer_class=TransactionSerializer,
+                cache_key=generation_key(f"{user.username}_transactions_page", f"user:{user.user_id}"), family='transactions',
+            )
+        
+        cache_key:str = generation_key(f"{user.username}_transactions", f"user:{user.user_id}")
+        cache_transactions = get_from_cache(key=cache_key, family='transactions')
         if cache_transactions:
-            print("GET TRANSACTIONS FROM CACHE")
             return Response(cache_transactions, status=status.HTTP_200_OK)
         
         transactions = user.transactions.all()
         serializer = TransactionSerializer(transactions, many=True)
         if len(transactions):
-            store_in_cache(key=f"{user.username}_transactions", value=serializer.data)
+            store_in_cache(key=cache_key, value=serializer.data, family='transactions')
         
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     
+    @action(detail=False, methods=['get'])
+    def export_transactions(self, request:Request, user_id:str):
+        """
+        Stream the full transaction history of a user as NDJSON or CSV (`?output=csv`).
+        
+        Rows are read with a server side cursor and written as they arrive, so memory stays bounded whatever the history size.
+        """
+        user:User = get_object_or_404(User, user_id=user_id)
+        output:str = request.query_params.get('output', 'ndjson')
+        
+        if output not in TRANSACTION_EXPORT_FORMATS:
+            return Response({'output': f'Must be one of {", ".join(TRANSACTION_EXPORT_FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        
+        render, content_type = TRANSACTION_EXPORT_FORMATS[output]
+        rows = user.transactions.values_list(*TRANSACTION_EXPORT_FIELDS.values()).iterator(chunk_size=settings.TRANSACTION_EXPORT_CHUNK_SIZE)
+        
+        response = StreamingHttpResponse(render(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{user.username}_transactions.{output}"'
+        
+        
+        return response
+    
+    
     @action(detail=False, methods=['GET'])
     def get_user_transactions_within_range(self, reqeuest, user_id, start_timestamp, end_timestamp):
         """
         Retrieve all transactions for a specific user within a given timestamp range.
+        
+        Passing `cursor` or `page_size` returns one page ordered by (timestamp, transaction_id) with the cursor of the next page.
         """
         user:User = get_object_or_404(User, user_id=user_id)
         
-        cache_transactions = get_from_cache(key=f"{user.username}_{start_timestamp}_{end_timestamp}_transactions")
+        if is_page_requested(reqeuest):
+            return keyset_page_response(
+                reqeuest, user.transactions.filter(timestamp__range=[start_timestamp, end_timestamp]),
+                keyset=TRANSACTION_KEYSET, serializer_class=TransactionSerializer,
+                cache_key=generation_key(f"{user.username}_{start_timestamp}_{end_timestamp}_transactions_page", f"user:{user.user_id}"), family='transactions',
+            )
+        
+        # keyed by the generation of the user, so a new transaction invalidates every cached range at once
+        cache_key:str = generation_key(f"{user.username}_{start_timestamp}_{end_timestamp}_transactions", f"user:{user.user_id}")
+        cache_transactions = get_from_cache(key=cache_key, family='transactions')
         if cache_transactions:
-            print("GET TRANSACTIONS FROM CACHE")
             return Response(cache_transactions, status=status.HTTP_200_OK)
         
         transactions = user.transactions.filter(timestamp__range=[start_timestamp, end_timestamp])
         serializer = TransactionSerializer(transactions, many=True)
         # store in cache
         if len(transactions):
-            store_in_cache(key=f"{user.username}_{start_timestamp}_{end_timestamp}_transactions", value=serializer.data)
+            store_in_cache(key=cache_key, value=serializer.data, family='transactions')
         
         return Response(serializer.data, status=status.HTTP_200_OK)
     
@@ -197,9 +423,182 @@ class TransactionViewSet(ViewSet):
         Check if the user's balance is sufficient for the transaction.
         """
         user:User = validated_data['user']
-        stock_data:StockData = get_object_or_404(StockData, ticker=validated_data['ticker'])
+        stock_data:StockData = get_loader().stock(validated_data['ticker'])
         transaction_type:str = validated_data['transaction_type']
         transaction_volume:int = validated_data['transaction_volume']
         
         
-        return not (transaction_type == 'buy' and user.balance < stock_data.close_price * transaction_volume)
\ No newline at end of file
+        return not (transaction_type == 'buy' and user.balance < stock_data.close_price * transaction_volume)
+
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients ask for text/event-stream, the stream itself is a StreamingHttpResponse.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+
+
+class OrderViewSet(ViewSet):
+    """
+    ViewSet to submit limit and market orders to the order book matching engine, and to follow
+    their status and the status of the transaction orders of TransactionViewSet.
+    """
+    
+    @swagger_auto_schema(request_body=OrderSerializer)
+    def create(self, request:Request)->Response:
+        """
+        Validate an order and pass it to the matching worker, GET /orders/<order_id>/ reports its status.
+        """
+        serializer:OrderSerializer = OrderSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            order_id:str = str(uuid4())
+            set_order_status(order_id, PENDING, 'Order is in progress.')
+            match_order_async.delay({
+                **serializer.data,
+                'user': serializer.validated_data['user'].pk,
+                'order_id': order_id,
+            })
+            
+            return Response({'message': 'Order accepted.', 'order_id': order_id}, status=status.HTTP_200_OK)
+        
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    
+    def retrieve(self, request:Request, pk:str)->Response:
+        """
+        Status of an order: pending, then accepted, rejected or failed for a transaction, resting, partially_filled,
+        filled or cancelled for an order book order, failed when its task raised.
+        
+        With `?wait=<seconds>` a pending order is answered as soon as its status changes, or after the wait
+        (at most ORDER_STATUS['MAX_WAIT'] seconds) with its unchanged status.
+        """
+        order_status:dict = get_order_status(pk)
+        
+        if order_status is None:
+            return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        timeout:float = wait_timeout(request.query_params)
+        
+        if timeout and not is_final(order_status):
+            with StatusSubscription(pk) as subscription:
+                order_status = subscription.wait(order_status['status'], timeout) or order_status
+        
+        
+        return Response(order_status, status=status.HTTP_200_OK)
+    
+    
+    @action(detail=True, methods=['get'], url_path='events', url_name='events', renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def events(self, request:Request, pk:str):
+        """
+        Server-sent events stream of the status of an order, closed once the order is settled.
+        """
+        order_status:dict = get_order_status(pk)
+        
+        if order_status is None:
+            return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        response = StreamingHttpResponse(status_events(pk, order_status), content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        # nginx would otherwise buffer the events
+        response['X-Accel-Buffering'] = 'no'
+        
+        
+        return response
+
+
+
+class AnalyticsViewSet(ViewSet):
+    """
+    ViewSet for the risk dashboard analytics, staff only: it exposes the holdings of every user.
+    """
+    permission_classes = [IsAdminUser]
+    
+    
+    @action(detail=False, methods=['get'], url_path='valuations', url_name='valuations')
+    def valuations(self, request:Request)->Response:
+        """
+        Mark-to-market value, unrealized P&L and exposure per ticker of every user, or of `?users=name1,name2`.
+        
+        The valuation of every user is served from the cache and recomputed when missing.
+        """
+        if 'users' in request.query_params:
+            usernames:list = [username for username in request.query_params['users'].split(',') if username]
+            return Response(compute_valuations(usernames), status=status.HTTP_200_OK)
+        
+        
+        valuations = get_from_cache(key='portfolio_valuations', family='valuations')
+        
+        if valuations is None:
+            valuations = refresh_valuations()
+        
+        
+        return Response(valuations, status=status.HTTP_200_OK)
+
+
+
+class ProfileViewSet(ViewSet):
+    """
+    ViewSet listing and downloading the request profiles recorded by ProfilingMiddleware, staff only.
+    """
+    permission_classes = [IsAdminUser]
+    
+    
+    def list(self, request:Request):
+        """
+        List the most recent profiles, newest first.
+        """
+        return Response(list_profiles(), status=status.HTTP_200_OK)
+    
+    
+    def retrieve(self, request:Request, pk:str=None):
+        """
+        Retrieve a profile: the SQL and cache timeline and the top functions by cumulative time.
+        """
+        profile:dict = get_profile(pk)
+        
+        if profile is None:
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        return Response(profile, status=status.HTTP_200_OK)
+    
+    
+    @action(detail=True, methods=['get'], url_path='download', url_name='download')
+    def download(self, request:Request, pk:str=None):
+        """
+        Download the cProfile stats of a profile, open them with pstats or snakeviz.
+        """
+        raw:bytes = get_profile(pk, raw=True)
+        
+        if raw is None:
+            return Response({'detail': 'Profile not found.'}, status=status.HTTP_404_NOT_FOUND)
+        
+        
+        response = HttpResponse(raw, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{pk}.prof"'
+        return response
+
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, aggregated over every process writing to PROMETHEUS_MULTIPROC_DIR when it is set.
+    """
+    registry = REGISTRY
+    
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    
+    
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,85 @@
+"""
+Throughput of the sync DRF views on a WSGI server against the async views of app.async_views on an ASGI server,
+as the number of concurrent connections grows.
+
+    gunicorn config.wsgi -w 4 --threads 8 -b :8000            # or any WSGI deployment
+    uvicorn config.asgi:application --workers 4 --port 8001
+    python -m benchmarks.bench_asgi --username john --ticker AAPL [--wsgi-url http://localhost:8000]
+                                    [--asgi-url http://localhost:8001] [--concurrency 10 100 500] [--duration 20]
+
+Both servers must use the same database and Redis. Every run replays the same read mix (user, stock, stock
+listing and transaction history) with benchmarks.load_replay, on `/...` of the WSGI server and `/async/...`
+of the ASGI one, as fast as the connections allow.
+"""
+from .load_replay import (replay, summarize)
+from time import perf_counter
+from urllib.request import urlopen
+import argparse
+import asyncio
+import json
+
+
+def build_entries(username:str, ticker:str, user_id:str, prefix:str='')->list:
+
+    paths:dict = {
+        'user': f'{prefix}/users/{username}/',
+        'stock': f'{prefix}/stocks/{ticker}/',
+        'stocks': f'{prefix}/stocks/',
+        'transactions': f'{prefix}/transactions/{user_id}/',
+    }
+    
+    
+    return [{'method': 'GET', 'path': path, 'route': route, 'body': '', 'content_type': None} for route, path in paths.items()]
+
+
+
+def run(entries:list, base_url:str, concurrency:int, duration:float, timeout:float)->dict:
+
+    start = perf_counter()
+    stats:dict = asyncio.run(replay(entries, base_url, concurrency, None, duration, timeout))
+    
+    
+    return summarize(stats, perf_counter() - start)['all']
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--ticker', required=True)
+    parser.add_argument('--wsgi-url', default='http://localhost:8000')
+    parser.add_argument('--asgi-url', default='http://localhost:8001')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--duration', type=float, default=20, help='seconds per run')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds per request')
+    parser.add_argument('--output', default=None, help='write the results as JSON')
+    args = parser.parse_args()
+    
+    
+    with urlopen(f"{args.wsgi_url}/users/{args.username}/") as response:
+        user_id:str = json.load(response)['user_id']
+    
+    deployments:dict = {
+        'wsgi': (args.wsgi_url, build_entries(args.username, args.ticker, user_id)),
+        'asgi': (args.asgi_url, build_entries(args.username, args.ticker, user_id, prefix='/async')),
+    }
+    results:list = []
+    
+    
+    print(f"{'connections':>11} {'server':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in args.concurrency:
+        for server, (base_url, entries) in deployments.items():
+            row:dict = run(entries, base_url, concurrency, args.duration, args.timeout)
+            results.append({'connections': concurrency, 'server': server, **row})
+            print(f"{concurrency:>11} {server:<6} {row['throughput']:>9,.1f} {row['p50_ms']:>9,.2f} {row['p99_ms']:>9,.2f} {row['error_rate']:>7.2%}")
+    
+    
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+
+if __name__ == '__main__':
+    main()
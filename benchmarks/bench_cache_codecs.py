@@ -0,0 +1,112 @@
+"""
+Cost of a cache hit on the stock listing for every codec in app.cache_codecs, across payload sizes.
+
+    python -m benchmarks.bench_cache_codecs [--sizes 10 100 1000 10000] [--repeat 20]
+
+`encode` and `decode` time the codec alone. `hit` is what a cache hit costs the view:
+before app.cache_codecs it was json.loads plus the DRF JSONRenderer, with a JSON codec the
+stored bytes are the response body so nothing is decoded. No database or cache server is used.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from app.cache_codecs import (CACHE_CODECS, get_codec)
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import JSONRenderer
+from time import perf_counter
+import argparse
+import json
+
+
+def build_payload(size:int)->list:
+    """
+    Rows shaped like StockSerializer output.
+    """
+    return [
+        {
+            'id': index,
+            'ticker': f'T{index:05d}',
+            'open_price': '150.00',
+            'close_price': '155.25',
+            'high': '156.10',
+            'low': '149.90',
+            'volume': 1000000 + index,
+            'timestamp': '2024-01-01T10:00:00.123456',
+        }
+        for index in range(size)
+    ]
+
+
+
+def best_of(function, repeat:int)->float:
+    """
+    Best wall time in microseconds over `repeat` runs.
+    """
+    timings:list = []
+    
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+    
+    return min(timings) * 1e6
+
+
+
+def run(size:int, repeat:int)->list:
+    
+    payload:list = build_payload(size)
+    renderer = JSONRenderer()
+    legacy:str = json.dumps(payload)
+    rows:list = [(
+        'json (legacy)',
+        best_of(lambda: json.dumps(payload), repeat),
+        best_of(lambda: json.loads(legacy), repeat),
+        best_of(lambda: renderer.render(json.loads(legacy)), repeat),
+        len(legacy),
+    )]
+    
+    
+    for name in CACHE_CODECS:
+        try:
+            codec = get_codec(name)
+        except ImproperlyConfigured as exc:
+            print(f"skipping {name}: {exc}")
+            continue
+        
+        data:bytes = codec.encode(payload)
+        
+        if codec.content_type == renderer.media_type:
+            # the stored bytes are sent as they are
+            hit = best_of(lambda: bytes(data), repeat)
+        else:
+            hit = best_of(lambda: renderer.render(codec.decode(data)), repeat)
+        
+        rows.append((name, best_of(lambda: codec.encode(payload), repeat), best_of(lambda: codec.decode(data), repeat), hit, len(data)))
+    
+    
+    return rows
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    print(f"{'rows':>6} {'codec':<14} {'encode us':>11} {'decode us':>11} {'hit us':>11} {'bytes':>10}")
+    for size in args.sizes:
+        for name, encode, decode, hit, length in run(size, args.repeat):
+            print(f"{size:>6} {name:<14} {encode:>11,.1f} {decode:>11,.1f} {hit:>11,.1f} {length:>10,}")
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Per-request cost of the database connection modes of config/database.py (fresh, persistent and pool)
+as the number of threads serving requests in a process grows.
+
+    DATABASE_HOST=localhost python -m benchmarks.bench_db_connections [--modes fresh persistent pool]
+                                    [--concurrency 1 8 32] [--pool-sizes 4 16] [--requests 2000]
+
+Every mode runs in its own process with config.settings and DATABASE_CONNECTION_MODE set, so use a Postgres
+reachable with the credentials of config.settings. A request is what Django does around a view: the
+request_started and request_finished signals (which open, close or hand back the connection) around a
+`SELECT 1`, so the difference between the modes is the cost of getting a connection.
+`--concurrency` threads share the process like the threads of a gunicorn worker, `--pool-sizes` are the
+DATABASE_POOL_MAX_SIZE values tried in pool mode. `connections` is the number of server connections the
+process holds at the end of the run.
+
+Sizing:
+    - fresh pays a TCP handshake, authentication and a new Postgres backend on every request and task.
+    - persistent keeps one connection per thread. It suits the Celery workers (one task at a time per prefork
+      child) and WSGI servers with a fixed set of threads, not runserver or ASGI, whose threads come and go.
+    - pool keeps DATABASE_POOL_MIN_SIZE to DATABASE_POOL_MAX_SIZE connections per process. With a max size below
+      the threads of the process, requests queue for a connection and the wait shows in p99, so size it to the
+      threads (gunicorn --threads, or the sync_to_async executor under ASGI).
+    - processes x connections per process, for the web and worker processes together, must stay below
+      max_connections of Postgres (100 by default), e.g. 4 web processes x 10 + 4 celery children + 1 matching worker.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+def percentile(values:list, fraction:float)->float:
+
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+
+def run_worker(concurrency:int, requests:int, warmup:int)->dict:
+    """
+    Time `requests` requests on `concurrency` threads in this process.
+    """
+    import django
+    
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+    
+    from django.core.signals import (request_started, request_finished)
+    from django.db import (connection, connections)
+    
+    
+    def handle_request()->float:
+    
+        start:float = perf_counter()
+        request_started.send(sender=None)
+        
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        finally:
+            request_finished.send(sender=None)
+        
+        
+        return perf_counter() - start
+    
+    
+    def serve(count:int)->list:
+    
+        for _ in range(warmup):
+            handle_request()
+        
+        latencies:list = [handle_request() for _ in range(count)]
+        # the server connections, before the thread lets its own go
+        latencies.append(server_connections())
+        connections.close_all()
+        
+        
+        return latencies
+    
+    
+    def server_connections():
+    
+        if connection.vendor != 'postgresql':
+            return None
+        
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND application_name = %s", [application_name])
+            return cursor.fetchone()[0]
+    
+    
+    application_name:str = f"bench_db_connections_{os.getpid()}"
+    
+    if connection.vendor == 'postgresql':
+        connection.settings_dict['OPTIONS']['application_name'] = application_name
+    
+    
+    start:float = perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results:list = list(executor.map(serve, [requests // concurrency] * concurrency))
+    
+    elapsed:float = perf_counter() - start
+    
+    
+    latencies:list = sorted(latency for result in results for latency in result[:-1])
+    counts:list = [result[-1] for result in results if result[-1] is not None]
+    
+    
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'connections': max(counts) if counts else None,
+    }
+
+
+
+def run_mode(mode:str, concurrency:int, pool_size:int, args)->dict:
+    """
+    Run the worker in a new process with the connection mode set in its environment.
+    """
+    environ:dict = {**os.environ, 'DATABASE_CONNECTION_MODE': mode}
+    
+    if pool_size is not None:
+        environ.update(DATABASE_POOL_MIN_SIZE=str(min(args.pool_min_size, pool_size)), DATABASE_POOL_MAX_SIZE=str(pool_size))
+    
+    
+    output:str = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_db_connections', '--worker',
+         '--concurrency', str(concurrency), '--requests', str(args.requests), '--warmup', str(args.warmup)],
+        env=environ, check=True, capture_output=True, text=True,
+    ).stdout
+    
+    
+    return json.loads(output.splitlines()[-1])
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['fresh', 'persistent', 'pool'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='threads per process')
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[4, 16], help='DATABASE_POOL_MAX_SIZE values of pool mode')
+    parser.add_argument('--pool-min-size', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=2000, help='timed requests per run')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per thread')
+    parser.add_argument('--output', default=None, help='write the results as JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    
+    if args.worker:
+        print(json.dumps(run_worker(args.concurrency[0], args.requests, args.warmup)))
+        return
+    
+    
+    results:list = []
+    baseline:dict = {}
+    
+    print(f"{'threads':>7} {'mode':<10} {'pool':>5} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'saved ms':>9} {'connections':>11}")
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            for pool_size in (args.pool_sizes if mode == 'pool' else [None]):
+                row:dict = run_mode(mode, concurrency, pool_size, args)
+                if mode == 'fresh':
+                    baseline[concurrency] = row['mean_ms']
+                
+                # per-request saving against a fresh connection for every request
+                saved = round(baseline[concurrency] - row['mean_ms'], 3) if concurrency in baseline else None
+                results.append({'threads': concurrency, 'mode': mode, 'pool_max_size': pool_size, 'saved_ms': saved, **row})
+                
+                print(
+                    f"{concurrency:>7} {mode:<10} {pool_size or '-':>5} {row['throughput']:>9,.1f} {row['mean_ms']:>9,.3f}"
+                    f" {row['p50_ms']:>9,.3f} {row['p99_ms']:>9,.3f} {'-' if saved is None else f'{saved:,.3f}':>9} {row['connections'] or '-':>11}"
+                )
+    
+    
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+
+if __name__ == '__main__':
+    main()
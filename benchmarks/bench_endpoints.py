@@ -0,0 +1,561 @@
+"""
+Throughput and p50/p99 latency of every route of app.urls with a cold and a warm cache, and of the
+process_transaction task, against the local stand-ins of benchmarks.settings.
+
+    python -m benchmarks.bench_endpoints [--scale 0.01] [--requests 200] [--budget 30] [--output bench_endpoints.json]
+                                         [--baseline bench_baseline.json] [--tolerance 0.2] [--save-baseline]
+
+--scale 1 seeds 10^5 users, 10^4 tickers and 10^7 transactions. The data is kept between runs and only
+reseeded when the scale changes or with --reseed. Cached routes are measured `cold` (the cache is cleared
+before every request) and `warm` (one untimed pass first), the other routes once. Requests go through the
+Django test client, so they include the middlewares but not the HTTP server, and rows created by the
+write routes are deleted at the end.
+
+Results are written as JSON. With --baseline every p50 or p99 more than --tolerance above the baseline is
+reported as a regression and the command exits with status 1, --save-baseline writes the results to
+the baseline file instead.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django
+
+django.setup()
+
+from app import urls
+from app.cache_tiers import get_l1
+from app.candles import refresh_candles
+from app.models import (User, StockData, StockBar, StockCandle, Transaction, Position)
+from app.order_status import (get_order_status, set_order_status)
+from app.profiling import (make_token, get_profile)
+from app.tasks import process_transaction_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (connection, transaction)
+from django.urls import (URLResolver, reverse)
+from rest_framework.test import APIClient
+from datetime import (datetime, timedelta)
+from decimal import Decimal
+from statistics import (mean, quantiles)
+from time import perf_counter
+from uuid import uuid4
+import argparse
+import json
+import random
+import sys
+
+
+FULL_SCALE:dict = {'users': 10**5, 'tickers': 10**4, 'transactions': 10**7}
+
+# rows inserted by one bulk_create
+SEED_BATCH = 10000
+
+# tickers getting historical bars and candles, the --keys tickers are picked among them
+BAR_TICKERS = 100
+
+BARS_START = datetime(2024, 1, 1)
+
+# a scenario stops after --budget seconds once it has this many samples
+MIN_SAMPLES = 10
+
+RANGE_START, RANGE_END = '2000-01-01', '2100-01-01'
+
+
+def seed_counts(scale:float)->dict:
+    return {name: max(int(count * scale), 1) for name, count in FULL_SCALE.items()}
+
+
+
+def is_seeded(counts:dict, bars:int)->bool:
+    """
+    Whether the database holds exactly the data of this scale, rows added by earlier runs are deleted by cleanup().
+    """
+    return (
+        User.objects.filter(username=f"bench_user_{counts['users'] - 1}").exists()
+        and not User.objects.filter(username=f"bench_user_{counts['users']}").exists()
+        and StockData.objects.filter(ticker=ticker_name(counts['tickers'] - 1)).exists()
+        and not StockData.objects.filter(ticker=ticker_name(counts['tickers'])).exists()
+        and StockBar.objects.filter(ticker=ticker_name(0)).count() == bars
+        and Transaction.objects.count() == counts['transactions']
+    )
+
+
+
+def ticker_name(index:int)->str:
+    return f'T{index:05d}'
+
+
+
+def price(rng:random.Random)->Decimal:
+    return Decimal(rng.randint(100, 100000)) / 100
+
+
+
+def seed(counts:dict, bars:int, rng:random.Random):
+    """
+    Flush the database and seed users, stocks, positions, transactions and the bars of BAR_TICKERS tickers.
+    """
+    call_command('flush', interactive=False, verbosity=0)
+    tickers:list = [ticker_name(index) for index in range(counts['tickers'])]
+    
+    
+    with transaction.atomic():
+        StockData.objects.bulk_create(
+            [StockData(ticker=ticker, open_price=10, close_price=price(rng), high=1000, low=1, volume=10**9) for ticker in tickers],
+            batch_size=SEED_BATCH,
+        )
+        users:list = User.objects.bulk_create(
+            [User(username=f'bench_user_{index}', balance=Decimal(10**9)) for index in range(counts['users'])],
+            batch_size=SEED_BATCH,
+        )
+        Position.objects.bulk_create(
+            [
+                Position(user=user, ticker=ticker, quantity=rng.randint(1, 1000), cost_basis=price(rng) * 100)
+                for user in users
+                for ticker in rng.sample(tickers, min(3, len(tickers)))
+            ],
+            batch_size=SEED_BATCH,
+        )
+    
+    
+    # bulk_create would hold all the rows in memory, 10^7 transactions are inserted one batch at a time
+    for start in range(0, counts['transactions'], SEED_BATCH):
+        with transaction.atomic():
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user=rng.choice(users),
+                    ticker=rng.choice(tickers),
+                    transaction_type=rng.choice(('buy', 'sell')),
+                    transaction_volume=rng.randint(1, 100),
+                    transaction_price=price(rng),
+                )
+                for _ in range(min(SEED_BATCH, counts['transactions'] - start))
+            ])
+    
+    
+    for ticker in tickers[:BAR_TICKERS]:
+        close:Decimal = price(rng)
+        rows:list = []
+        
+        for minute in range(bars):
+            open_price, close = close, max(close + Decimal(rng.randint(-50, 50)) / 100, Decimal('0.01'))
+            rows.append(StockBar(
+                ticker=ticker, open_price=open_price, close_price=close, high=max(open_price, close), low=min(open_price, close),
+                volume=rng.randint(1, 10000), timestamp=BARS_START + timedelta(minutes=minute),
+            ))
+        
+        with transaction.atomic():
+            refresh_candles(StockBar.objects.bulk_create(rows, batch_size=SEED_BATCH))
+
+
+
+def build_context(keys:int)->dict:
+    """
+    Users and tickers the requests cycle through, and the token of the rows created by this run.
+    """
+    return {
+        'users': list(User.objects.filter(username__in=[f'bench_user_{index}' for index in range(keys)])),
+        'tickers': [ticker_name(index) for index in range(min(keys, BAR_TICKERS, StockData.objects.count()))],
+        'token': 'Z' + uuid4().hex[:4].upper(),
+        'profile_id': None,
+    }
+
+
+
+def profile_id(context:dict)->str:
+    """
+    Id of a stored profile, profiled again when a cold scenario cleared it from the cache.
+    """
+    if context['profile_id'] is None or get_profile(context['profile_id']) is None:
+        context['profile_id'] = APIClient().get(reverse('api-root'), HTTP_X_PROFILE=make_token())['X-Profile-Id']
+    
+    
+    return context['profile_id']
+
+
+
+def order_id(context:dict)->str:
+    """
+    Id of a settled transaction order, its status is stored again when a cold scenario cleared it from the cache.
+    """
+    order_id:str = f"bench_order_{context['token']}"
+    
+    if get_order_status(order_id) is None:
+        set_order_status(order_id, 'accepted', 'Transaction settled.')
+    
+    
+    return order_id
+
+
+
+def build_scenarios(context:dict)->list:
+    """
+    One scenario per route and method. `request(index)` returns the url and the client arguments of a request.
+    """
+    users, tickers, token = context['users'], context['tickers'], context['token']
+    user = lambda index: users[index % len(users)]
+    ticker = lambda index: tickers[index % len(tickers)]
+    stock_row = lambda name: {'ticker': name, 'open_price': '10.00', 'close_price': '10.50', 'high': '11.00', 'low': '9.50', 'volume': 1000}
+    
+    
+    return [
+        {'route': 'api-root', 'method': 'get', 'cached': False, 'request': lambda index: (reverse('api-root'), {})},
+        {'route': 'metrics', 'method': 'get', 'cached': False, 'request': lambda index: (reverse('metrics'), {})},
+        {
+            'route': 'users-list', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('users-list'), {'data': {'username': f'bench_{token}_{index}', 'balance': '1000.00'}, 'format': 'json'}),
+        },
+        {'route': 'users-detail', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('users-detail', args=[user(index).username]), {})},
+        {'route': 'users-portfolio', 'method': 'get', 'cached': False, 'request': lambda index: (reverse('users-portfolio', args=[user(index).username]), {})},
+        {'route': 'stocks-list', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('stocks-list'), {})},
+        {'route': 'stocks-list', 'method': 'post', 'cached': False, 'request': lambda index: (reverse('stocks-list'), {'data': stock_row(f'{token}C{index}'), 'format': 'json'})},
+        {
+            'route': 'stocks-bulk', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('stocks-bulk'), {'data': [stock_row(f'{token}B{index}-{row}') for row in range(50)], 'format': 'json'}),
+        },
+        {
+            'route': 'stocks-ingest', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('stocks-ingest'), {
+                'data': '\n'.join(json.dumps(stock_row(f'{token}I{index}-{row}')) for row in range(50)),
+                'content_type': 'application/x-ndjson',
+            }),
+        },
+        {'route': 'stocks-detail', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('stocks-detail', args=[ticker(index)]), {})},
+        {'route': 'stocks-history', 'method': 'get', 'cached': False, 'request': lambda index: (reverse('stocks-history', args=[ticker(index)]), {})},
+        {
+            'route': 'stocks-candles', 'method': 'get', 'cached': False,
+            'request': lambda index: (reverse('stocks-candles', args=[ticker(index)]), {'data': {'interval': '15m'}}),
+        },
+        {
+            'route': 'orders-list', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('orders-list'), {
+                'data': {'user': user(index).user_id, 'ticker': ticker(index), 'side': 'buy', 'order_type': 'limit', 'quantity': 1, 'price': '1.00'},
+                'format': 'json',
+            }),
+        },
+        {'route': 'orders-detail', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('orders-detail', args=[order_id(context)]), {})},
+        {'route': 'orders-events', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('orders-events', args=[order_id(context)]), {})},
+        {'route': 'analytics-valuations', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('analytics-valuations'), {})},
+        {'route': 'profiles-list', 'method': 'get', 'cached': False, 'staff': True, 'request': lambda index: (reverse('profiles-list'), {})},
+        {
+            'route': 'profiles-detail', 'method': 'get', 'cached': False, 'staff': True,
+            'request': lambda index: (reverse('profiles-detail', args=[profile_id(context)]), {}),
+        },
+        {
+            'route': 'profiles-download', 'method': 'get', 'cached': False, 'staff': True,
+            'request': lambda index: (reverse('profiles-download', args=[profile_id(context)]), {}),
+        },
+        {
+            'route': 'create-transaction', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('create-transaction'), {
+                'data': {'user': user(index).user_id, 'ticker': ticker(index), 'transaction_type': 'buy', 'transaction_volume': 1},
+                'format': 'json',
+            }),
+        },
+        {'route': 'user-transactions', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('user-transactions', args=[user(index).user_id]), {})},
+        {
+            'route': 'user-transactions-export', 'method': 'get', 'cached': False,
+            'request': lambda index: (reverse('user-transactions-export', args=[user(index).user_id]), {}),
+        },
+        {
+            'route': 'user-transactions_in_date_range', 'method': 'get', 'cached': True,
+            'request': lambda index: (reverse('user-transactions_in_date_range', args=[user(index).user_id, RANGE_START, RANGE_END]), {}),
+        },
+        {
+            'route': 'async-users', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('async-users'), {'data': {'username': f'bench_{token}_a{index}', 'balance': '1000.00'}, 'format': 'json'}),
+        },
+        {'route': 'async-user-detail', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('async-user-detail', args=[user(index).username]), {})},
+        {'route': 'async-stocks', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('async-stocks'), {})},
+        {'route': 'async-stock-detail', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('async-stock-detail', args=[ticker(index)]), {})},
+        {
+            'route': 'async-create-transaction', 'method': 'post', 'cached': False,
+            'request': lambda index: (reverse('async-create-transaction'), {
+                'data': {'user': user(index).user_id, 'ticker': ticker(index), 'transaction_type': 'buy', 'transaction_volume': 1},
+                'format': 'json',
+            }),
+        },
+        {
+            'route': 'async-user-transactions', 'method': 'get', 'cached': True,
+            'request': lambda index: (reverse('async-user-transactions', args=[user(index).user_id]), {}),
+        },
+        {'route': 'async-order-status', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('async-order-status', args=[order_id(context)]), {})},
+        {'route': 'async-order-events', 'method': 'get', 'cached': True, 'request': lambda index: (reverse('async-order-events', args=[order_id(context)]), {})},
+    ]
+
+
+
+def route_names(patterns:list)->set:
+
+    names:set = set()
+    
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    
+    
+    return names
+
+
+
+def clear_cache():
+
+    cache.clear()
+    l1 = get_l1()
+    
+    if l1 is not None:
+        l1.clear()
+
+
+
+def summarize(timings:list, statuses:set)->dict:
+    """
+    Throughput of a single client (requests per second of busy time) and latency percentiles in milliseconds.
+    """
+    cuts:list = quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    
+    
+    return {
+        'requests': len(timings),
+        'throughput': round(len(timings) / sum(timings), 2),
+        'mean_ms': round(mean(timings) * 1000, 3),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'statuses': sorted(statuses),
+    }
+
+
+
+def measure(call, requests:int, budget:float, before=None)->dict:
+    """
+    Run `call(index)` up to `requests` times, stopping after `budget` seconds once MIN_SAMPLES were taken.
+    
+    `call` returns the status and the duration of what it timed.
+    """
+    timings:list = []
+    statuses:set = set()
+    started = perf_counter()
+    
+    
+    for index in range(requests):
+        if before is not None:
+            before()
+        
+        status, duration = call(index)
+        statuses.add(status)
+        timings.append(duration)
+        
+        if perf_counter() - started > budget and len(timings) >= MIN_SAMPLES:
+            break
+    
+    
+    return summarize(timings, statuses)
+
+
+
+def request_call(client:APIClient, scenario:dict):
+    """
+    The request of a scenario for measure(), the url is built before the timer starts.
+    """
+    def call(index:int):
+        url, kwargs = scenario['request'](index)
+        start = perf_counter()
+        response = getattr(client, scenario['method'])(url, **kwargs)
+        
+        if response.streaming:
+            # iterating the response also consumes the async iterators of the async views
+            b''.join(response)
+        
+        return response.status_code, perf_counter() - start
+    
+    
+    return call
+
+
+
+def run_scenario(client:APIClient, scenario:dict, keys:int, requests:int, budget:float)->dict:
+
+    results:dict = {}
+    name:str = f"{scenario['route']} {scenario['method'].upper()}"
+    
+    
+    if not scenario['cached']:
+        results[name] = measure(request_call(client, scenario), requests, budget)
+        return results
+    
+    
+    results[f'{name} cold'] = measure(request_call(client, scenario), requests, budget, before=clear_cache)
+    
+    warm = request_call(client, scenario)
+    for index in range(keys):
+        warm(index)
+    results[f'{name} warm'] = measure(warm, requests, budget)
+    
+    
+    return results
+
+
+
+def measure_task(context:dict, requests:int, budget:float)->dict:
+    """
+    process_transaction run in this process, one share bought per call.
+    """
+    users, tickers = context['users'], context['tickers']
+    
+    
+    def call(index:int):
+        data:dict = {
+            'user': users[index % len(users)].user_id,
+            'ticker': tickers[index % len(tickers)],
+            'transaction_type': 'buy',
+            'transaction_volume': 1,
+        }
+        start = perf_counter()
+        result:dict = process_transaction_async(data)
+        
+        return result['status'], perf_counter() - start
+    
+    
+    return {'process_transaction_async task': measure(call, requests, budget)}
+
+
+
+def cleanup(context:dict, started:datetime):
+    """
+    Delete the rows created by the write routes and the task, so the next run sees the same data.
+    """
+    User.objects.filter(username__startswith=f"bench_{context['token']}_").delete()
+    
+    for model in (StockData, StockBar, StockCandle):
+        model.objects.filter(ticker__startswith=context['token']).delete()
+    
+    Transaction.objects.filter(timestamp__gte=started).delete()
+    clear_cache()
+
+
+
+def compare(results:dict, baseline:dict, tolerance:float)->list:
+    """
+    (scenario, metric, baseline, current) of every p50 or p99 more than `tolerance` above the baseline.
+    """
+    regressions:list = []
+    
+    for key, current in results['results'].items():
+        previous:dict = baseline['results'].get(key)
+        
+        if previous is None:
+            continue
+        
+        for metric in ('p50_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((key, metric, previous[metric], current[metric]))
+    
+    
+    return regressions
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.01, help='fraction of 10^5 users, 10^4 tickers and 10^7 transactions')
+    parser.add_argument('--bars', type=int, default=1440, help='minute bars of each of the first 100 tickers')
+    parser.add_argument('--keys', type=int, default=20, help='users and tickers the requests cycle through')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--budget', type=float, default=30, help='seconds per scenario')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_endpoints.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+    
+    
+    call_command('migrate', verbosity=0)
+    counts:dict = seed_counts(args.scale)
+    
+    if args.reseed or not is_seeded(counts, args.bars):
+        start = perf_counter()
+        seed(counts, args.bars, random.Random(args.seed))
+        print(f"seeded {counts} in {perf_counter() - start:.1f}s")
+    
+    
+    context:dict = build_context(args.keys)
+    scenarios:list = build_scenarios(context)
+    missing:set = route_names(urls.urlpatterns) - {scenario['route'] for scenario in scenarios}
+    
+    if missing:
+        print(f"no scenario for the routes {', '.join(sorted(missing))}", file=sys.stderr)
+    
+    
+    staff = get_user_model().objects.filter(username='bench_staff').first() or get_user_model().objects.create_user(username='bench_staff', is_staff=True)
+    clients:dict = {False: APIClient(), True: APIClient()}
+    clients[True].force_authenticate(staff)
+    
+    results:dict = {
+        'meta': {
+            'scale': args.scale,
+            'counts': counts,
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'cache_codec': settings.CACHE_CODEC,
+            'created_at': datetime.now().isoformat(),
+        },
+        'results': {},
+    }
+    started:datetime = datetime.now()
+    
+    
+    try:
+        for scenario in scenarios:
+            results['results'].update(run_scenario(clients[scenario.get('staff', False)], scenario, args.keys, args.requests, args.budget))
+        results['results'].update(measure_task(context, args.requests, args.budget))
+    finally:
+        cleanup(context, started)
+    
+    
+    print(f"{'scenario':<52} {'n':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    for key, row in results['results'].items():
+        print(f"{key:<52} {row['requests']:>5} {row['throughput']:>9,.1f} {row['p50_ms']:>9,.2f} {row['p99_ms']:>9,.2f}  {row['statuses']}")
+    
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    
+    
+    if args.baseline is None:
+        return
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+    
+    
+    with open(args.baseline) as baseline_file:
+        baseline:dict = json.load(baseline_file)
+    
+    if {key: baseline['meta'].get(key) for key in ('scale', 'database', 'cache')} != {key: results['meta'][key] for key in ('scale', 'database', 'cache')}:
+        print("the baseline was recorded with another scale, database or cache, comparing anyway", file=sys.stderr)
+    
+    
+    regressions:list = compare(results, baseline, args.tolerance)
+    
+    for key, metric, previous, current in regressions:
+        print(f"REGRESSION {key} {metric}: {previous:.2f} -> {current:.2f}")
+    
+    if regressions:
+        sys.exit(1)
+    
+    print(f"no regression above {args.tolerance:.0%} of {args.baseline}")
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Matching throughput of app.orderbook.OrderBook as the book gets deeper.
+
+    python -m benchmarks.bench_orderbook [--orders 50000] [--depths 10 100 1000 10000]
+
+For every depth the book is filled with that many price levels per side (5 orders each),
+then a mix of crossing limit orders, passive limit orders and market orders is submitted.
+The passive orders keep refilling the levels the crossing orders consume.
+"""
+from app.orderbook import (Order, OrderBook)
+from decimal import Decimal
+from time import perf_counter
+import argparse
+import random
+
+
+def build_book(depth:int)->OrderBook:
+    
+    book = OrderBook('BENCH')
+    
+    for level in range(depth):
+        for index in range(5):
+            book.submit(Order(f'b{level}-{index}', 'maker', 'buy', 10, Decimal(1000 - level) / 10))
+            book.submit(Order(f's{level}-{index}', 'maker', 'sell', 10, Decimal(1001 + level) / 10))
+    
+    return book
+
+
+
+def run(depth:int, orders:int, seed:int=0)->float:
+    """
+    Return the matching throughput in orders per second.
+    """
+    rng = random.Random(seed)
+    book:OrderBook = build_book(depth)
+    flow:list = []
+    
+    for index in range(orders):
+        side = rng.choice(('buy', 'sell'))
+        kind = rng.random()
+        
+        if kind < 0.1:
+            price = None
+        elif kind < 0.4:
+            # crossing limit order
+            price = Decimal(1001 if side == 'buy' else 1000) / 10
+        else:
+            # passive limit order somewhere in the book
+            offset = rng.randrange(depth)
+            price = Decimal(1000 - offset if side == 'buy' else 1001 + offset) / 10
+        
+        flow.append(Order(f'o{index}', 'taker', side, rng.randint(1, 20), price))
+    
+    
+    start = perf_counter()
+    
+    for order in flow:
+        book.submit(order)
+    
+    return orders / (perf_counter() - start)
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--depths', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+    
+    print(f"{'depth':>8} {'orders/s':>12}")
+    for depth in args.depths:
+        print(f"{depth:>8} {run(depth, args.orders):>12,.0f}")
+
+
+
+if __name__ == '__main__':
+    main()
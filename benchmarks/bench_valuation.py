@@ -0,0 +1,102 @@
+"""
+Batched NumPy portfolio valuation (app.analytics) against a per-user ORM loop with Decimal math.
+
+    python -m benchmarks.bench_valuation [--users 2000] [--tickers 500] [--positions 20]
+
+Synthetic users, stocks and positions are seeded in the configured database (DJANGO_SETTINGS_MODULE,
+config.settings by default) inside a transaction that is rolled back at the end.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django
+
+django.setup()
+
+from app.analytics import compute_valuations
+from app.models import (User, StockData, Position)
+from django.db import transaction
+from decimal import Decimal
+from time import perf_counter
+import argparse
+import random
+
+
+def value_with_orm()->dict:
+    """
+    Baseline: one query per user and Decimal math per position.
+    """
+    valuations:dict = {}
+    
+    for user in User.objects.all():
+        market_value = cost_basis = Decimal(0)
+        exposure:dict = {}
+        
+        for position in user.positions.filter(quantity__gt=0):
+            stock = StockData.objects.filter(ticker=position.ticker).first()
+            value = position.quantity * (stock.close_price if stock else Decimal(0))
+            exposure[position.ticker] = value
+            market_value += value
+            cost_basis += position.cost_basis
+        
+        valuations[user.username] = {'market_value': market_value, 'cost_basis': cost_basis, 'unrealized_pnl': market_value - cost_basis, 'exposure': exposure}
+    
+    return valuations
+
+
+
+def seed(users:int, tickers:int, positions:int, rng:random.Random):
+    
+    names:list = [f'BENCH{index}' for index in range(tickers)]
+    StockData.objects.bulk_create(
+        [StockData(ticker=name, open_price=10, close_price=Decimal(rng.randint(100, 100000)) / 100, high=1000, low=1, volume=10**6) for name in names],
+        batch_size=5000,
+    )
+    created:list = User.objects.bulk_create([User(username=f'bench_user_{index}', balance=0) for index in range(users)], batch_size=5000)
+    Position.objects.bulk_create(
+        (
+            Position(user=user, ticker=ticker, quantity=rng.randint(1, 1000), cost_basis=Decimal(rng.randint(100, 10**7)) / 100)
+            for user in created
+            for ticker in rng.sample(names, min(positions, tickers))
+        ),
+        batch_size=5000,
+    )
+
+
+
+def timed(function)->float:
+    
+    start = perf_counter()
+    function()
+    return perf_counter() - start
+
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--positions', type=int, default=20, help="positions per user")
+    args = parser.parse_args()
+    
+    
+    with transaction.atomic():
+        seed(args.users, args.tickers, args.positions, random.Random(0))
+        
+        batched:float = timed(compute_valuations)
+        orm:float = timed(value_with_orm)
+        
+        transaction.set_rollback(True)
+    
+    
+    print(f"users={args.users} positions={args.users * args.positions}")
+    print(f"batched numpy: {batched:8.3f}s")
+    print(f"per-user ORM:  {orm:8.3f}s")
+    print(f"speedup:       {orm / batched:8.1f}x")
+
+
+
+if __name__ == '__main__':
+    main()
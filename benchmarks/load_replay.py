@@ -0,0 +1,301 @@
+"""
+Replay a request mix recorded by app.middleware.RecordingMiddleware against a running server.
+
+    python -m benchmarks.load_replay recorded_requests.jsonl [--base-url http://localhost:8000] [--concurrency 32]
+                                     [--rate 200] [--duration 60] [--routes create-transaction stocks-list] [--output replay.json]
+
+Recorded requests are sent in their recorded order, looping over the file until --duration elapses.
+With --rate the requests start on a fixed schedule whatever the response times (open loop) and latency is
+measured from the scheduled start, so a saturated server shows up as latency instead of a lower request rate.
+Without it every one of the --concurrency connections sends its next request as soon as the previous one completed.
+
+Throughput, p50/p95/p99 latency, the error rate (5xx, timeouts and connection errors) and the 4xx rate are
+reported per route. Only the standard library is used, no Django setup is needed.
+"""
+from collections import (Counter, defaultdict)
+from time import perf_counter
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import itertools
+import json
+import ssl
+import sys
+
+
+class Connection:
+    """
+    Keep-alive HTTP/1.1 connection, enough of the protocol for the API responses.
+    """
+    
+    def __init__(self, base_url:str):
+    
+        url = urlsplit(base_url)
+        self.host:str = url.hostname
+        self.port:int = url.port or (443 if url.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self.host_header:str = url.netloc
+        self.reader = self.writer = None
+    
+    
+    async def request(self, method:str, path:str, body:bytes=b'', content_type:str=None)->int:
+        """
+        Send a request and read its whole response, returns the status code.
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        
+        
+        head:list = [f'{method} {path} HTTP/1.1', f'Host: {self.host_header}', f'Content-Length: {len(body)}']
+        if content_type:
+            head.append(f'Content-Type: {content_type}')
+        
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+        
+        
+        status_line:bytes = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by the server')
+        
+        status:int = int(status_line.split()[1])
+        headers:dict = await self.read_headers()
+        
+        
+        if status in (204, 304) or 100 <= status < 200:
+            pass
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            await self.read_chunked()
+        elif 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            # no length, the body ends with the connection
+            await self.reader.read()
+            self.close()
+        
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        
+        
+        return status
+    
+    
+    async def read_headers(self)->dict:
+    
+        headers:dict = {}
+        
+        while True:
+            line:bytes = await self.reader.readline()
+            
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    
+    
+    async def read_chunked(self):
+    
+        while True:
+            size:int = int((await self.reader.readline()).split(b';')[0], 16)
+            
+            if size == 0:
+                await self.read_headers()
+                return
+            
+            await self.reader.readexactly(size + 2)
+    
+    
+    def close(self):
+    
+        if self.writer is not None:
+            self.writer.close()
+        
+        self.reader = self.writer = None
+
+
+
+def load_entries(path:str, routes:list=None)->tuple:
+    """
+    Recorded requests to replay and the number skipped because their body was not recorded.
+    """
+    entries:list = []
+    skipped:int = 0
+    
+    with open(path, encoding='utf-8') as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            
+            entry:dict = json.loads(line)
+            entry['route'] = entry.get('route') or entry['path'].split('?')[0]
+            
+            if routes and entry['route'] not in routes:
+                continue
+            if entry.get('body') is None:
+                skipped += 1
+                continue
+            
+            entries.append(entry)
+    
+    
+    return entries, skipped
+
+
+
+def percentile(values:list, fraction:float)->float:
+    """
+    Nearest rank percentile of sorted values.
+    """
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+
+def summarize(stats:dict, elapsed:float)->dict:
+
+    report:dict = {}
+    
+    
+    for route, route_stats in sorted(stats.items()):
+        latencies:list = sorted(route_stats['latencies'])
+        statuses:Counter = route_stats['statuses']
+        count:int = len(latencies)
+        errors:int = sum(number for status, number in statuses.items() if not isinstance(status, int) or status >= 500)
+        client_errors:int = sum(number for status, number in statuses.items() if isinstance(status, int) and 400 <= status < 500)
+        
+        report[route] = {
+            'requests': count,
+            'throughput': round(count / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'error_rate': round(errors / count, 4),
+            'client_error_rate': round(client_errors / count, 4),
+            'statuses': {str(status): number for status, number in statuses.items()},
+        }
+    
+    
+    return report
+
+
+
+async def replay(entries:list, base_url:str, concurrency:int, rate:float, duration:float, timeout:float)->dict:
+    """
+    Replay the entries for `duration` seconds, returns the latencies and statuses by route (plus `all`).
+    """
+    loop = asyncio.get_running_loop()
+    stats:dict = defaultdict(lambda: {'latencies': [], 'statuses': Counter()})
+    started:float = loop.time()
+    deadline:float = started + duration
+    
+    
+    async def send(connection:Connection, entry:dict, scheduled:float):
+    
+        try:
+            status = await asyncio.wait_for(
+                connection.request(entry['method'], entry['path'], entry['body'].encode('utf-8'), entry.get('content_type')),
+                timeout,
+            )
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            # the response may be half read, the connection can't be reused
+            connection.close()
+            status = type(exc).__name__
+        
+        latency:float = loop.time() - scheduled
+        
+        for route in (entry['route'], 'all'):
+            stats[route]['latencies'].append(latency)
+            stats[route]['statuses'][status] += 1
+    
+    
+    async def closed_loop_worker(indexes):
+    
+        connection = Connection(base_url)
+        
+        while loop.time() < deadline:
+            await send(connection, entries[next(indexes) % len(entries)], loop.time())
+        
+        connection.close()
+    
+    
+    async def open_loop_worker(queue:asyncio.Queue):
+    
+        connection = Connection(base_url)
+        
+        while (item := await queue.get()) is not None:
+            await send(connection, *item)
+        
+        connection.close()
+    
+    
+    if rate is None:
+        indexes = itertools.count()
+        await asyncio.gather(*(closed_loop_worker(indexes) for _ in range(concurrency)))
+        return stats
+    
+    
+    queue:asyncio.Queue = asyncio.Queue()
+    workers:list = [asyncio.create_task(open_loop_worker(queue)) for _ in range(concurrency)]
+    
+    for index in itertools.count():
+        scheduled:float = started + index / rate
+        
+        if scheduled >= deadline:
+            break
+        
+        await asyncio.sleep(max(scheduled - loop.time(), 0))
+        # a request waiting for a free connection is late, its wait is part of its latency
+        queue.put_nowait((entries[index % len(entries)], scheduled))
+    
+    for _ in workers:
+        queue.put_nowait(None)
+    
+    await asyncio.gather(*workers)
+    
+    
+    return stats
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', nargs='?', default='recorded_requests.jsonl')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=32, help='connections')
+    parser.add_argument('--rate', type=float, default=None, help='requests per second, as fast as possible when omitted')
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds per request')
+    parser.add_argument('--routes', nargs='+', default=None, help='only replay these routes (url names)')
+    parser.add_argument('--output', default=None, help='write the report as JSON')
+    args = parser.parse_args()
+    
+    
+    entries, skipped = load_entries(args.recording, args.routes)
+    
+    if skipped:
+        print(f"skipping {skipped} requests recorded without their body", file=sys.stderr)
+    if not entries:
+        sys.exit(f"no request to replay in {args.recording}")
+    
+    
+    start = perf_counter()
+    stats:dict = asyncio.run(replay(entries, args.base_url, args.concurrency, args.rate, args.duration, args.timeout))
+    report:dict = summarize(stats, perf_counter() - start)
+    
+    
+    print(f"{'route':<40} {'n':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'4xx':>7}")
+    for route, row in report.items():
+        print(
+            f"{route:<40} {row['requests']:>7} {row['throughput']:>9,.1f} {row['p50_ms']:>9,.2f} {row['p95_ms']:>9,.2f}"
+            f" {row['p99_ms']:>9,.2f} {row['error_rate']:>7.2%} {row['client_error_rate']:>7.2%}"
+        )
+    
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'options': vars(args), 'routes': report}, output, indent=2)
+
+
+
+if __name__ == '__main__':
+    main()
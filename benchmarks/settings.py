@@ -0,0 +1,57 @@
+"""
+Settings of benchmarks.bench_endpoints, config.settings with local stand-ins for the services.
+
+    BENCH_DATABASE=sqlite     sqlite file BENCH_DATABASE_NAME (default bench.sqlite3), or `postgres` to use
+                              the postgres of config.settings with the BENCH_DATABASE_NAME database (default db_stock_bench)
+    BENCH_CACHE=fakeredis     django-redis on an in-process fakeredis server, `redis` for REDIS_URL or `locmem`
+
+The benchmark flushes its database when it reseeds, never point it at a database holding real data.
+Celery uses the in-memory broker, so the views only pay for publishing the task.
+"""
+from config.settings import *  # noqa
+import os
+
+
+BENCH_DATABASE = os.environ.get('BENCH_DATABASE', 'sqlite')
+BENCH_CACHE = os.environ.get('BENCH_CACHE', 'fakeredis')
+
+
+if BENCH_DATABASE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCH_DATABASE_NAME', BASE_DIR / 'bench.sqlite3'),
+        }
+    }
+else:
+    DATABASES['default']['NAME'] = os.environ.get('BENCH_DATABASE_NAME', 'db_stock_bench')
+
+
+if BENCH_CACHE == 'fakeredis':
+    import fakeredis
+    import fakeredis.aioredis
+    
+    # the sync and async clients (app.async_cache) share one in-process server
+    FAKEREDIS_SERVER = fakeredis.FakeServer()
+    CACHES['default']['OPTIONS']['CONNECTION_POOL_KWARGS'] = {
+        'connection_class': fakeredis.FakeConnection,
+        'server': FAKEREDIS_SERVER,
+    }
+    CACHES['default']['OPTIONS']['ASYNC_CONNECTION_POOL_KWARGS'] = {
+        'connection_class': fakeredis.aioredis.FakeConnection,
+        'server': FAKEREDIS_SERVER,
+    }
+elif BENCH_CACHE == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': DEFAULT_TIME_OUT,
+        }
+    }
+
+
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+
+# profiles are only recorded for the requests sending the header
+PROFILING = {**PROFILING, 'SAMPLE_RATE': 0.0}
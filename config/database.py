@@ -0,0 +1,47 @@
+"""
+Connection handling of DATABASES['default'], picked per process type with DATABASE_CONNECTION_MODE.
+
+    fresh        a new connection for every request and every Celery task, closed when it ends
+    persistent   connections are reused for DATABASE_CONN_MAX_AGE seconds and checked before each
+                 request or task (CONN_HEALTH_CHECKS)
+    pool         a psycopg 3 pool per process of DATABASE_POOL_MIN_SIZE to DATABASE_POOL_MAX_SIZE connections,
+                 checked when they are handed out, a request waits DATABASE_POOL_TIMEOUT seconds for a free one
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+
+CONNECTION_MODES:tuple = ('fresh', 'persistent', 'pool')
+
+
+def connection_settings(environ)->dict:
+    """
+    CONN_MAX_AGE, CONN_HEALTH_CHECKS and OPTIONS of the database for the mode set in `environ`.
+    """
+    mode:str = environ.get('DATABASE_CONNECTION_MODE', 'fresh')
+    
+    if mode not in CONNECTION_MODES:
+        raise ImproperlyConfigured(f"DATABASE_CONNECTION_MODE must be one of {', '.join(CONNECTION_MODES)}, not {mode!r}")
+    
+    
+    if mode == 'fresh':
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+    
+    if mode == 'persistent':
+        return {'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 600)), 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {}}
+    
+    
+    from psycopg_pool import ConnectionPool
+    
+    # the pool owns the connections, Django hands them back at the end of the request
+    return {
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                'timeout': float(environ.get('DATABASE_POOL_TIMEOUT', 10)),
+                'check': ConnectionPool.check_connection,
+            },
+        },
+    }
@@ -1,4 +1,6 @@
 from pathlib import Path
+from .database import connection_settings
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +32,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.MetricsMiddleware',
+    'app.middleware.ProfilingMiddleware',
+    'app.middleware.RecordingMiddleware',
+    'app.middleware.LoaderMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,7 +78,7 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # DATABASE_HOST = "localhost"
 # for docker use this
-DATABASE_HOST = "db"
+DATABASE_HOST = os.environ.get("DATABASE_HOST", "db")
 
 DATABASES = {
     'default': {
@@ -82,6 +88,8 @@ DATABASES = {
         'PASSWORD': 'root',
         'HOST': DATABASE_HOST,
         'PORT': '5432',
+        # DATABASE_CONNECTION_MODE=fresh|persistent|pool, set per process type in docker-compose.yml (config/database.py)
+        **connection_settings(os.environ),
     }
 }
 
@@ -139,6 +147,11 @@ CELERY_RESULT_BACKEND = REDIS_URL
 
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# order books live in the memory of the single worker consuming the matching queue
+CELERY_TASK_ROUTES = {
+    'match_order': {'queue': 'matching'},
+}
+
 
 # CACHE SETTING
 DEFAULT_TIME_OUT = 3600
@@ -155,3 +168,91 @@ CACHES = {
 
 CACHE_TIMEOUT_FOR_STOCK = 5 * 60
 CACHE_TIMEOUT_FOR_USER = DEFAULT_TIME_OUT
+CACHE_TIMEOUT_FOR_VALUATIONS = 60
+
+# codec of the cached values (app.cache_codecs): 'json', 'orjson', 'msgpack' or a dotted path to a codec class.
+# with a JSON codec cached responses are sent as stored, without decoding and rendering them again
+CACHE_CODEC = 'orjson'
+
+# single flight recomputation of hot keys (app.utils.get_or_compute)
+CACHE_LOCK_TIMEOUT = 10 # lock held by the caller recomputing a key
+CACHE_LOCK_WAIT = 2 # how long the other callers wait for it when there is no stale value
+CACHE_STALE_TIMEOUT = 60 # values are kept this long past their timeout and served while being refreshed
+CACHE_EARLY_REFRESH_BETA = 1.0 # > 1 refreshes earlier, 0 disables early refresh
+
+# on demand request profiling (app.middleware.ProfilingMiddleware), send `HEADER: <manage.py profiling_token>`
+# or profile a SAMPLE_RATE fraction of the requests, the last MAX_PROFILES are listed on /profiles/ (staff only)
+PROFILING = {
+    'ENABLED': True,
+    'HEADER': 'X-Profile',
+    'TOKEN_MAX_AGE': 60 * 60,
+    'SAMPLE_RATE': 0.0,
+    'MAX_PROFILES': 50,
+    'TIMEOUT': 24 * 60 * 60,
+    'TOP_FUNCTIONS': 50,
+}
+
+# requests appended to PATH for benchmarks.load_replay, bodies over MAX_BODY_BYTES are not recorded
+REQUEST_RECORDING = {
+    'ENABLED': False,
+    'PATH': BASE_DIR / 'recorded_requests.jsonl',
+    'SAMPLE_RATE': 1.0,
+    'MAX_BODY_BYTES': 64 * 1024,
+}
+
+# optional in-process LRU in front of Redis (app.cache_tiers), invalidated across processes through pub/sub on CHANNEL
+CACHE_L1 = {
+    'ENABLED': False,
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 5, # seconds, bounds staleness if an invalidation is missed
+    'CHANNEL': 'cache_invalidation',
+}
+
+
+# STOCK INGESTION SETTING
+STOCK_INGEST_BATCH_SIZE = 1000
+STOCK_INGEST_MAX_BATCH_SIZE = 10000
+# row errors kept in an ingestion report, the rest are only counted
+STOCK_INGEST_MAX_ERRORS = 100
+# rows accepted by one POST /stocks/bulk/ request, larger payloads are streamed to /stocks/ingest/
+STOCK_BULK_MAX_ROWS = 5000
+
+
+# STOCK HISTORY SETTING
+# bars returned by one /stocks/{ticker}/history/ response, the rest is linked with a `Link: rel="next"` header
+STOCK_HISTORY_MAX_BARS = 1000
+
+
+# TRANSACTION EXPORT SETTING
+TRANSACTION_EXPORT_CHUNK_SIZE = 2000
+
+
+# PAGINATION SETTING
+# only pages of the default size are cached
+KEYSET_PAGE_SIZE = 100
+KEYSET_MAX_PAGE_SIZE = 1000
+
+
+# TRANSACTION BATCHING SETTING
+# when enabled, orders are queued in redis and settled in batches by the drain_transaction_queue task
+TRANSACTION_BATCHING = False
+TRANSACTION_BATCH_SIZE = 500
+TRANSACTION_QUEUE_KEY = 'transaction_queue'
+# a drain holding the lock longer than this is presumed dead, the next order schedules a new one
+TRANSACTION_DRAIN_LOCK_TIMEOUT = 5 * 60
+
+
+# ORDER BOOK SETTING
+# the postgres snapshot is committed with the fills every N orders, 1 keeps it exact for recovery
+ORDER_BOOK_SNAPSHOT_INTERVAL = 1
+
+
+# ORDER STATUS SETTING
+# status of the submitted transactions (app.order_status), changes are pushed on CHANNEL:<order_id>
+ORDER_STATUS = {
+    'TIMEOUT': 24 * 60 * 60, # how long a status is kept
+    'CHANNEL': 'order_status',
+    'MAX_WAIT': 30, # cap of the ?wait= long-poll, in seconds
+    'HEARTBEAT': 15, # seconds between the keep-alive comments of the SSE stream
+    'POLL_INTERVAL': 0.2, # waiters poll the cache this often when there is no Redis
+}